@@ -0,0 +1,77 @@
+"""
+Débit de l'export par lot (BatchExporter) comparé au débit brut du disque : N maillages
+synthétiques exportés en parallèle, puis le même volume d'octets écrit d'un bloc.
+Un ratio proche de 1 signifie que l'export est limité par le disque.
+
+    python benchmarks/bench_export.py --meshes 500 --vertices 200000 --formats glb ply
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import trimesh
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import config
+from src.processing.exporter import EXPORT_FORMATS, BatchExporter
+
+def synthetic_mesh(vertices: int, seed: int) -> trimesh.Trimesh:
+    """Grille déformée avec couleurs par sommet (comme une sortie Poisson de MoGe)."""
+    rng = np.random.default_rng(seed)
+    side = max(2, int(np.sqrt(vertices)))
+    yy, xx = np.mgrid[0:side, 0:side].astype(np.float32) / side
+    points = np.stack([xx, -yy, rng.normal(0, 0.01, xx.shape).astype(np.float32)], axis=-1).reshape(-1, 3)
+    index = np.arange(side * side).reshape(side, side)
+    a, b, c, d = index[:-1, :-1], index[:-1, 1:], index[1:, :-1], index[1:, 1:]
+    faces = np.concatenate([np.stack([a, c, b], -1).reshape(-1, 3), np.stack([b, c, d], -1).reshape(-1, 3)])
+    colors = rng.integers(0, 256, (len(points), 4), dtype=np.uint8)
+    return trimesh.Trimesh(points, faces, vertex_colors=colors, process=False)
+
+def disk_throughput(folder: str, nbytes: int) -> float:
+    """Octets/s d'une écriture séquentielle du même volume (référence du disque)."""
+    block = np.random.default_rng(0).integers(0, 256, 64 * 1024 ** 2, dtype=np.uint8)
+    path = os.path.join(folder, 'disk_reference.bin')
+    start = time.perf_counter()
+    with open(path, 'wb') as f:
+        for written in range(0, nbytes, len(block)):
+            f.write(block[:min(len(block), nbytes - written)])
+        f.flush()
+        os.fsync(f.fileno())
+    elapsed = time.perf_counter() - start
+    os.remove(path)
+    return nbytes / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de l'export par lot comparé au débit brut du disque.")
+    parser.add_argument('--meshes', type=int, default=100)
+    parser.add_argument('--vertices', type=int, default=200_000)
+    parser.add_argument('--distinct', type=int, default=8, help="Maillages distincts générés (réutilisés pour atteindre --meshes)")
+    parser.add_argument('--formats', nargs='+', choices=EXPORT_FORMATS, default=config.EXPORT_CONFIG['formats'])
+    parser.add_argument('--workers', type=int, default=config.EXPORT_CONFIG['max_workers'])
+    parser.add_argument('--dir', default=None, help="Dossier de sortie (par défaut : dossier temporaire)")
+    args = parser.parse_args()
+
+    pool = [synthetic_mesh(args.vertices, seed) for seed in range(min(args.distinct, args.meshes))]
+    meshes = {f"mesh_{index:04d}": pool[index % len(pool)] for index in range(args.meshes)}
+    folder = tempfile.mkdtemp(dir=args.dir)
+    try:
+        exporter = BatchExporter(folder, args.formats, max_workers=args.workers,
+                                 chunk=config.EXPORT_CONFIG['chunk_vertices'])
+        summary = exporter.export_many(meshes)
+        export_rate = summary['bytes'] / summary['elapsed_s']
+        disk_rate = disk_throughput(folder, summary['bytes'])
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{len(summary['files'])} fichiers, {summary['bytes'] / 1024 ** 2:.0f} Mo en {summary['elapsed_s']:.2f}s "
+          f"({len(summary['failed'])} échec(s))")
+    print(f"Export : {export_rate / 1024 ** 2:.0f} Mo/s — disque : {disk_rate / 1024 ** 2:.0f} Mo/s "
+          f"— ratio {export_rate / disk_rate:.2f}")
+
+if __name__ == '__main__':
+    main()
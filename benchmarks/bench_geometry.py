@@ -0,0 +1,240 @@
+"""
+Banc d'essai des chemins critiques de la géométrie, sur données synthétiques (aucun poids de
+modèle, CPU seul) : branches de GeometryBuilder.build, trimesh_to_polydata, _apply_fg_mask,
+resize_and_pad et l'index spatial du visualiseur, aux tailles 512, 1024, 2048 et 4096.
+
+Chaque cas est chronométré (médiane et minimum sur --repeat passes) et sa mémoire de pointe
+mesurée. Les résultats sont écrits en JSON et comparés à une référence enregistrée :
+
+    python benchmarks/bench_geometry.py --save-baseline            # enregistre la référence
+    python benchmarks/bench_geometry.py --fail-on-regression       # compare (code de sortie 1 si régression)
+    python benchmarks/bench_geometry.py --sizes 512 1024 --cases build_depth_map resize_and_pad
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import config
+from src.app_controller import AppController
+from src.budget import ResourceBudget
+from src.geometry_builder import GeometryBuilder
+from src.processing.image_codec import resize_and_pad
+from src.profiling import PeakMemoryMonitor
+from src.spatial_index import VoxelHashIndex
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [512, 1024, 2048, 4096]
+
+# --- Données synthétiques (reproductibles) ---
+
+def synthetic_image(size: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, size, dtype=np.float32)
+    img = np.stack([np.add.outer(gradient, gradient) / 2,
+                    np.tile(gradient, (size, 1)),
+                    np.tile(gradient[:, None], (1, size))], axis=-1)
+    return np.clip(img + rng.normal(0, 8, img.shape), 0, 255).astype(np.uint8)
+
+def synthetic_depth_map(size: int, seed: int = 0) -> np.ndarray:
+    """Relief lisse (bosse centrale + ondulations) avec un léger bruit, comme une sortie de moteur de profondeur."""
+    rng = np.random.default_rng(seed)
+    v = np.linspace(-1, 1, size, dtype=np.float32)
+    yy, xx = v[:, None], v[None, :]
+    depth = 1.0 + 0.5 * np.exp(-(xx ** 2 + yy ** 2) * 3) + 0.05 * np.sin(8 * xx) * np.cos(8 * yy)
+    return (depth + rng.normal(0, 0.002, (size, size))).astype(np.float32)
+
+def synthetic_moge_data(size: int, seed: int = 0) -> dict:
+    """Dictionnaire au format MoGe : 'points', 'normal' (H, W, 3) et 'mask' (H, W) sur une demi-sphère bruitée."""
+    rng = np.random.default_rng(seed)
+    v = np.linspace(-1, 1, size, dtype=np.float32)
+    yy, xx = np.meshgrid(v, v, indexing='ij')
+    r2 = xx ** 2 + yy ** 2
+    mask = r2 < 0.9
+    zz = np.sqrt(np.clip(1.0 - r2, 0.0, None))
+    points = np.stack([xx, -yy, -(2.0 - zz)], axis=-1) + rng.normal(0, 0.001, (size, size, 3)).astype(np.float32)
+    normal = np.stack([xx, -yy, zz], axis=-1)
+    normal /= np.linalg.norm(normal, axis=-1, keepdims=True) + 1e-8
+    return {'points': points.astype(np.float32), 'normal': normal.astype(np.float32), 'mask': mask}
+
+def synthetic_fg_mask(size: int) -> np.ndarray:
+    """Masque RMBG (uint8) à demi-résolution : exerce le redimensionnement de _apply_fg_mask."""
+    half = max(1, size // 2)
+    v = np.linspace(-1, 1, half, dtype=np.float32)
+    return ((v[:, None] ** 2 + v[None, :] ** 2) < 0.8).astype(np.uint8) * 255
+
+# --- Cas mesurés ---
+# Chaque fabrique prépare les entrées (hors chronométrage) et retourne la fonction à mesurer.
+
+def case_build_point_cloud(ctx, size):
+    data, img = synthetic_moge_data(size), synthetic_image(size)
+    return lambda: ctx['builder'].build(data, img, None, {'render_mode': True})
+
+def case_build_depth_map(ctx, size):
+    data, img = {'depth_map': synthetic_depth_map(size)}, synthetic_image(size)
+    return lambda: ctx['builder'].build(data, img, None, {'depth_scale': 10.0})
+
+def case_build_poisson_filters(ctx, size):
+    data, img = synthetic_moge_data(size), synthetic_image(size)
+    return lambda: ctx['builder'].build(data, img, None, {'quality_filters': True})
+
+def case_build_poisson_no_filters(ctx, size):
+    data, img = synthetic_moge_data(size), synthetic_image(size)
+    return lambda: ctx['builder'].build(data, img, None, {'quality_filters': False})
+
+def case_polydata_points(ctx, size):
+    mesh = ctx['builder'].build({'depth_map': synthetic_depth_map(size)}, synthetic_image(size), None, {})
+    return lambda: ctx['controller'].trimesh_to_polydata(mesh)
+
+def case_polydata_mesh(ctx, size):
+    mesh = ctx['builder'].build(synthetic_moge_data(size), synthetic_image(size), None, {'quality_filters': False})
+    return lambda: ctx['controller'].trimesh_to_polydata(mesh)
+
+def case_apply_fg_mask(ctx, size):
+    model_mask, fg_mask = synthetic_moge_data(size)['mask'], synthetic_fg_mask(size)
+    return lambda: ctx['builder']._apply_fg_mask(model_mask, fg_mask)
+
+def case_resize_and_pad(ctx, size):
+    img = Image.fromarray(synthetic_image(size))
+    return lambda: resize_and_pad(img, max(64, size // 2))
+
+def case_spatial_index_build(ctx, size):
+    points = synthetic_moge_data(size)['points'].reshape(-1, 3)
+    return lambda: VoxelHashIndex(points, config.SPATIAL_INDEX_CONFIG['points_per_cell'])
+
+def case_spatial_index_queries(ctx, size):
+    """Une sélection (plus proche sommet + voisinage) et une coupe, comme dans le visualiseur."""
+    points = synthetic_moge_data(size)['points'].reshape(-1, 3)
+    index = VoxelHashIndex(points, config.SPATIAL_INDEX_CONFIG['points_per_cell'])
+    diagonal = float(np.linalg.norm(np.ptp(points, axis=0)))
+    center = points.mean(axis=0)
+    def queries():
+        vertex, _ = index.nearest(center)
+        index.query_sphere(points[vertex], diagonal * config.SPATIAL_INDEX_CONFIG['neighborhood_ratio'])
+        index.slice_plane(center, (0.0, 0.0, 1.0), diagonal * config.SPATIAL_INDEX_CONFIG['slice_thickness_ratio'])
+    return queries
+
+CASES = {
+    'build_point_cloud': case_build_point_cloud,
+    'build_depth_map': case_build_depth_map,
+    'build_poisson_filters': case_build_poisson_filters,
+    'build_poisson_no_filters': case_build_poisson_no_filters,
+    'trimesh_to_polydata_points': case_polydata_points,
+    'trimesh_to_polydata_mesh': case_polydata_mesh,
+    'apply_fg_mask': case_apply_fg_mask,
+    'resize_and_pad': case_resize_and_pad,
+    'spatial_index_build': case_spatial_index_build,
+    'spatial_index_queries': case_spatial_index_queries,
+}
+
+# --- Mesure ---
+
+def measure(fn, repeat: int) -> dict:
+    """Une passe sous PeakMemoryMonitor (mémoire), puis 'repeat' passes chronométrées."""
+    sink = io.StringIO()  # Les print() du pipeline ne doivent ni polluer la sortie ni peser sur la mesure
+    with contextlib.redirect_stdout(sink), PeakMemoryMonitor() as monitor:
+        fn()
+    memory = monitor.result()
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(sink):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    return {
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+        'repeat': repeat,
+        'peak_rss_mb': round(memory['peak_rss_mb'], 1),
+        'rss_delta_mb': round(memory['rss_delta_mb'], 1),
+    }
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=BENCH_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'budget': config.RESOURCE_BUDGET,
+    }
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Retourne les régressions : cas dont la médiane dépasse celle de la référence de plus de 'threshold'."""
+    regressions = []
+    print(f"\n{'cas':<40} {'référence':>10} {'actuel':>10} {'ratio':>7}")
+    for key, result in results.items():
+        reference = baseline.get('results', {}).get(key)
+        if reference is None or 'error' in result or 'error' in reference:
+            continue
+        ratio = result['median_s'] / max(reference['median_s'], 1e-9)
+        flag = " RÉGRESSION" if ratio > 1 + threshold else ""
+        print(f"{key:<40} {reference['median_s']:>9.4f}s {result['median_s']:>9.4f}s {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append({'case': key, 'baseline_s': reference['median_s'], 'current_s': result['median_s'], 'ratio': ratio})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai géométrie/pipeline sur données synthétiques (CPU).")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-budget', action='store_true', help="Désactive RESOURCE_BUDGET (mesure sans sous-échantillonnage)")
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results', 'latest.json'))
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'results', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help="Enregistre ces résultats comme nouvelle référence")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Ralentissement toléré avant de signaler une régression (0.2 = 20 %%)")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    budget = ResourceBudget(**{**config.RESOURCE_BUDGET, 'enabled': not args.no_budget})
+    ctx = {'builder': GeometryBuilder(budget), 'controller': AppController(discover_items=False, engine_names=[])}
+    ctx['controller'].budget = budget
+
+    results = {}
+    for case_name in args.cases:
+        for size in args.sizes:
+            key = f"{case_name}@{size}"
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fn = CASES[case_name](ctx, size)
+                results[key] = measure(fn, args.repeat)
+                print(f"{key:<40} médiane {results[key]['median_s']:.4f}s, pic RSS {results[key]['peak_rss_mb']:.0f} Mo")
+            except Exception as e:
+                # Dépendance absente (pyvista, open3d...) ou échec : le cas est signalé sans arrêter la série.
+                results[key] = {'error': f"{type(e).__name__}: {e}"}
+                print(f"{key:<40} ÉCHEC ({results[key]['error']})")
+
+    report = {'environment': {**environment(), 'budget_enabled': not args.no_budget}, 'results': results}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            report['regressions'] = compare(results, json.load(f), args.threshold)
+
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Résultats écrits dans {path}")
+
+    if args.fail_on_regression and report.get('regressions'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Débit du pipeline complet (décodage, pré-traitement, inférence rejouée, géométrie, conversion
+pour l'affichage) avec le moteur 'Replay' : ni GPU ni poids de modèle. Les sorties rejouées
+sont celles enregistrées via REPLAY_RECORDING (à défaut, une profondeur synthétique).
+
+    python benchmarks/bench_pipeline.py --images 20 --size 1024
+    python benchmarks/bench_pipeline.py --source-engine MoGe --latency-scale 0   # débit hors latence simulée
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import config
+from src.app_controller import AppController
+from src.processing.pipeline import ReconstructionPipeline
+from src.profiling import Tracer, tracing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def write_images(folder: str, count: int, size: int) -> list:
+    rng = np.random.default_rng(0)
+    paths = []
+    for index in range(count):
+        pixels = rng.integers(0, 256, (size * 3 // 4, size, 3), dtype=np.uint8)
+        path = os.path.join(folder, f"synthetic_{index:03d}.jpg")
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit du pipeline complet avec le moteur de rejeu.")
+    parser.add_argument('--images', type=int, default=10)
+    parser.add_argument('--size', type=int, default=1024)
+    parser.add_argument('--source-engine', default=config.ENGINES_CONFIG['Replay']['source_engine'])
+    parser.add_argument('--latency-scale', type=float, default=config.ENGINES_CONFIG['Replay']['latency_scale'])
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results', 'pipeline_latest.json'))
+    args = parser.parse_args()
+
+    config.ENGINES_CONFIG['Replay'].update(source_engine=args.source_engine, latency_scale=args.latency_scale)
+    controller = AppController(discover_items=False, engine_names=['Replay'])
+    pipeline = ReconstructionPipeline(controller)
+    options = {'bg_removal': False, 'resize_to': 'Original', 'depth_scale': 1.0}
+
+    tracer = Tracer("bench_pipeline")
+    with tempfile.TemporaryDirectory() as folder, tracing(tracer):
+        paths = write_images(folder, args.images, args.size)
+        start = time.perf_counter()
+        for path in paths:
+            with contextlib.redirect_stdout(io.StringIO()):
+                mesh = pipeline.run(path, 'Replay', options)
+                controller.trimesh_to_polydata(mesh)
+        elapsed = time.perf_counter() - start
+
+    report = {
+        'images': args.images, 'size': args.size, 'source_engine': args.source_engine,
+        'latency_scale': args.latency_scale, 'elapsed_s': elapsed, 'images_per_s': args.images / elapsed,
+        'stages_s': tracer.stage_totals(),
+    }
+    print(f"{args.images} images en {elapsed:.2f}s ({report['images_per_s']:.2f} images/s)")
+    print(f"Étapes : {tracer.summary()}")
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    tracer.export_chrome_trace(args.output.replace('.json', '.trace.json'))
+    print(f"Résultats écrits dans {args.output}")
+
+if __name__ == '__main__':
+    main()
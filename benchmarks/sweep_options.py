@@ -0,0 +1,83 @@
+"""
+Balayage d'une grille d'options pour un moteur, avec tableau latence / qualité. Les points qui
+partagent leurs options de pré-traitement et d'inférence réutilisent décodage, RMBG et inférence ;
+seules les variantes géométriques sont recalculées (en parallèle). L'écart est mesuré par rapport
+au point de référence (par défaut le dernier de la grille).
+
+    python benchmarks/sweep_options.py --engine DepthFM --images photo.jpg --grid num_steps=1,2,4 ensemble_size=1,2,4,8
+    python benchmarks/sweep_options.py --engine MoGe --images a.jpg b.jpg --grid depth_scale=0.5,1,2 poisson_depth=7,8,9,10,11
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import config
+from src.app_controller import AppController
+from src.processing.pipeline import ReconstructionPipeline
+from src.processing.sweep import SweepRunner, format_table, write_results
+
+def parse_value(raw: str, spec: dict):
+    kind = spec.get('type')
+    if kind == 'int':
+        return int(raw)
+    if kind == 'float':
+        return float(raw)
+    if kind == 'bool':
+        return raw.strip().lower() in ('1', 'true', 'oui', 'yes')
+    return raw
+
+def parse_assignments(items: list, specs: dict, multiple: bool) -> dict:
+    """['a=1,2', 'b=x'] -> {'a': [1, 2], 'b': ['x']} (ou valeurs simples si multiple est faux)."""
+    parsed = {}
+    for item in items or []:
+        key, sep, raw = item.partition('=')
+        if not sep or key not in specs:
+            raise SystemExit(f"Option invalide '{item}' (options connues : {', '.join(sorted(specs))}).")
+        values = [parse_value(value, specs[key]) for value in raw.split(',')] if multiple else parse_value(raw, specs[key])
+        parsed[key] = values
+    return parsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Balayage d'une grille d'options avec partage des étapes communes.")
+    parser.add_argument('--engine', required=True, choices=AppController.engine_names(include_dev=True))
+    parser.add_argument('--images', nargs='+', required=True)
+    parser.add_argument('--grid', nargs='+', required=True, help="option=v1,v2,... (une par option balayée)")
+    parser.add_argument('--set', nargs='*', default=[], help="option=valeur fixée pour tous les points")
+    parser.add_argument('--reference', nargs='*', default=[], help="option=valeur du point de référence")
+    parser.add_argument('--workers', type=int, default=config.SWEEP_CONFIG['geometry_workers'])
+    parser.add_argument('--output-dir', default=config.SWEEP_CONFIG['output_dir'])
+    parser.add_argument('--verbose', action='store_true', help="Affiche les messages du pipeline")
+    args = parser.parse_args()
+
+    specs = {**config.PIPELINE_OPTIONS, **AppController.get_engine_option_specs(args.engine)}
+    grid = parse_assignments(args.grid, specs, multiple=True)
+    base_options = parse_assignments(args.set, specs, multiple=False)
+    reference = parse_assignments(args.reference, specs, multiple=False) or None
+
+    controller = AppController(discover_items=False, engine_names=[args.engine])
+    runner = SweepRunner(ReconstructionPipeline(controller), geometry_workers=args.workers)
+
+    def progress(row):
+        status = 'ÉCHEC' if row['error'] else f"{row['latency_s']:.2f}s"
+        point = ', '.join(f"{key}={row[key]}" for key in grid)
+        print(f"  {row['image']} {point} : {status}", file=sys.__stdout__)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        result = runner.run(args.images, args.engine, grid, base_options, reference, progress)
+
+    summary = result['summary']
+    print(format_table(result))
+    print(f"\n{summary['points']} points x {summary['images']} image(s) : {summary['inference_runs']} inférence(s), "
+          f"{summary['preprocess_runs']} pré-traitement(s), {summary['elapsed_s']:.2f}s "
+          f"(traitements isolés : {summary['sequential_s']:.2f}s).")
+    csv_path, _ = write_results(result, args.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{args.engine}")
+    print(f"Tableau écrit dans {csv_path}")
+
+if __name__ == '__main__':
+    main()
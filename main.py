@@ -1,5 +1,8 @@
 import sys
 import os
+from src.profiling import StartupTimer
+
+startup = StartupTimer()
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,16 +30,31 @@ def add_vendor_to_path():
         print("INFO: Le moteur Depth Anything V2 ne sera pas disponible.")
 
 add_vendor_to_path()
+startup.mark("environnement")
 
 from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QTimer
+startup.mark("PyQt6")
 from src.main_window import MainWindow
+startup.mark("modules de l'application")
 
 def main():
     """Point d'entrée de l'application PyQt."""
     print("--- Lancement de l'application ---")
+    from src import config
+    from src.metrics import start_exporters
+    start_exporters(config.METRICS_CONFIG['http_port'], config.METRICS_CONFIG['dump_path'],
+                    config.METRICS_CONFIG['dump_interval_s'])
     app = QApplication(sys.argv)
     window = MainWindow()
+    startup.mark("construction de la fenêtre")
     window.show()
+
+    def report_startup():
+        startup.mark("premier affichage")
+        print(startup.report())
+    # Exécuté dès que la boucle d'événements a traité l'affichage initial.
+    QTimer.singleShot(0, report_startup)
     sys.exit(app.exec())
 
 if __name__ == "__main__":
@@ -1,6 +1,10 @@
+import time
+_startup_t0 = time.perf_counter()
+
 import os
 import sys
 import base64
+import glob
 import trimesh
 import tempfile
 from PIL import Image
@@ -20,77 +24,459 @@ sys.path.insert(0, project_root)
 from src.app_controller import AppController
 from src.geometry_builder import GeometryBuilder
 from src.engines.preprocessor import RMBGPreprocessor
+from src.engines.replay_engine import record_output
+from src.processing.exporter import export_bytes, write_glb
+from src.processing.geometry_codec import encode_mesh
+from src.processing.image_codec import ImageStore, decode_mask, from_b85, resize_and_pad, sha256_hex, to_b85
+from src.processing.raw_codec import encode_raw_data
+from src.processing.result_cache import DiskResultCache, result_cache_key
+from src.metrics import JOB_DURATION, JOBS, TRANSFERRED_BYTES, start_exporters
+from src.profiling import Tracer, trace_span, tracing
 from src import config as app_config
 
+# Cache disque du worker : volume réseau RunPod s'il est monté (partagé entre workers), sinon dossier temporaire.
+WORKER_CACHE_DIR = os.environ.get(
+    'WORKER_CACHE_DIR',
+    '/runpod-volume/la_forge_cache' if os.path.isdir('/runpod-volume') else os.path.join(tempfile.gettempdir(), 'la_forge_cache')
+)
+# Moteurs chargés et préchauffés au démarrage, séparés par des virgules (ex. "DepthAnythingV2,RMBG").
+# Les autres moteurs sont initialisés à leur première tâche.
+WORKER_PRELOAD_ENGINES = [n.strip() for n in os.environ.get('WORKER_PRELOAD_ENGINES', '').split(',') if n.strip()]
+# Passe avant factice après chargement (compilation des noyaux CUDA, allocations) : la première vraie tâche ne la paie pas.
+WORKER_WARMUP = os.environ.get('WORKER_WARMUP', '1') != '0'
+# Stockage S3 des résultats trop gros pour la sortie JSON (variables standard de runpod.serverless.utils.rp_upload).
+# Sans BUCKET_ENDPOINT_URL, un tel résultat fait échouer la tâche explicitement.
+WORKER_RESULT_BUCKET = os.environ.get('WORKER_RESULT_BUCKET') or None
+WORKER_RESULT_PREFIX = os.environ.get('WORKER_RESULT_PREFIX', 'la_forge_results')
+# Fichiers de résultats : supprimés dès leur upload (upload_result). Ceux qu'une tâche interrompue
+# aurait laissés derrière elle sont supprimés au-delà de ce délai.
+WORKER_OUTPUT_DIR = os.path.join(tempfile.gettempdir(), 'la_forge_outputs')
+WORKER_OUTPUT_RETENTION_S = float(os.environ.get('WORKER_OUTPUT_RETENTION_S', '600'))
+# Enregistre les sorties réelles des moteurs sur le volume du worker, pour le moteur 'Replay'.
+if os.environ.get('WORKER_RECORD_OUTPUTS', '0') != '0':
+    app_config.REPLAY_RECORDING = {**app_config.REPLAY_RECORDING, 'enabled': True,
+                                   'dir': os.path.join(WORKER_CACHE_DIR, 'recordings')}
+
+# Métriques Prometheus du worker : serveur HTTP local (port) et/ou fichier réécrit périodiquement
+# (sur le volume réseau, pour un collecteur extérieur). Par défaut, les valeurs de METRICS_CONFIG.
+start_exporters(os.environ.get('WORKER_METRICS_PORT') or app_config.METRICS_CONFIG['http_port'],
+                os.environ.get('WORKER_METRICS_DUMP') or app_config.METRICS_CONFIG['dump_path'],
+                app_config.METRICS_CONFIG['dump_interval_s'], host='0.0.0.0')
+
+startup_timings = {'imports': time.perf_counter() - _startup_t0}
+# Répartition du démarrage à froid, jointe à la sortie de la première tâche puis remise à None.
+startup_report = None
+
+
+def timed(label: str, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    startup_timings[label] = time.perf_counter() - start
+    return result
+
+
+def warmup_engine(engine_name: str):
+    """Charge le modèle puis exécute une passe avant sur une image factice, avec les options par défaut."""
+    if engine_name == 'RMBG':
+        preprocessor.load_model_if_needed()
+        if WORKER_WARMUP:
+            preprocessor.process(Image.new("RGB", (512, 512), (127, 127, 127)))
+        return
+    engine = controller.get_engine(engine_name)
+    if engine is None:
+        print(f"AVERTISSEMENT: Moteur à précharger '{engine_name}' indisponible.")
+        return
+    options = controller.get_default_options(engine_name)
+    if hasattr(engine, '_load_specific_variant') and 'model_variant' in options:
+        # Depth Anything V2 : les poids dépendent de la variante, load_model_if_needed ne charge rien.
+        engine._load_specific_variant(options['model_variant'])
+    else:
+        engine.load_model_if_needed()
+    if WORKER_WARMUP:
+        dummy = Image.new("RGB", (518, 518), (127, 127, 127))
+        if engine.CAPABILITIES.get('single_image', False):
+            engine.process(dummy, options)
+        elif engine.CAPABILITIES.get('scene_folder', False):
+            engine.process_scene([dummy, dummy], options)
+
+
+def cleanup_outputs(max_age_s: float):
+    """
+    Supprime les fichiers de résultats orphelins plus anciens que max_age_s. Un résultat uploadé
+    est déjà supprimé par upload_result ; il ne reste ici que ceux d'une tâche interrompue
+    (upload en échec, worker arrêté). Le délai protège l'upload en cours d'une tâche concurrente.
+    """
+    now = time.time()
+    for path in glob.glob(os.path.join(WORKER_OUTPUT_DIR, '*')):
+        try:
+            if now - os.path.getmtime(path) > max_age_s:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def output_path(suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(dir=WORKER_OUTPUT_DIR, suffix=suffix, delete=False) as tmp_file:
+        return tmp_file.name
+
+
 print("--- Initialisation du Worker RunPod (démarrage à froid) ---")
-controller = AppController()
+os.makedirs(WORKER_OUTPUT_DIR, exist_ok=True)
+cleanup_outputs(0)
+# Pas de parcours d'INPUT_FOLDER sur le worker ; seuls les moteurs à précharger sont importés maintenant.
+controller = timed('controller', AppController, False,
+                   [n for n in WORKER_PRELOAD_ENGINES if n in app_config.ENGINES_CONFIG])
 builder = GeometryBuilder()
 preprocessor = RMBGPreprocessor(app_config.DEVICE)
+image_store = ImageStore(os.path.join(WORKER_CACHE_DIR, 'images'))
+# Résultats déjà calculés : une tâche identique (même image, moteur, options, format) est servie sans GPU.
+result_cache = (DiskResultCache(os.path.join(WORKER_CACHE_DIR, 'results'), app_config.REMOTE_RESULT_CACHE['worker_max_bytes'],
+                                name='worker_results')
+                if app_config.REMOTE_RESULT_CACHE['enabled'] else None)
+for name in WORKER_PRELOAD_ENGINES:
+    try:
+        timed(f"preload:{name}", warmup_engine, name)
+    except Exception as e:
+        print(f"AVERTISSEMENT: Échec du préchargement de '{name}': {e}")
+startup_timings['total'] = time.perf_counter() - _startup_t0
+startup_report = {k: round(v, 3) for k, v in startup_timings.items()}
+print("Démarrage à froid : " + ", ".join(f"{k}={v:.2f}s" for k, v in startup_timings.items()))
 print("--- Worker prêt à recevoir des tâches ---")
 # ---------------------------------------------
 
 
-def handler(job):
+class MissingImageError(LookupError):
+    """L'image référencée par empreinte n'est pas (ou plus) dans le cache de ce worker."""
+
+
+def decode_job_image(job_input: dict):
+    """
+    Retourne (image PIL, masque ou None) à partir de l'entrée de la tâche.
+    Formats acceptés : 'image_b85' (+ 'mask_b85') compressés côté client, référence
+    'image_sha256' à une image déjà reçue, ou 'image_b64' (fichier original, ancien format).
+    """
+    if job_input.get('image_b64'):
+        return Image.open(io.BytesIO(base64.b64decode(job_input['image_b64']))).convert("RGB"), None
+
+    digest = job_input['image_sha256']
+    if job_input.get('image_b85'):
+        image_data = from_b85(job_input['image_b85'])
+        mask_data = from_b85(job_input['mask_b85']) if job_input.get('mask_b85') else b''
+        TRANSFERRED_BYTES.inc(len(image_data) + len(mask_data), direction='received', channel='worker')
+        if sha256_hex(image_data + mask_data) != digest:
+            raise ValueError("L'empreinte SHA-256 ne correspond pas aux données reçues.")
+        image_store.put(digest, image_data)
+        if mask_data:
+            image_store.put(f"{digest}_mask", mask_data)
+    else:
+        image_data = image_store.get(digest)
+        if image_data is None:
+            raise MissingImageError(digest)
+        mask_data = image_store.get(f"{digest}_mask") or b''
+
+    with trace_span("décodage"):
+        img = Image.open(io.BytesIO(image_data)).convert("RGB")
+        return img, (decode_mask(mask_data) if mask_data else None)
+
+
+SUPPORTED_RESULT_FORMATS = ('lfvg', 'glb')
+
+def upload_result(path: str) -> str:
+    """
+    Uploade un fichier de résultat vers le stockage S3 configuré et retourne son URL (pré-signée).
+    Le fichier local est supprimé ensuite : le client ne peut jamais lire le disque du worker.
+    """
+    if not os.environ.get('BUCKET_ENDPOINT_URL'):
+        raise RuntimeError(
+            f"Résultat de {os.path.getsize(path) / 1024 ** 2:.1f} Mo trop gros pour être renvoyé en ligne, "
+            "et aucun stockage n'est configuré pour l'uploader (BUCKET_ENDPOINT_URL, BUCKET_ACCESS_KEY_ID, "
+            "BUCKET_SECRET_ACCESS_KEY). Configurez un bucket ou augmentez REMOTE_RESULT_CONFIG['inline_max_bytes'].")
+    from runpod.serverless.utils import rp_upload
+    try:
+        with trace_span("upload", bytes=os.path.getsize(path)):
+            url = rp_upload.upload_file_to_bucket(file_name=os.path.basename(path), file_location=path,
+                                                  bucket_name=WORKER_RESULT_BUCKET, prefix=WORKER_RESULT_PREFIX)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    if not url or not str(url).startswith(('http://', 'https://')):
+        raise RuntimeError(f"L'upload du résultat n'a pas renvoyé d'URL exploitable ({url!r}).")
+    return url
+
+
+def package_result(data: bytes, result_format: str, allow_inline: bool = True):
+    """
+    Un petit résultat est renvoyé directement dans la sortie JSON ; un gros résultat
+    est écrit dans un fichier temporaire, uploadé vers le bucket configuré, et son URL renvoyée.
+    """
+    TRANSFERRED_BYTES.inc(len(data), direction='sent', channel='worker')
+    if allow_inline and len(data) <= app_config.REMOTE_RESULT_CONFIG['inline_max_bytes']:
+        print(f"Résultat '{result_format}' renvoyé en ligne ({len(data) / 1024:.0f} Ko).")
+        return {"format": result_format, "data_b85": to_b85(data)}
+
+    temp_path = output_path(f".{result_format}")
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    url = upload_result(temp_path)
+    print(f"Résultat '{result_format}' uploadé ({len(data) / 1024 ** 2:.1f} Mo).")
+    return {"format": result_format, "url": url}
+
+
+def output_kind(job_input: dict) -> str:
+    """'raw' (mode "hybrid") ou le premier format de maillage demandé que le worker connaît."""
+    if job_input.get('output') == 'raw':
+        return 'raw'
+    return next((f for f in job_input.get('result_formats') or [] if f in SUPPORTED_RESULT_FORMATS), 'glb')
+
+
+def cached_result(image_sha256, engine_name: str, options: dict, job_input: dict):
+    """Retourne (clé, résultat en cache ou None) ; la clé est None si la tâche n'est pas cachable."""
+    if result_cache is None or not image_sha256:
+        return None, None
+    key = result_cache_key(image_sha256, engine_name, options, output_kind(job_input))
+    return key, result_cache.get(key)
+
+
+def encode_result(mesh, result_format: str):
+    """Exporte le maillage dans le format choisi. Retourne (format, octets)."""
+    if result_format == 'lfvg':
+        return result_format, encode_mesh(mesh, app_config.REMOTE_RESULT_CONFIG['compression'])
+    return result_format, export_bytes(mesh, result_format)
+
+
+def preprocess_input(img, fg_mask, options: dict):
+    """
+    Étapes de pré-traitement demandées (celles déjà faites côté client sont neutralisées
+    dans les options). Retourne (image, masque, masque calculé par le worker ou None).
+    """
+    resize_target = options.get('resize_to', 'Original')
+    if resize_target != 'Original':
+        with trace_span("redimensionnement"):
+            img = resize_and_pad(img, int(resize_target))
+
+    worker_mask = None
+    if options.get('bg_removal', False):
+        with trace_span("RMBG"):
+            preproc_data = preprocessor.process(img)
+        img = preproc_data['image']
+        fg_mask = worker_mask = preproc_data['mask']
+    return img, fg_mask, worker_mask
+
+
+def encode_output(job_input: dict, raw_data: dict, img, fg_mask, worker_mask, options: dict):
+    """Retourne (format, octets) : données brutes (mode "hybrid") ou maillage construit ici."""
+    # Mode "hybrid" : seules les données brutes (et le masque RMBG calculé ici) sont renvoyées,
+    # le client construit la géométrie lui-même.
+    if job_input.get('output') == 'raw':
+        with trace_span("encodage du résultat", format='npz'):
+            return 'npz', encode_raw_data(raw_data, worker_mask, app_config.REMOTE_RESULT_CONFIG['raw_float_dtype'])
+
+    mesh = builder.build(raw_data, np.array(img), fg_mask, options)
+    if not mesh:
+        raise ValueError("La construction de la géométrie a échoué.")
+    with trace_span("encodage du résultat", format=output_kind(job_input)):
+        return encode_result(mesh, output_kind(job_input))
+
+
+def infer_batch(engine, engine_name: str, images: list, options: dict) -> list:
+    """
+    Inférence groupée d'images de mêmes options. Si le lot échoue, reprise image par image :
+    l'exception d'un élément défaillant prend sa place dans la liste retournée.
+    """
+    try:
+        start = time.perf_counter()
+        with trace_span("inférence", engine=engine_name, images=len(images)):
+            raw_batch = engine.process_batch(images, options)
+        for image, raw_data in zip(images, raw_batch):
+            record_output(engine_name, image, options, raw_data, (time.perf_counter() - start) / len(images))
+        return raw_batch
+    except Exception as e:
+        # Un élément défaillant ne doit pas faire échouer tout le groupe : on isole l'erreur.
+        print(f"AVERTISSEMENT: Échec du lot ({e}), reprise image par image.")
+        raw_batch = []
+        for image in images:
+            try:
+                raw_batch.append(engine.process(image, options))
+            except Exception as item_error:
+                raw_batch.append(item_error)
+        return raw_batch
+
+
+def process_batch_job(job_input: dict, engine_name: str):
+    """
+    Tâche multi-images : {'items': [{'id', 'image_b85' | 'image_sha256', 'mask_b85', 'options'}, ...]}.
+    Les options de chaque élément complètent les options partagées de la tâche. Les images de
+    mêmes options passent ensemble dans le moteur ; chaque élément a son propre résultat ou sa propre erreur.
+    Les images sont décodées et prétraitées lot par lot ('batch_size' du moteur) : la mémoire
+    occupée ne croît pas avec le nombre d'éléments de la tâche.
+    """
+    engine = controller.get_engine(engine_name)
+    if engine is None:
+        return {"error": f"Moteur '{engine_name}' indisponible sur ce worker."}
+
+    items = job_input['items']
+    shared_options = job_input.get('options', {})
+    results = [None] * len(items)
+    groups = {}  # options gelées -> (options, indices des éléments à inférer)
+    cache_keys = {}  # indice -> clé du cache de résultats
+    # La sortie JSON totale reste bornée : au-delà du seuil, les résultats passent par des fichiers.
+    inline_left = app_config.REMOTE_RESULT_CONFIG['inline_max_bytes']
+
+    for index, item in enumerate(items):
+        try:
+            options = {**shared_options, **item.get('options', {})}
+            cache_key, cached = cached_result(item.get('image_sha256'), engine_name, options, job_input)
+            if cached is not None:
+                packaged = package_result(cached[1], cached[0], allow_inline=len(cached[1]) <= inline_left)
+                if "data_b85" in packaged:
+                    inline_left -= len(cached[1])
+                results[index] = {"id": item.get('id', index), "cached": True, **packaged}
+                continue
+            cache_keys[index] = cache_key
+            groups.setdefault(tuple(sorted(options.items())), (options, []))[1].append(index)
+        except Exception as e:
+            results[index] = {"id": item.get('id', index), "error": f"{type(e).__name__}: {e}"}
+
+    if groups and not engine.is_loaded:
+        with trace_span("chargement du modèle", engine=engine_name):
+            engine.load_model_if_needed()
+    chunk_size = max(1, engine.config.get('batch_size', 4))
+    for options, indices in groups.values():
+        for start in range(0, len(indices), chunk_size):
+            inputs = {}  # indice -> (image, masque, masque du worker), pour ce lot seulement
+            for index in indices[start:start + chunk_size]:
+                item_id = items[index].get('id', index)
+                try:
+                    img, fg_mask = decode_job_image(items[index])
+                    inputs[index] = preprocess_input(img, fg_mask, options)
+                except MissingImageError as e:
+                    results[index] = {"id": item_id, "missing_image": str(e)}
+                except Exception as e:
+                    results[index] = {"id": item_id, "error": f"{type(e).__name__}: {e}"}
+            if not inputs:
+                continue
+
+            chunk = list(inputs)
+            raw_batch = infer_batch(engine, engine_name, [inputs[i][0] for i in chunk], options)
+            for index, raw_data in zip(chunk, raw_batch):
+                item_id = items[index].get('id', index)
+                img, fg_mask, worker_mask = inputs.pop(index)
+                try:
+                    if isinstance(raw_data, Exception):
+                        raise raw_data
+                    result_format, data = encode_output(job_input, raw_data, img, fg_mask, worker_mask, options)
+                    if cache_keys.get(index):
+                        result_cache.put(cache_keys[index], result_format, data)
+                    packaged = package_result(data, result_format, allow_inline=len(data) <= inline_left)
+                    if "data_b85" in packaged:
+                        inline_left -= len(data)
+                    results[index] = {"id": item_id, **packaged}
+                except Exception as e:
+                    results[index] = {"id": item_id, "error": f"{type(e).__name__}: {e}"}
+
+    failed = sum(1 for r in results if "error" in r)
+    print(f"Tâche multi-images terminée : {len(items) - failed}/{len(items)} réussies.")
+    return {"results": results}
+
+
+def process_job(job):
     try:
         job_input = job.get('input', {}) # Utilise .get() pour la sécurité
 
         # --- VÉRIFICATION DE L'ENTRÉE ---
         # Si c'est une requête de test ou une entrée invalide, on s'arrête poliment.
-        image_b64 = job_input.get('image_b64')
+        has_image = bool(job_input.get('items')) or any(job_input.get(k) for k in ('image_b64', 'image_b85', 'image_sha256'))
         engine_name = job_input.get('engine_name')
 
-        if not all([image_b64, engine_name]):
-            error_msg = "Entrée invalide. Les clés 'image_b64' et 'engine_name' sont requises."
+        if not (has_image and engine_name):
+            error_msg = "Entrée invalide. Une image ('image_b85', 'image_sha256' ou 'image_b64') ou une liste 'items', et 'engine_name' sont requis."
             print(error_msg)
             # On retourne une erreur propre au lieu de crasher.
             # RunPod verra ça comme une tâche terminée (avec erreur), pas comme un worker planté.
             return {"error": error_msg}
         # ------------------------------------
 
+        if job_input.get('items'):
+            return process_batch_job(job_input, engine_name)
+
         options = job_input.get('options', {}) # .get() pour les options aussi
-        image_bytes = base64.b64decode(image_b64)
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        
-        # --- Traitement (ne change pas) ---
-        def resize_and_pad(img_in: Image.Image, target_size: int, divisor: int = 64) -> Image.Image:
-            import math
-            img_in.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
-            new_width = int(math.ceil(img_in.width / divisor)) * divisor
-            new_height = int(math.ceil(img_in.height / divisor)) * divisor
-            padded_image = Image.new("RGB", (new_width, new_height), (0, 0, 0))
-            padded_image.paste(img_in, ((new_width - img_in.width) // 2, (new_height - img_in.height) // 2))
-            return padded_image
-
-        resize_target = options.get('resize_to', 'Original')
-        if resize_target != 'Original':
-            img = resize_and_pad(img, int(resize_target))
-        
-        fg_mask = None
-        if options.get('bg_removal', False):
-            preproc_data = preprocessor.process(img)
-            img = preproc_data['image']
-            fg_mask = preproc_data['mask']
-        
+        legacy_output = not job_input.get('result_formats') and job_input.get('output') != 'raw'
+        cache_key, cached = (None, None) if legacy_output else cached_result(
+            job_input.get('image_sha256'), engine_name, options, job_input)
+        if cached is not None:
+            print("Résultat servi depuis le cache du worker, sans inférence.")
+            return {**package_result(cached[1], cached[0]), "cached": True}
+
+        try:
+            img, fg_mask = decode_job_image(job_input)
+        except MissingImageError as e:
+            # Sortie normale (pas une erreur) : le client renverra la tâche avec les données de l'image.
+            print(f"Image {e} absente du cache du worker, renvoi demandé au client.")
+            return {"missing_image": str(e)}
+
+        # --- Traitement ---
+        img, fg_mask, worker_mask = preprocess_input(img, fg_mask, options)
+
         engine = controller.get_engine(engine_name)
-        engine.load_model_if_needed()
-        raw_data = engine.process(img, options)
-        mesh = builder.build(raw_data, np.array(img), fg_mask, options)
-        
-        if not mesh:
-            raise ValueError("La construction de la géométrie a échoué.")
-        # --- Fin du traitement ---
+        if not engine.is_loaded:
+            with trace_span("chargement du modèle", engine=engine_name):
+                engine.load_model_if_needed()
+        start = time.perf_counter()
+        with trace_span("inférence", engine=engine_name):
+            raw_data = engine.process(img, options)
+        record_output(engine_name, img, options, raw_data, time.perf_counter() - start)
+
+        # Sans 'result_formats' ni sortie brute (ancien client), on renvoie le chemin du GLB comme auparavant.
+        if legacy_output:
+            mesh = builder.build(raw_data, np.array(img), fg_mask, options)
+            if not mesh:
+                raise ValueError("La construction de la géométrie a échoué.")
+            temp_path = output_path(".glb")
+            write_glb(mesh, temp_path)
+            url = upload_result(temp_path)
+            print(f"Maillage exporté et uploadé : {url}")
+            return url
 
-        with tempfile.NamedTemporaryFile(suffix=".glb", delete=False) as tmp_file:
-            mesh.export(file_obj=tmp_file.name, file_type='glb')
-            temp_path = tmp_file.name
-        
-        print(f"Maillage exporté vers {temp_path}. RunPod va l'uploader.")
-        
-        return temp_path
+        result_format, data = encode_output(job_input, raw_data, img, fg_mask, worker_mask, options)
+        if cache_key is not None:
+            result_cache.put(cache_key, result_format, data)
+        # --- Fin du traitement ---
+        return package_result(data, result_format)
 
     except Exception as e:
         error_message = f"Erreur dans le handler: {traceback.format_exc()}"
         print(error_message)
         return {"error": error_message}
 
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+def job_status(output) -> str:
+    """Statut d'une sortie (tâche simple ou élément d'une tâche multi-images) pour la métrique JOBS."""
+    if not isinstance(output, (dict, str)) or (isinstance(output, dict) and "error" in output):
+        return 'error'
+    return 'cached' if isinstance(output, dict) and output.get('cached') else 'success'
+
+def handler(job):
+    global startup_report
+    cleanup_outputs(WORKER_OUTPUT_RETENTION_S)
+    tracer = Tracer("worker") if app_config.PROFILING_CONFIG['enabled'] else None
+    start = time.perf_counter()
+    with tracing(tracer):
+        output = process_job(job)
+    engine_name = (job.get('input') or {}).get('engine_name', '')
+    # Tâche multi-images : un statut par élément, une tâche dont tous les éléments échouent n'est pas un succès.
+    outcomes = output["results"] if isinstance(output, dict) and "results" in output else [output]
+    for outcome in outcomes:
+        JOBS.inc(engine=engine_name, mode='worker', status=job_status(outcome))
+    JOB_DURATION.observe(time.perf_counter() - start, engine=engine_name, mode='worker')
+    # Répartition du temps par étape sur le worker, affichée par le client.
+    if tracer is not None and tracer.spans and isinstance(output, dict) and "error" not in output:
+        output = {**output, "trace": {k: round(v, 3) for k, v in tracer.stage_totals().items()}}
+        print(f"Étapes : {tracer.summary()}")
+    # La première tâche après un démarrage à froid rapporte la répartition du temps de démarrage.
+    if startup_report is not None and isinstance(output, dict) and "error" not in output:
+        output = {**output, "cold_start": startup_report}
+        startup_report = None
+    return output
+
+runpod.serverless.start({"handler": handler})
@@ -0,0 +1,220 @@
+"""
+Serveur local qui imite l'API REST de RunPod Serverless (/run, /runsync, /status, /cancel, /health)
+pour plusieurs endpoints, avec démarrages à froid, files d'attente, échecs et limitations simulés.
+Il sert à éprouver le routage multi-endpoints et le hedging du client sans GPU ni compte RunPod.
+
+Exemple :
+    python remote_worker/standin_endpoint.py --port 8000 \\
+        --endpoint rapide:cold=0,job=1 --endpoint lent:cold=20,job=3,fail=0.1,throttle=0.2
+puis dans src/config.py :
+    RUNPOD_API_BASE_URL = "http://127.0.0.1:8000"
+    RUNPOD_ENDPOINT_IDS = ["rapide", "lent"]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import trimesh
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.processing.geometry_codec import encode_mesh
+from src.processing.image_codec import from_b85, to_b85
+from src.processing.raw_codec import encode_raw_data
+
+class SimulatedEndpoint:
+    """Un endpoint à un seul worker : les tâches passent l'une après l'autre."""
+    def __init__(self, endpoint_id: str, cold=10.0, job=1.0, fail=0.0, throttle=0.0, idle=60.0):
+        self.endpoint_id = endpoint_id
+        self.cold_start_s = float(cold)
+        self.job_s = float(job)
+        self.failure_rate = float(fail)
+        self.throttle_rate = float(throttle)
+        self.idle_timeout_s = float(idle)
+        self.busy_until = 0.0
+        self.warm_until = 0.0
+
+    def schedule(self, now: float):
+        """Retourne (début, fin) d'une nouvelle tâche, démarrage à froid compris si le worker dort."""
+        start = max(now, self.busy_until)
+        if start > self.warm_until:
+            start += self.cold_start_s
+        end = start + self.job_s * random.uniform(0.8, 1.5)
+        self.busy_until = end
+        self.warm_until = end + self.idle_timeout_s
+        return start, end
+
+class StandInState:
+    def __init__(self, endpoints: dict):
+        self.endpoints = endpoints
+        self.jobs = {}
+        self.image_sizes = {}  # empreinte -> (largeur, hauteur) des images reçues
+        self.lock = threading.Lock()
+        self.mesh = trimesh.creation.icosphere(subdivisions=3)
+
+    def submit(self, endpoint: SimulatedEndpoint, job_input: dict) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            start, end = endpoint.schedule(now)
+            job_id = str(uuid.uuid4())
+            self.jobs[job_id] = {
+                'endpoint': endpoint.endpoint_id, 'input': job_input, 'submitted': now,
+                'start': start, 'end': end, 'fail': random.random() < endpoint.failure_rate, 'cancelled': False,
+            }
+        return self.status(job_id)
+
+    def cancel(self, job_id: str):
+        """
+        Annule une tâche et libère le temps qu'elle occupait encore sur le worker : les tâches
+        suivantes de l'endpoint avancent d'autant (sinon les perdants du hedging gonfleraient la file).
+        """
+        now = time.monotonic()
+        with self.lock:
+            job = self.jobs[job_id]
+            if job['cancelled'] or now >= job['end']:
+                job['cancelled'] = True
+                return
+            job['cancelled'] = True
+            endpoint = self.endpoints[job['endpoint']]
+            released = job['end'] - max(now, job['start'])
+            for other in self.jobs.values():
+                if other['endpoint'] == job['endpoint'] and not other['cancelled'] and other['start'] >= job['end']:
+                    other['start'] -= released
+                    other['end'] -= released
+            endpoint.busy_until = max(now, endpoint.busy_until - released)
+            job['end'] = max(now, job['start'])
+
+    def _output(self, job_input: dict):
+        items = job_input.get('items')
+        if items:
+            return {"results": [{"id": item.get('id', i), **self._item_output(job_input, item)} for i, item in enumerate(items)]}
+        return self._item_output(job_input, job_input)
+
+    def _item_output(self, job_input: dict, item: dict) -> dict:
+        digest = item.get('image_sha256')
+        if item.get('image_b85'):
+            self.image_sizes[digest] = Image.open(io.BytesIO(from_b85(item['image_b85']))).size
+        elif digest not in self.image_sizes:
+            return {"missing_image": digest}
+        if job_input.get('output') == 'raw':
+            width, height = self.image_sizes[digest]
+            depth = np.tile(np.linspace(0.0, 1.0, width, dtype=np.float32), (height, 1))
+            return {"format": "npz", "data_b85": to_b85(encode_raw_data({'depth_map': depth}))}
+        if 'lfvg' in (job_input.get('result_formats') or []):
+            return {"format": "lfvg", "data_b85": to_b85(encode_mesh(self.mesh))}
+        return {"format": "glb", "data_b85": to_b85(self.mesh.export(file_type='glb'))}
+
+    def status(self, job_id: str) -> dict:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        now = time.monotonic()
+        status = {"id": job_id}
+        if job['cancelled']:
+            status["status"] = "CANCELLED"
+        elif now < job['start']:
+            status["status"] = "IN_QUEUE"
+        elif now < job['end']:
+            status["status"] = "IN_PROGRESS"
+        else:
+            status["delayTime"] = int((job['start'] - job['submitted']) * 1000)
+            status["executionTime"] = int((job['end'] - job['start']) * 1000)
+            if job['fail']:
+                status.update(status="FAILED", error="Échec simulé du worker.")
+            else:
+                status.update(status="COMPLETED", output=self._output(job['input']))
+        return status
+
+    def health(self, endpoint: SimulatedEndpoint) -> dict:
+        now = time.monotonic()
+        jobs = [j for j in self.jobs.values() if j['endpoint'] == endpoint.endpoint_id and not j['cancelled']]
+        busy = now < endpoint.busy_until
+        warm = now <= endpoint.warm_until
+        return {
+            "jobs": {"inQueue": sum(1 for j in jobs if now < j['start']),
+                     "inProgress": sum(1 for j in jobs if j['start'] <= now < j['end'])},
+            "workers": {"idle": int(warm and not busy), "running": int(busy)},
+        }
+
+def make_handler(state: StandInState):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, body: dict = None):
+            data = json.dumps(body or {}).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self):
+            parts = [p for p in self.path.split('/') if p]
+            endpoint = state.endpoints.get(parts[0]) if parts else None
+            return endpoint, parts[1:]
+
+        def do_GET(self):
+            endpoint, parts = self._route()
+            if endpoint is None:
+                return self._send(404, {"error": "Endpoint inconnu."})
+            if parts == ['health']:
+                return self._send(200, state.health(endpoint))
+            if len(parts) == 2 and parts[0] == 'status':
+                status = state.status(parts[1])
+                return self._send(200, status) if status else self._send(404, {"error": "Tâche inconnue."})
+            self._send(404, {"error": "Route inconnue."})
+
+        def do_POST(self):
+            endpoint, parts = self._route()
+            if endpoint is None:
+                return self._send(404, {"error": "Endpoint inconnu."})
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if parts in (['run'], ['runsync']):
+                if random.random() < endpoint.throttle_rate:
+                    return self._send(429, {"error": "Limitation simulée."})
+                status = state.submit(endpoint, body.get('input', {}))
+                if parts == ['runsync']:
+                    # /runsync attend la fin de la tâche dans une limite de temps, comme RunPod.
+                    deadline = time.monotonic() + 30
+                    while status["status"] in ("IN_QUEUE", "IN_PROGRESS") and time.monotonic() < deadline:
+                        time.sleep(0.05)
+                        status = state.status(status["id"])
+                return self._send(200, status)
+            if len(parts) == 2 and parts[0] == 'cancel' and parts[1] in state.jobs:
+                state.cancel(parts[1])
+                return self._send(200, {"id": parts[1], "status": "CANCELLED"})
+            self._send(404, {"error": "Route inconnue."})
+
+        def log_message(self, format, *args):
+            print(f"[stand-in] {self.address_string()} {format % args}")
+
+    return Handler
+
+def parse_endpoint(spec: str) -> SimulatedEndpoint:
+    """'nom:cold=20,job=2,fail=0.1,throttle=0.2,idle=60' -> SimulatedEndpoint."""
+    name, _, params = spec.partition(':')
+    kwargs = dict(p.split('=', 1) for p in params.split(',') if p)
+    return SimulatedEndpoint(name, **kwargs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoints RunPod simulés (tests du client distant).")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--endpoint', action='append', default=[],
+                        help="nom:cold=S,job=S,fail=P,throttle=P,idle=S (répétable)")
+    args = parser.parse_args()
+    endpoints = [parse_endpoint(spec) for spec in args.endpoint or ['standin:cold=10,job=1']]
+    state = StandInState({e.endpoint_id: e for e in endpoints})
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(state))
+    print(f"Endpoints simulés sur http://127.0.0.1:{args.port} : {', '.join(state.endpoints)}")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -1,77 +1,185 @@
 import os
 import importlib
+import threading
+import time
 import numpy as np
-import pyvista as pv
 from PIL import Image
 from src import config
+from src.budget import BudgetReport, ResourceBudget
+from src.profiling import trace_span
+from src.processing.compact_raw import RawDataCache
+from src.processing.sequence import first_video_frame, natural_sort_key
+from src.spatial_index import SpatialIndexCache
+
+class MeshCache(dict):
+    """
+    Cache des maillages finaux (clé -> maillage). Il est rempli depuis les threads de traitement :
+    les écritures et snapshot() passent par un verrou, pour que l'interface en prenne une copie
+    cohérente (export) sans « dictionary changed size during iteration ».
+    """
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key, mesh):
+        with self._lock:
+            super().__setitem__(key, mesh)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self)
 
 class AppController:
     """
     Le cerveau. Gère la logique, les données, les caches et les moteurs.
     """
-    def __init__(self):
+    IMAGE_EXTENSIONS = ('.jpg', '.png', '.jpeg')
+    VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+    def __init__(self, discover_items: bool = True, engine_names=()):
+        """
+        discover_items : parcourt INPUT_FOLDER (inutile sur un worker distant).
+        engine_names : moteurs à initialiser tout de suite (None = tous). Par défaut aucun :
+        les moteurs sont listés d'après ENGINES_CONFIG et leur module n'est importé
+        qu'à la première demande via get_engine (démarrage rapide de l'interface).
+        """
         self.items = []
         self.engines = {}
-        self.raw_data_cache = {} # Pour les résultats lents de l'IA
-        self.mesh_cache = {}       # Pour le résultat 3D final
+        self.engine_errors = {}  # Moteurs dont l'initialisation a échoué (non retentés)
+        self.raw_data_cache = RawDataCache.from_config() # Pour les résultats lents de l'IA (compacts, bornés en octets)
+        self.mesh_cache = MeshCache()  # Pour le résultat 3D final
+        self.spatial_indexes = SpatialIndexCache()  # Index spatial de chaque résultat affiché (outils de mesure)
         self.thumbnail_cache = {}
         self.preview_cache = {}
+        self.budget = ResourceBudget.from_config()
 
         self.THUMB_SIZE = (128, 128)
         self.PREVIEW_SIZE = (400, 400)
 
-        self._discover_items()
-        self._load_engines()
+        if discover_items:
+            self._discover_items()
+        self._load_engines(engine_names)
 
     def _discover_items(self):
         folder = config.INPUT_FOLDER
         try:
             dirs = [os.path.join(folder, d) for d in os.listdir(folder) if os.path.isdir(os.path.join(folder, d))]
-            files = [os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
+            extensions = self.IMAGE_EXTENSIONS + self.VIDEO_EXTENSIONS
+            files = [os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(extensions)]
             self.items = sorted(dirs) + sorted(files)
-            print(f"{len(self.items)} items (images/scènes) trouvés.")
+            print(f"{len(self.items)} items (images/scènes/séquences) trouvés.")
         except FileNotFoundError:
             print(f"ERREUR: Dossier d'entrée '{folder}' non trouvé.")
     
-    def _load_engines(self):
+    def _load_engines(self, engine_names=None):
+        names = list(config.ENGINES_CONFIG if engine_names is None else engine_names)
+        if not names:
+            return
         print("Chargement des moteurs de reconstruction...")
-        for name, cfg in config.ENGINES_CONFIG.items():
-            try:
-                module = importlib.import_module(cfg['module'])
-                EngineClass = getattr(module, cfg['class'])
-                self.engines[name] = EngineClass(cfg, config.DEVICE)
-                print(f"  - Moteur '{name}' initialisé.")
-            except Exception as e:
-                print(f"Erreur lors de l'initialisation du moteur '{name}': {e}")
+        for name in names:
+            self._load_engine(name)
         print("Moteurs chargés.")
 
+    def _load_engine(self, name):
+        cfg = config.ENGINES_CONFIG.get(name)
+        if cfg is None:
+            print(f"Erreur : moteur '{name}' absent de la configuration.")
+            return None
+        try:
+            start = time.perf_counter()
+            module = importlib.import_module(cfg['module'])
+            EngineClass = getattr(module, cfg['class'])
+            self.engines[name] = EngineClass(cfg, config.DEVICE)
+            print(f"  - Moteur '{name}' initialisé ({time.perf_counter() - start:.2f}s).")
+        except Exception as e:
+            self.engine_errors[name] = e
+            print(f"Erreur lors de l'initialisation du moteur '{name}': {e}")
+        return self.engines.get(name)
+
+    def list_scene_images(self, folder: str) -> list:
+        """Liste triée des images d'un dossier de scène (vues multiples)."""
+        return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(self.IMAGE_EXTENSIONS))
+
+    def is_video(self, path: str) -> bool:
+        return os.path.isfile(path) and path.lower().endswith(self.VIDEO_EXTENSIONS)
+
+    def is_sequence(self, path: str) -> bool:
+        """Vidéo, ou dossier d'images numérotées (nom suffixé, voir SEQUENCE_CONFIG['folder_suffixes'])."""
+        if self.is_video(path):
+            return True
+        name = os.path.basename(os.path.normpath(path)).lower()
+        return os.path.isdir(path) and name.endswith(tuple(config.SEQUENCE_CONFIG['folder_suffixes']))
+
+    def list_sequence_frames(self, folder: str) -> list:
+        """Images d'un dossier de séquence, dans l'ordre de leur numéro (frame_2 avant frame_10)."""
+        names = [f for f in os.listdir(folder) if f.lower().endswith(self.IMAGE_EXTENSIONS)]
+        return [os.path.join(folder, f) for f in sorted(names, key=natural_sort_key)]
+
+    def _open_item_image(self, path: str) -> Image.Image:
+        """Image représentant un item : le fichier lui-même, ou la première image d'une vidéo."""
+        return first_video_frame(path) if self.is_video(path) else Image.open(path)
+
+    @staticmethod
+    def engine_names(include_dev: bool = None) -> list:
+        """
+        Moteurs déclarés dans ENGINES_CONFIG (sans importer leur module). Les moteurs 'dev_only'
+        (Replay) n'apparaissent que si include_dev, ou par défaut si SHOW_DEV_ENGINES.
+        """
+        include_dev = config.SHOW_DEV_ENGINES if include_dev is None else include_dev
+        return [name for name, cfg in config.ENGINES_CONFIG.items() if include_dev or not cfg.get('dev_only', False)]
+
+    @staticmethod
+    def get_engine_option_specs(engine_name) -> dict:
+        """Options propres à un moteur, lues dans la configuration (le moteur n'est pas chargé)."""
+        return config.ENGINES_CONFIG.get(engine_name, {}).get('options', {})
+
     def get_engine(self, name):
+        if name not in self.engines and name not in self.engine_errors and name in config.ENGINES_CONFIG:
+            return self._load_engine(name)
         return self.engines.get(name)
 
+    def get_default_options(self, engine_name):
+        """Valeurs par défaut des options propres à un moteur."""
+        return {k: params.get('default') for k, params in self.get_engine_option_specs(engine_name).items()}
+
     def get_mesh_cache_key(self, path, engine_name, options):
-        """Génère une clé de cache pour le maillage final, incluant TOUTES les options."""
-        options_tuple = tuple(sorted(options.items()))
+        """Génère une clé de cache pour le maillage final, incluant toutes les options sauf celles d'exécution."""
+        runtime_keys = self.get_option_keys_for_stage(engine_name, 'runtime')
+        options_tuple = tuple(sorted((k, v) for k, v in options.items() if k not in runtime_keys))
         return (path, engine_name, options_tuple)
 
+    @staticmethod
+    def get_option_keys_for_stage(engine_name, stage):
+        """Options marquées 'stage': stage dans la configuration (pipeline et moteur)."""
+        # Lu dans la configuration : en mode distant, le moteur peut ne pas être chargé localement.
+        return config.option_keys_for_stage(engine_name, stage)
+
+    @staticmethod
+    def get_geometry_option_keys(engine_name):
+        """Options de post-traitement ('stage': 'geometry') : elles n'affectent pas les données brutes."""
+        return config.geometry_option_keys(engine_name)
+
     def get_raw_data_cache_key(self, path, engine_name, options):
         """
-        NOUVEAU : Génère une clé de cache pour les données brutes de l'IA.
-        N'inclut QUE les options qui affectent le modèle IA lui-même, pas le post-traitement.
+        Génère une clé de cache pour les données brutes de l'IA.
+        Inclut toutes les options qui affectent l'entrée ou le modèle (redimensionnement,
+        suppression d'arrière-plan, options du moteur), mais pas le post-traitement.
         """
-        engine = self.get_engine(engine_name)
-        engine_option_keys = engine.config.get('options', {}).keys()
-        
-        # On filtre les options pour ne garder que celles du moteur
-        engine_specific_options = {k: v for k, v in options.items() if k in engine_option_keys}
-        
-        options_tuple = tuple(sorted(engine_specific_options.items()))
+        excluded_keys = self.get_geometry_option_keys(engine_name) | self.get_option_keys_for_stage(engine_name, 'runtime')
+        inference_options = {k: v for k, v in options.items() if k not in excluded_keys}
+
+        options_tuple = tuple(sorted(inference_options.items()))
         return (path, engine_name, options_tuple)
 
     def get_thumbnail(self, path):
         if path in self.thumbnail_cache: return self.thumbnail_cache[path]
         if os.path.isdir(path): return None
         try:
-            with Image.open(path) as img:
+            with self._open_item_image(path) as img:
                 img.thumbnail(self.THUMB_SIZE, Image.Resampling.LANCZOS)
                 thumb = img.copy()
                 self.thumbnail_cache[path] = thumb
@@ -82,7 +190,7 @@ class AppController:
         if path in self.preview_cache: return self.preview_cache[path]
         if os.path.isdir(path): return None
         try:
-            with Image.open(path) as img:
+            with self._open_item_image(path) as img:
                 img.thumbnail(self.PREVIEW_SIZE, Image.Resampling.LANCZOS)
                 preview = img.copy()
                 self.preview_cache[path] = preview
@@ -91,11 +199,35 @@ class AppController:
             print(f"Erreur de création de la prévisualisation pour {path}: {e}")
             return None
 
-    def trimesh_to_polydata(self, mesh):
+    def trimesh_to_polydata(self, mesh, report: BudgetReport = None):
+        """Convertit pour PyVista, en décimant si le budget d'affichage est dépassé."""
         if not mesh: return None
-        polydata = pv.PolyData(mesh.vertices)
-        if hasattr(mesh.visual, 'vertex_colors'):
-            polydata['colors'] = mesh.visual.vertex_colors[:, :3]
+        with trace_span("conversion", vertices=len(mesh.vertices)):
+            return self._trimesh_to_polydata(mesh, report)
+
+    def _trimesh_to_polydata(self, mesh, report: BudgetReport = None):
+        report = report or BudgetReport()
+        vertices = mesh.vertices
+        colors = mesh.visual.vertex_colors[:, :3] if hasattr(mesh.visual, 'vertex_colors') else None
+        max_points = self.budget.max_viewer_points
+
+        if len(mesh.faces) == 0:
+            stride = self.budget.point_stride(len(vertices), max_points)
+            if stride > 1:
+                report.add("affichage", f"{len(vertices)} points > {max_points}, 1 point sur {stride} affiché")
+                vertices = vertices[::stride]
+                colors = colors[::stride] if colors is not None else None
+
+        import pyvista as pv  # Import différé : inutile (et coûteux) sur un worker sans affichage
+        polydata = pv.PolyData(vertices)
+        if colors is not None:
+            polydata['colors'] = colors
         if len(mesh.faces) > 0:
             polydata.faces = np.hstack((np.full((len(mesh.faces), 1), 3), mesh.faces))
+            if self.budget.enabled and max_points and len(vertices) > max_points:
+                reduction = 1.0 - max_points / len(vertices)
+                report.add("affichage", f"maillage de {len(vertices)} sommets décimé de {reduction:.0%}")
+                polydata = polydata.decimate(reduction)
+                if 'colors' in polydata.point_data:
+                    polydata['colors'] = np.clip(polydata['colors'], 0, 255).astype(np.uint8)
         return polydata
\ No newline at end of file
@@ -0,0 +1,58 @@
+import math
+from src import config
+
+class BudgetReport:
+    """Journal des décisions prises pour respecter le budget de ressources d'un traitement."""
+    def __init__(self):
+        self.decisions = []
+
+    def add(self, stage: str, message: str):
+        print(f"BUDGET [{stage}] {message}")
+        self.decisions.append((stage, message))
+
+    def summary(self) -> str:
+        return " | ".join(f"{stage}: {message}" for stage, message in self.decisions)
+
+class ResourceBudget:
+    """
+    Budget global pixels/points appliqué de bout en bout : taille d'inférence,
+    sous-échantillonnage de la géométrie et décimation pour l'affichage.
+    """
+    def __init__(self, enabled=True, max_inference_pixels=None, max_tiled_inference_pixels=None,
+                 max_geometry_points=None, max_viewer_points=None):
+        self.enabled = enabled
+        self.max_inference_pixels = max_inference_pixels
+        self.max_tiled_inference_pixels = max_tiled_inference_pixels
+        self.max_geometry_points = max_geometry_points
+        self.max_viewer_points = max_viewer_points
+
+    @classmethod
+    def from_config(cls):
+        return cls(**config.RESOURCE_BUDGET)
+
+    def inference_max_side(self, width: int, height: int, tiled: bool = False, divisor: int = 64):
+        """
+        Côté maximal à imposer à l'image pour respecter le budget d'inférence,
+        ou None si l'image tient déjà dans le budget. Arrondi au multiple inférieur
+        de 'divisor' pour que le rembourrage de resize_and_pad ne fasse pas dépasser le budget.
+        """
+        limit = self.max_tiled_inference_pixels if tiled else self.max_inference_pixels
+        if not self.enabled or not limit or width * height <= limit:
+            return None
+        scale = math.sqrt(limit / (width * height))
+        side = int(max(width, height) * scale)
+        return max(divisor, side - side % divisor)
+
+    def grid_stride(self, count: int, limit=None) -> int:
+        """Pas de sous-échantillonnage 2D (lignes et colonnes) pour ramener 'count' sous la limite."""
+        limit = limit if limit is not None else self.max_geometry_points
+        if not self.enabled or not limit or count <= limit:
+            return 1
+        return int(math.ceil(math.sqrt(count / limit)))
+
+    def point_stride(self, count: int, limit=None) -> int:
+        """Pas de sous-échantillonnage 1D pour ramener 'count' sous la limite."""
+        limit = limit if limit is not None else self.max_geometry_points
+        if not self.enabled or not limit or count <= limit:
+            return 1
+        return int(math.ceil(count / limit))
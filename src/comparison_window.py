@@ -0,0 +1,39 @@
+from PyQt6.QtWidgets import QMainWindow
+from pyvistaqt import QtInteractor
+
+class ComparisonWindow(QMainWindow):
+    """
+    Affiche les résultats de plusieurs moteurs côte à côte, dans des vues
+    PyVista liées (même caméra), avec la latence et la mémoire de chacun.
+    """
+    def __init__(self, controller, results: dict, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Comparaison des moteurs")
+        self.setGeometry(150, 150, 600 * max(1, len(results)), 700)
+
+        self.plotter = QtInteractor(self, shape=(1, max(1, len(results))))
+        self.setCentralWidget(self.plotter.interactor)
+
+        for column, (engine_name, result) in enumerate(results.items()):
+            self.plotter.subplot(0, column)
+            self.plotter.add_text(self._describe(engine_name, result), font_size=9)
+            if result.get('mesh') is not None:
+                pv_mesh = controller.trimesh_to_polydata(result['mesh'])
+                self.plotter.add_mesh(pv_mesh, scalars='colors', rgb=True, smooth_shading=True, specular=0.3)
+
+        self.plotter.link_views()
+        self.plotter.reset_camera()
+
+    @staticmethod
+    def _describe(engine_name: str, result: dict) -> str:
+        if result.get('error'):
+            return f"{engine_name}\nÉchec : {result['error']}"
+        shared = " (parallèle, mémoire partagée)" if result.get('parallel') else ""
+        return (f"{engine_name}\n"
+                f"Latence : {result['latency_s']:.2f}s "
+                f"(inférence {result['inference_s']:.2f}s, géométrie {result['geometry_s']:.2f}s)\n"
+                f"Pic RSS : {result['peak_rss_mb']:.0f} Mo | Pic GPU ≈ {result['peak_device_mb']:.0f} Mo{shared}")
+
+    def closeEvent(self, event):
+        self.plotter.close()
+        super().closeEvent(event)
@@ -1,17 +1,85 @@
-import torch
-
 # Configuration du mode de traitement ---
 # Choisir le mode d'exécution du pipeline de reconstruction.
 # "local": Utilise le GPU de votre machine. Nécessite une configuration locale complète.
 # "remote": Dédorte le calcul sur un worker RunPod Serverless. Nécessite une clé API.
-PROCESSING_MODE = "local" # Options: "local", "remote"
+# "hybrid": Seule l'inférence est faite sur RunPod ; la géométrie est construite en local à partir
+#           des données brutes mises en cache (modifier une option de post-traitement ne coûte aucun GPU).
+PROCESSING_MODE = "local" # Options: "local", "remote", "hybrid"
 
 # ID de votre endpoint RunPod Serverless (à créer dans le tableau de bord RunPod)
 RUNPOD_ENDPOINT_ID = "VOTRE_ENDPOINT_ID_ICI"
+# Plusieurs endpoints (ex. régions ou types de GPU différents) : si la liste n'est pas vide, elle
+# remplace RUNPOD_ENDPOINT_ID et chaque tâche est routée vers l'endpoint le plus rapide.
+RUNPOD_ENDPOINT_IDS = []
+# URL de base de l'API (modifiable pour viser un serveur local de substitution)
+RUNPOD_API_BASE_URL = "https://api.runpod.ai/v2"
+
+# Paramètres HTTP du client distant (session persistante, réessais, téléchargement)
+REMOTE_HTTP_CONFIG = {
+    'timeout_s': 30,                     # Délai par requête HTTP
+    'max_retries': 5,                    # Réessais sur erreur transitoire (429, 5xx, coupure réseau)
+    'backoff_base_s': 0.5,               # Backoff exponentiel avec jitter : base...
+    'backoff_max_s': 20.0,               # ...et plafond
+    'poll_initial_s': 0.25,              # Interrogation du statut : rapide au début...
+    'poll_backoff_factor': 1.5,          # ...puis intervalle multiplié à chaque essai...
+    'poll_max_s': 5.0,                   # ...jusqu'à ce plafond
+    'job_timeout_s': 600,                # Délai maximal d'une tâche (10 minutes)
+    'pool_size': 8,                      # Connexions keep-alive conservées par hôte
+    'download_chunk_bytes': 1024 * 1024, # Taille des blocs de téléchargement
+    'max_in_flight': 16,                 # Tâches simultanées du client asynchrone (traitement par lot)
+    'runsync_engines': ['DepthAnythingV2'], # Moteurs rapides : endpoint synchrone /runsync
+    'batch_job_size': 8,                 # Images par tâche RunPod en traitement par lot (amortit file d'attente et démarrage à froid)
+}
+
+# Routage entre plusieurs endpoints et 'hedging' (tâche doublée sur un second endpoint si elle traîne)
+REMOTE_ROUTING_CONFIG = {
+    'ewma_alpha': 0.3,                  # Poids des nouvelles observations dans les moyennes de latence
+    'latency_window': 50,               # Latences conservées par endpoint (calcul du percentile)
+    'cold_start_penalty_s': 30.0,       # Pénalité d'un endpoint sans worker prêt (démarrage à froid probable)
+    'health_check_interval_s': 30.0,    # Fréquence des appels /health
+    'max_consecutive_failures': 3,      # Échecs de suite avant de mettre un endpoint à l'écart...
+    'unhealthy_cooldown_s': 60.0,       # ...pendant cette durée
+    'hedge_enabled': True,
+    'hedge_percentile': 90,             # Une tâche plus lente que ce percentile est doublée...
+    'hedge_min_samples': 5,             # ...une fois assez de latences observées...
+    'hedge_min_delay_s': 5.0,           # ...et jamais avant ce délai. La tâche perdante est annulée.
+}
+
+# Envoi des images au worker distant
+REMOTE_UPLOAD_CONFIG = {
+    'client_resize': True,          # Redimensionnement ('resize_to' et budget) fait avant l'envoi
+    'client_bg_removal': False,     # RMBG fait en local avant l'envoi (nécessite le modèle RMBG localement)
+    'image_format': 'WEBP',         # Format de compression : 'WEBP', 'JPEG' ou 'PNG' (sans perte)
+    'image_quality': 90,            # Qualité initiale, réduite si la charge utile dépasse la limite
+    'max_payload_bytes': 9 * 1024 * 1024,  # Limite de la charge utile /run de RunPod (10 Mo), avec marge
+    'reference_by_hash': True,      # Une image déjà envoyée est référencée par son empreinte SHA-256
+}
+
+# Format du résultat renvoyé par le worker distant (négocié : le worker prend le premier qu'il connaît)
+# "lfvg": positions quantifiées int16, couleurs uint8, faces compressées (voir geometry_codec.py)
+# "glb": format standard, conservé en repli
+REMOTE_RESULT_CONFIG = {
+    'formats': ['lfvg', 'glb'],     # Formats acceptés par le client, par ordre de préférence
+    'compression': 'zlib',          # Compression des faces : 'zlib' (rapide) ou 'lzma' (plus compact)
+    'inline_max_bytes': 4 * 1024 * 1024,  # Résultat renvoyé directement dans la sortie JSON sous ce seuil
+    'raw_float_dtype': 'float16',   # Mode "hybrid" : précision des données brutes renvoyées ('float32' pour désactiver)
+}
+
+# Cache des résultats distants, indexé par empreinte (image envoyée, moteur, options effectives) :
+# une requête déjà faite ne relance pas de tâche GPU. Le worker a son propre cache (volume réseau).
+REMOTE_RESULT_CACHE = {
+    'enabled': True,
+    'client_dir': 'cache/remote_results',
+    'client_max_bytes': 2 * 1024 ** 3,   # Les résultats les moins récemment utilisés sont évincés au-delà
+    'worker_max_bytes': 20 * 1024 ** 3,
+}
 # ----------------------------------------------------
 
 
 # --- Options de pré-traitement (pipeline) applicables à plusieurs moteurs ---
+# 'stage': 'geometry' marque une option de post-traitement : elle ne change pas les données
+# brutes du moteur, qui peuvent donc être réutilisées depuis le cache sans relancer l'inférence.
+# 'stage': 'runtime' marque une option d'exécution sans effet sur le résultat (exclue des clés de cache).
 PIPELINE_OPTIONS = {
     'bg_removal': {'label': "Supprimer l'arrière-plan (RMBG)", 'default': True, 'type': 'bool'},
     'resize_to': {
@@ -26,7 +94,15 @@ PIPELINE_OPTIONS = {
         'type': 'float',
         'min': 0.1,
         'max': 50.0,
-        'step': 0.5
+        'step': 0.5,
+        'stage': 'geometry'
+    },
+    'profiler': {
+        'label': "Profilage détaillé",
+        'default': "Aucun",
+        'type': 'choice',
+        'choices': ["Aucun", "cProfile", "PyTorch"],
+        'stage': 'runtime'
     }
 }
 
@@ -37,20 +113,24 @@ ENGINES_CONFIG = {
         'module': 'src.engines.moge_engine',
         'model_name': "Ruicheng/moge-2-vitl-normal",
         'options': {
-            'render_mode': {'label': "Nuage de Points (rapide)", 'default': False, 'type': 'bool'},
-            'quality_filters': {'label': "Filtres Qualité (lent)", 'default': True, 'type': 'bool'},
+            'render_mode': {'label': "Nuage de Points (rapide)", 'default': False, 'type': 'bool', 'stage': 'geometry'},
+            'quality_filters': {'label': "Filtres Qualité (lent)", 'default': True, 'type': 'bool', 'stage': 'geometry'},
+            'poisson_depth': {'label': "Profondeur Poisson", 'default': 9, 'min': 5, 'max': 12, 'type': 'int', 'stage': 'geometry'},
         }
     },
     'DepthAnythingV2': {
         'class': 'DepthAnythingV2Engine',
         'module': 'src.engines.depth_anything_v2_engine',
+        'backend': 'torch',  # Options: "torch" (PyTorch eager), "onnx" (ONNX Runtime CPU)
+        'batch_size': 4,     # Images par passe avant dans les tâches multi-images du worker
         'options': {
             'model_variant': {
                 'label': "Variante du Modèle",
                 'default': 'Large',
                 'type': 'choice',
                 'choices': ['Small', 'Base', 'Large']
-            }
+            },
+            'tiled_inference': {'label': "Inférence par tuiles (haute résolution)", 'default': False, 'type': 'bool'}
         }
     },
     'DepthFM': {
@@ -60,23 +140,165 @@ ENGINES_CONFIG = {
         'options': {
             'num_steps': {'label': "Nombre d'étapes", 'default': 2, 'min': 1, 'max': 10, 'type': 'int'},
             'ensemble_size': {'label': "Taille de l'ensemble", 'default': 4, 'min': 1, 'max': 8, 'type': 'int'},
-        }
+            'adaptive_ensemble': {'label': "Ensemble adaptatif (arrêt anticipé)", 'default': False, 'type': 'bool'},
+            'ensemble_tolerance': {'label': "Tolérance de convergence", 'default': 0.01, 'min': 0.001, 'max': 0.2,
+                                   'step': 0.005, 'decimals': 3, 'type': 'float'},
+        },
+        # Ensemble adaptatif : les membres sont calculés par lots de 'batch_size' ; l'inférence s'arrête
+        # quand le quantile 'change_quantile' de la variation par pixel de la médiane (sur la profondeur
+        # renvoyée par le moteur, après normalisation finale) entre deux lots passe sous 'ensemble_tolerance'.
+        # Désactivé par défaut : la médiane de membres normalisés un par un diffère de l'ensemble natif de DepthFM.
+        'adaptive': {
+            'batch_size': 2,
+            'min_members': 2,
+            'change_quantile': 0.95,
+        },
     },
     'VGGT': {
         'class': 'VGGTEngine',
         'module': 'src.engines.vggt_engine',
         'model_name': "facebook/VGGT-1B",
+        'options': {
+            'chunk_size': {'label': "Vues par lot (scènes)", 'default': 16, 'min': 2, 'max': 64, 'type': 'int'},
+            'conf_percentile': {'label': "Filtre de confiance (percentile)", 'default': 50, 'min': 0, 'max': 95, 'type': 'int'},
+        }
+    },
+    # Rejeu de sorties enregistrées (voir REPLAY_RECORDING) : tests de débit sans GPU ni poids.
+    'Replay': {
+        'class': 'ReplayEngine',
+        'module': 'src.engines.replay_engine',
+        'dev_only': True,               # Absent de l'interface sauf si SHOW_DEV_ENGINES
+        'source_engine': 'MoGe',        # Moteur dont les enregistrements sont rejoués
+        'recordings_dir': 'recordings',
+        'latency': 'recorded',          # 'recorded' (latence mesurée à l'enregistrement) ou durée fixe en secondes
+        'latency_scale': 1.0,           # 0 pour un débit maximal sans attente simulée
+        'load_latency_s': 0.0,          # Durée simulée du chargement du modèle
+        'synthetic_fallback': True,     # Sans enregistrement : profondeur tirée de la luminance
         'options': {}
     }
 }
 
+# Moteurs marqués 'dev_only' (Replay) proposés dans l'interface et le mode comparaison
+SHOW_DEV_ENGINES = False
+
+# Enregistrement des sorties réelles des moteurs (local et worker) pour le moteur 'Replay'
+REPLAY_RECORDING = {
+    'enabled': False,
+    'dir': 'recordings',            # Un sous-dossier par moteur
+    'max_per_engine': 200,          # Les plus anciens enregistrements sont supprimés au-delà
+    'float_dtype': 'float16',       # Précision de stockage des flottants (compact)
+}
+
 # Configuration partagée
-RMBG_CONFIG = {'model_name': "briaai/RMBG-1.4"}
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+RMBG_CONFIG = {'model_name': "briaai/RMBG-1.4", 'backend': 'torch'}  # backend: "torch" ou "onnx"
+# DEVICE ("cuda" ou "cpu") est déterminé à la première lecture (voir __getattr__ en fin de fichier) :
+# importer torch coûte plusieurs secondes et ne doit pas retarder l'ouverture de la fenêtre.
 DEFAULT_ENGINE = 'MoGe'
 INPUT_FOLDER = "images"
 
-# Paramètres de reconstruction pour MoGe
+# Budget global de ressources : empêche une image géante de saturer la mémoire (et le swap).
+# Chaque limite peut être mise à None pour la désactiver.
+RESOURCE_BUDGET = {
+    'enabled': True,
+    'max_inference_pixels': 4_000_000,         # Image envoyée au moteur (hors inférence par tuiles)
+    'max_tiled_inference_pixels': 64_000_000,  # Image envoyée au moteur en inférence par tuiles
+    'max_geometry_points': 2_000_000,          # Points utilisés pour construire la géométrie
+    'max_viewer_points': 1_000_000,            # Sommets envoyés à VTK pour l'affichage
+}
+
+# Cache mémoire des données brutes des moteurs (changer une option de post-traitement ne relance pas l'inférence).
+# Stockage compact : seuls les champs lus par GeometryBuilder, points/normales en float16,
+# masques en bits, carte de profondeur en uint16 quantifié.
+RAW_DATA_CACHE = {
+    'compact': True,
+    'float_dtype': 'float16',
+    'image_format': 'JPEG',       # Image RGB des entrées ('PNG' : sans perte mais 3 à 5 fois plus grosse)
+    'image_quality': 95,
+    'max_bytes': 2 * 1024 ** 3,   # Au-delà, les entrées les moins récemment utilisées sont évincées
+}
+
+# Vidéos et dossiers d'images numérotées (séquences) : décodage en arrière-plan, inférence par lots,
+# sorties écrites au fil de l'eau dans output_dir (mémoire constante quelle que soit la durée du clip).
+SEQUENCE_CONFIG = {
+    'output_dir': 'sequences',
+    'folder_suffixes': ['.frames', '_frames'],  # Un dossier ainsi nommé est une séquence, pas une scène multi-vues
+    'stride': 1,                   # Une image sur N
+    'prefetch': 8,                 # Images décodées d'avance
+    'batch_size': 4,               # Images par passe du moteur
+    'signature_size': 32,          # Côté de la vignette en niveaux de gris comparée d'une image à l'autre
+    'skip_threshold': 0.01,        # Écart moyen (0-1) sous lequel une image est sautée (sortie précédente reprise)
+    'mask_reuse_threshold': 0.05,  # Écart sous lequel le masque RMBG précédent est réutilisé (fond statique)
+    'mask_refresh_interval': 30,   # Réutilisations consécutives maximales d'un même masque
+    'write_points': True,          # Écrit aussi un nuage de points PLY par image inférée
+    'float_dtype': 'float16',
+}
+
+# Outils de mesure du visualiseur (sélection de points, distances, coupes) : index spatial des
+# sommets construit en arrière-plan à l'affichage d'un résultat, conservé avec celui-ci.
+SPATIAL_INDEX_CONFIG = {
+    'enabled': True,
+    'points_per_cell': 8,            # Sommets visés par cellule occupée de la grille
+    'neighborhood_ratio': 0.01,      # Rayon du voisinage d'un point sélectionné (fraction de la diagonale)
+    'slice_thickness_ratio': 0.005,  # Épaisseur d'une coupe (fraction de la diagonale)
+}
+
+# Export des résultats en cache (bouton « Exporter les résultats ») : un fichier par tâche,
+# écrit en parallèle, par blocs de sommets depuis les tampons du maillage.
+EXPORT_CONFIG = {
+    'output_dir': 'exports',
+    'formats': ['glb', 'ply'],      # Parmi 'glb', 'ply' (binaires) et 'npz' (sommets, faces, couleurs)
+    'include_raw': True,            # Exporte aussi les données brutes en cache ('<nom>.raw.npz')
+    'max_workers': 8,
+    'chunk_vertices': 1_000_000,    # Sommets (ou faces) par bloc écrit
+}
+
+# Mode comparaison multi-moteurs (pré-traitement partagé)
+COMPARISON_CONFIG = {
+    'max_parallel_engines': 2,          # Moteurs exécutés simultanément au maximum
+    'device_memory_per_engine_gb': 6.0, # Mémoire GPU libre requise par moteur pour paralléliser
+}
+
+# Balayage d'une grille d'options (benchmarks/sweep_options.py) : pré-traitement et inférence
+# partagés entre les points qui ne diffèrent que par des options en aval.
+SWEEP_CONFIG = {
+    'output_dir': 'sweeps',
+    'geometry_workers': 4,        # Variantes géométriques construites en parallèle
+    'deviation_sample': 20_000,   # Sommets échantillonnés pour l'écart à la référence
+}
+
+# Traces par étape (décodage, RMBG, inférence, géométrie, rendu...) : temps réel, temps CPU et pics mémoire.
+# Chaque traitement est exporté au format Chrome Trace (chrome://tracing ou ui.perfetto.dev) et résumé
+# dans la barre d'état. L'option 'profiler' ajoute une capture cProfile ou torch.profiler au traitement.
+PROFILING_CONFIG = {
+    'enabled': True,
+    'trace_dir': 'traces',
+    'export_traces': True,        # Écrit un fichier .json par traitement dans trace_dir
+    'sample_interval_s': 0.01,    # Échantillonnage de la RSS pendant les spans
+}
+
+# Métriques au format texte Prometheus (tâches, files d'attente, étapes, caches, chargements
+# de modèles, octets transférés). Sur le worker, WORKER_METRICS_PORT / WORKER_METRICS_DUMP priment.
+METRICS_CONFIG = {
+    'http_port': None,                     # Ex. 9464 : GET http://127.0.0.1:9464/metrics
+    'dump_path': 'traces/metrics.prom',    # Fichier réécrit périodiquement (None pour désactiver)
+    'dump_interval_s': 30,
+}
+
+# Inférence par tuiles (Depth Anything V2, images 'Original' de grande taille)
+TILING_CONFIG = {
+    'overlap': 128,    # Recouvrement entre tuiles voisines (pixels), zone de fondu
+    'batch_size': 4,   # Nombre de tuiles par passe avant : borne la mémoire de pointe
+}
+
+# Backend ONNX Runtime : export unique par variante et par taille d'entrée, mis en cache sur disque.
+ONNX_CONFIG = {
+    'cache_dir': 'checkpoints/onnx',
+    'opset': 17,
+    'intra_op_threads': 0,  # 0 = laisser ONNX Runtime choisir
+    'bucket_step': 70,      # Pas (multiple de 14) des tailles d'entrée exportées pour Depth Anything V2
+}
+
+# Paramètres de reconstruction pour MoGe (POISSON_DEPTH : repli si l'option 'poisson_depth' est absente)
 POISSON_DEPTH = 9
 ENABLE_NORMAL_ESTIMATION = True
 ENABLE_DENSITY_FILTER = True
@@ -84,4 +306,33 @@ DENSITY_FILTER_QUANTILE = 0.01
 ENABLE_SMOOTHING = True
 SMOOTHING_ITERATIONS = 15
 ENABLE_DECIMATION = True
-DECIMATION_REDUCTION_FACTOR = 3
\ No newline at end of file
+DECIMATION_REDUCTION_FACTOR = 3
+
+
+def option_keys_for_stage(engine_name: str, stage: str) -> set:
+    """Options marquées 'stage': stage (pipeline et moteur), lues ici sans charger le moteur."""
+    engine_options = ENGINES_CONFIG.get(engine_name, {}).get('options', {})
+    all_options = {**PIPELINE_OPTIONS, **engine_options}
+    return {k for k, params in all_options.items() if params.get('stage') == stage}
+
+
+def geometry_option_keys(engine_name: str) -> set:
+    """Options de post-traitement ('stage': 'geometry') : elles n'affectent pas les données brutes."""
+    return option_keys_for_stage(engine_name, 'geometry')
+
+
+def _detect_device() -> str:
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def __getattr__(name):
+    """Attributs calculés à la demande (PEP 562) : DEVICE n'importe torch qu'à sa première lecture."""
+    if name == 'DEVICE':
+        global DEVICE
+        DEVICE = _detect_device()
+        return DEVICE
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
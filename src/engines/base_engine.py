@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
 from PIL import Image
+import time
+
+from src.metrics import MODEL_LOAD_DURATION, MODEL_LOADS
 
 class BaseEngine(ABC):
     CAPABILITIES = {'single_image': False, 'scene_folder': False}
@@ -12,8 +15,15 @@ class BaseEngine(ABC):
 
     def load_model_if_needed(self):
         if not self.is_loaded:
+            start = time.perf_counter()
             self._load_model()
             self.is_loaded = True
+            self._record_model_load(start)
+
+    def _record_model_load(self, start: float):
+        """Comptabilise un chargement de poids commencé à 'start' (time.perf_counter())."""
+        MODEL_LOADS.inc(engine=type(self).__name__)
+        MODEL_LOAD_DURATION.observe(time.perf_counter() - start, engine=type(self).__name__)
 
     @abstractmethod
     def _load_model(self): pass
@@ -21,7 +31,22 @@ class BaseEngine(ABC):
     @abstractmethod
     def process(self, image: Image.Image, options: dict):
         """
-        Traite un objet image PIL et retourne un maillage Trimesh.
+        Traite un objet image PIL et retourne les données brutes (dict) pour GeometryBuilder.
         Note: La méthode prend maintenant un objet Image, pas un chemin.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def process_batch(self, images: list, options: dict) -> list:
+        """
+        Traite plusieurs images avec les mêmes options ; retourne la liste des données brutes
+        dans le même ordre. Par défaut une image à la fois : les moteurs capables de regrouper
+        les passes avant surchargent cette méthode.
+        """
+        return [self.process(image, options) for image in images]
+
+    def process_scene(self, images, options: dict):
+        """
+        Traite une scène multi-vues (itérable d'images PIL). Réservé aux moteurs
+        déclarant CAPABILITIES['scene_folder'].
+        """
+        raise NotImplementedError(f"{type(self).__name__} ne prend pas en charge les dossiers de scène.")
\ No newline at end of file
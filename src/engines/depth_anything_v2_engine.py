@@ -1,17 +1,18 @@
-import torch
 import numpy as np
 from PIL import Image
 import os
+import time
 import cv2
 
-# Importation depuis le code du vendor que nous avons cloné
-from depth_anything_v2.dpt import DepthAnythingV2
-
 from .base_engine import BaseEngine
+from .onnx_backend import OnnxExportedModel
+from .tiling import tiled_depth_inference
+from src import config as app_config
 
 class DepthAnythingV2Engine(BaseEngine):
     """
     Moteur pour Depth Anything V2, utilisant le code et les poids officiels.
+    Deux backends : 'torch' (code du vendor, mode eager) et 'onnx' (ONNX Runtime CPU).
     """
     CAPABILITIES = {'single_image': True, 'scene_folder': False}
 
@@ -22,37 +23,117 @@ class DepthAnythingV2Engine(BaseEngine):
         'Large': {'encoder': 'vitl', 'features': 256, 'out_channels': [256, 512, 1024, 1024], 'weight_file': 'depth_anything_v2_vitl.pth'},
     }
 
+    # Prétraitement du dépôt officiel (image2tensor) : côté court à 518, multiples de 14, normalisation ImageNet.
+    INPUT_SIZE = 518
+    MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
     def __init__(self, engine_config, device):
         super().__init__(engine_config, device)
         self.loaded_variant = None
+        self.backend = engine_config.get('backend', 'torch')
+
+    def load_model_if_needed(self):
+        """
+        Sans effet : les poids dépendent de la variante demandée et sont chargés (et comptabilisés
+        dans les métriques) par _load_specific_variant.
+        """
 
     def _load_model(self):
         """ Méthode vide pour satisfaire le contrat de la classe de base. """
         pass
 
+    def _build_torch_model(self, variant: str, device):
+        """ Construit le modèle PyTorch du vendor et charge ses poids. """
+        import torch
+        # Importation depuis le code du vendor que nous avons cloné
+        from depth_anything_v2.dpt import DepthAnythingV2
+
+        model_config = self.MODEL_CONFIG[variant]
+        weight_path = os.path.join('checkpoints', model_config['weight_file'])
+        if not os.path.exists(weight_path):
+            raise FileNotFoundError(f"Fichier de poids non trouvé : {weight_path}. Veuillez exécuter 'python install_helper.py' pour le télécharger.")
+
+        print(f"Chargement du modèle Depth Anything V2 (variante: {variant}) depuis '{weight_path}'...")
+        model_params = {k: v for k, v in model_config.items() if k != 'weight_file'}
+        model = DepthAnythingV2(**model_params).to(device).eval()
+        model.load_state_dict(torch.load(weight_path, map_location=device))
+        return model
+
     def _load_specific_variant(self, variant: str):
         """ Charge une variante spécifique du modèle si elle n'est pas déjà chargée. """
         if variant == self.loaded_variant and self.model is not None:
             return
 
-        config = self.MODEL_CONFIG.get(variant)
-        if not config:
+        model_config = self.MODEL_CONFIG.get(variant)
+        if not model_config:
             raise ValueError(f"Variante de modèle inconnue : {variant}")
 
-        weight_path = os.path.join('checkpoints', config['weight_file'])
-        if not os.path.exists(weight_path):
-            raise FileNotFoundError(f"Fichier de poids non trouvé : {weight_path}. Veuillez exécuter 'python install_helper.py' pour le télécharger.")
-
-        print(f"Chargement du modèle Depth Anything V2 (variante: {variant}) depuis '{weight_path}'...")
-        
-        model_params = {k: v for k, v in config.items() if k != 'weight_file'}
-        self.model = DepthAnythingV2(**model_params).to(self.device).eval()
+        start = time.perf_counter()
+        if self.backend == 'onnx':
+            # Le modèle PyTorch n'est construit que si un export est nécessaire.
+            self.model = OnnxExportedModel(
+                f"depth_anything_v2_{model_config['encoder']}",
+                lambda: self._build_torch_model(variant, 'cpu')
+            )
+        else:
+            self.model = self._build_torch_model(variant, self.device)
 
-        self.model.load_state_dict(torch.load(weight_path, map_location=self.device))
-        
         self.loaded_variant = variant
         self.is_loaded = True
-        print("Chargement terminé.")
+        self._record_model_load(start)
+        print(f"Depth Anything V2 prêt (variante: {variant}, backend: {self.backend}).")
+
+    def _network_input_shape(self, height: int, width: int):
+        """
+        Calcule la taille d'entrée du réseau, arrondie à un 'bucket' pour limiter
+        le nombre d'exports ONNX (une forme statique par bucket).
+        """
+        step = app_config.ONNX_CONFIG['bucket_step']
+        scale = self.INPUT_SIZE / min(height, width)
+        def to_bucket(side):
+            # Le côté court vaut exactement INPUT_SIZE ; le côté long avance par pas de 'step' (multiple de 14).
+            extra = max(0.0, side * scale - self.INPUT_SIZE)
+            return self.INPUT_SIZE + int(np.ceil(extra / step)) * step
+        return to_bucket(height), to_bucket(width)
+
+    def _prepare_batch(self, rgb_images: list) -> np.ndarray:
+        """Normalise une liste d'images RGB uint8 de même taille en un lot NCHW float32."""
+        batch = np.stack(rgb_images).astype(np.float32) / 255.0
+        batch = (batch - self.MEAN) / self.STD
+        return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+
+    def _predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Passe avant du réseau sur un lot NCHW ; retourne des cartes (B, H, W)."""
+        if self.backend == 'onnx':
+            return self.model.run(batch)
+        import torch
+        with torch.no_grad():
+            depth = self.model(torch.from_numpy(batch).to(self.device))
+        return depth.float().cpu().numpy()
+
+    def _infer_resized(self, rgb_image: np.ndarray, upsample: bool = True) -> np.ndarray:
+        """Inférence sur l'image redimensionnée à la résolution du réseau."""
+        h, w = rgb_image.shape[:2]
+        net_h, net_w = self._network_input_shape(h, w)
+        resized = cv2.resize(rgb_image, (net_w, net_h), interpolation=cv2.INTER_CUBIC)
+        depth = self._predict_batch(self._prepare_batch([resized]))[0]
+        if not upsample:
+            return depth
+        return cv2.resize(depth, (w, h), interpolation=cv2.INTER_LINEAR)
+
+    def _infer_tiled(self, rgb_image: np.ndarray) -> np.ndarray:
+        """Inférence haute résolution par tuiles natives, alignées sur une prédiction globale."""
+        tiling = app_config.TILING_CONFIG
+        coarse = self._infer_resized(rgb_image, upsample=False)
+        return tiled_depth_inference(
+            rgb_image,
+            lambda tiles: self._predict_batch(self._prepare_batch(tiles)),
+            coarse,
+            tile_size=self.INPUT_SIZE,
+            overlap=tiling['overlap'],
+            batch_size=tiling['batch_size']
+        )
 
     def process(self, image: Image.Image, options: dict) -> dict:
         """ Effectue l'inférence pour obtenir une carte de profondeur. """
@@ -62,20 +143,57 @@ class DepthAnythingV2Engine(BaseEngine):
         if not self.is_loaded:
             raise RuntimeError("Le modèle n'a pas pu être chargé.")
 
-        print("Lancement de l'inférence Depth Anything V2...")
-        
-        # Le modèle attend une image BGR (format OpenCV), on convertit depuis PIL (RGB)
-        raw_img_bgr = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Utilisation de la méthode d'inférence personnalisée
-        depth = self.model.infer_image(raw_img_bgr)
-        
-        # Le résultat est déjà un tableau NumPy, on le normalise simplement
-        min_val, max_val = np.min(depth), np.max(depth)
-        if max_val > min_val:
-            normalized_depth = (depth - min_val) / (max_val - min_val)
+        print(f"Lancement de l'inférence Depth Anything V2 (backend: {self.backend})...")
+
+        rgb_image = np.array(image)
+        if options.get('tiled_inference', False) and min(rgb_image.shape[:2]) > self.INPUT_SIZE:
+            depth = self._infer_tiled(rgb_image)
+        elif self.backend == 'onnx':
+            depth = self._infer_resized(rgb_image)
         else:
-            normalized_depth = np.zeros_like(depth)
-            
+            # Le modèle attend une image BGR (format OpenCV), on convertit depuis PIL (RGB)
+            raw_img_bgr = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR)
+            # Utilisation de la méthode d'inférence personnalisée
+            depth = self.model.infer_image(raw_img_bgr)
+
         print("Inférence Depth Anything V2 terminée.")
-        return {'depth_map': normalized_depth}
\ No newline at end of file
+        return {'depth_map': self._normalize(depth)}
+
+    @staticmethod
+    def _normalize(depth) -> np.ndarray:
+        # Le résultat est déjà un tableau NumPy, on le normalise sur place (pas de copie pleine résolution)
+        normalized_depth = np.asarray(depth, dtype=np.float32)
+        min_val, max_val = np.min(normalized_depth), np.max(normalized_depth)
+        if max_val > min_val:
+            normalized_depth -= min_val
+            normalized_depth /= (max_val - min_val)
+        else:
+            normalized_depth = np.zeros_like(normalized_depth)
+        return normalized_depth
+
+    def process_batch(self, images: list, options: dict) -> list:
+        """
+        Inférence groupée : les images de même forme d'entrée réseau passent ensemble
+        dans le modèle, par lots d'au plus 'batch_size'. L'inférence par tuiles reste image par image.
+        """
+        if options.get('tiled_inference', False):
+            return super().process_batch(images, options)
+        self._load_specific_variant(options.get('model_variant', 'Large'))
+        batch_size = self.config.get('batch_size', 4)
+
+        rgb_images = [np.array(image) for image in images]
+        groups = {}
+        for index, rgb_image in enumerate(rgb_images):
+            groups.setdefault(self._network_input_shape(*rgb_image.shape[:2]), []).append(index)
+
+        print(f"Inférence Depth Anything V2 groupée : {len(images)} images, {len(groups)} forme(s) d'entrée.")
+        results = [None] * len(images)
+        for (net_h, net_w), indices in groups.items():
+            for start in range(0, len(indices), batch_size):
+                chunk = indices[start:start + batch_size]
+                resized = [cv2.resize(rgb_images[i], (net_w, net_h), interpolation=cv2.INTER_CUBIC) for i in chunk]
+                for i, depth in zip(chunk, self._predict_batch(self._prepare_batch(resized))):
+                    h, w = rgb_images[i].shape[:2]
+                    depth = cv2.resize(depth, (w, h), interpolation=cv2.INTER_LINEAR)
+                    results[i] = {'depth_map': self._normalize(depth)}
+        return results
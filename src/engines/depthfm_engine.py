@@ -3,9 +3,14 @@ import numpy as np
 from PIL import Image
 from torchvision import transforms
 from .base_engine import BaseEngine
+from src.metrics import ENSEMBLE_MEMBERS
 
 from depthfm.dfm import DepthFM as DepthFMModel
 
+def output_depth(depth: np.ndarray) -> np.ndarray:
+    """Normalisation finale de la profondeur prédite, telle que renvoyée par le moteur."""
+    return (depth + 1.0) / 2.0
+
 class DepthFMEngine(BaseEngine):
     CAPABILITIES = {'single_image': True, 'scene_folder': False}
 
@@ -16,19 +21,51 @@ class DepthFMEngine(BaseEngine):
 
     def process(self, image: Image.Image, options: dict) -> dict:
         """
-        Fait l'inférence et retourne la carte de profondeur brute.
+        Fait l'inférence et retourne la carte de profondeur brute, ainsi que le nombre
+        de membres d'ensemble effectivement calculés ('ensemble_members').
         """
         print("Lancement de l'inférence DepthFM...")
         img_tensor = transforms.ToTensor()(image) * 2.0 - 1.0
         img_tensor = img_tensor.unsqueeze(0).to(self.device)
-        
+
         num_steps = options.get('num_steps', 2)
         ensemble_size = options.get('ensemble_size', 4)
+        adaptive = self.config.get('adaptive', {})
 
         with torch.no_grad(), torch.cuda.amp.autocast():
-            depth = self.model.predict_depth(img_tensor, num_steps=num_steps, ensemble_size=ensemble_size)
+            if options.get('adaptive_ensemble', False) and ensemble_size > adaptive.get('batch_size', 2):
+                depth_map_numpy, members = self._adaptive_ensemble(img_tensor, num_steps, ensemble_size,
+                                                             options.get('ensemble_tolerance', 0.01), adaptive)
+            else:
+                depth = self.model.predict_depth(img_tensor, num_steps=num_steps, ensemble_size=ensemble_size)
+                depth_map_numpy, members = output_depth(depth.squeeze().float().cpu().numpy()), ensemble_size
+
+        ENSEMBLE_MEMBERS.observe(members, engine='DepthFM')
+        print(f"Inférence DepthFM terminée ({members}/{ensemble_size} membres d'ensemble).")
+        return {'depth_map': depth_map_numpy, 'ensemble_members': members}
 
-        depth_map_numpy = (depth.squeeze().cpu().numpy() + 1.0) / 2.0
-        
-        print("Inférence DepthFM terminée.")
-        return {'depth_map': depth_map_numpy}
\ No newline at end of file
+    def _adaptive_ensemble(self, img_tensor, num_steps: int, ensemble_size: int, tolerance: float, adaptive: dict):
+        """
+        Calcule les membres de l'ensemble par lots (une passe avant par lot, l'image répétée) et
+        agrège par médiane par pixel. S'arrête dès que la médiane ne bouge presque plus d'un lot
+        à l'autre. La variation est mesurée après la normalisation finale (output_depth), sur
+        l'échelle de la profondeur renvoyée : la tolérance s'exprime dans cette même unité.
+        Retourne (profondeur agrégée normalisée, nombre de membres calculés).
+        """
+        batch_size = max(1, adaptive.get('batch_size', 2))
+        min_members = max(2, adaptive.get('min_members', 2))
+        change_quantile = adaptive.get('change_quantile', 0.95)
+        members, previous = [], None
+        while len(members) < ensemble_size:
+            count = min(batch_size, ensemble_size - len(members))
+            # Lot de membres indépendants : chaque échantillon a son propre bruit et sa propre normalisation.
+            depth = self.model.predict_depth(img_tensor.repeat(count, 1, 1, 1), num_steps=num_steps, ensemble_size=0)
+            members.extend(depth.float().cpu().numpy().reshape(count, *depth.shape[-2:]))
+            aggregated = output_depth(np.median(np.stack(members), axis=0))
+            if previous is not None and len(members) >= min_members:
+                change = float(np.quantile(np.abs(aggregated - previous), change_quantile))
+                print(f"  Ensemble adaptatif : {len(members)} membres, variation {change:.4f} (tolérance {tolerance}).")
+                if change <= tolerance:
+                    break
+            previous = aggregated
+        return aggregated, len(members)
@@ -3,6 +3,7 @@ import numpy as np
 from PIL import Image
 from moge.model.v2 import MoGeModel
 from .base_engine import BaseEngine
+from src.processing.compact_raw import GEOMETRY_FIELDS
 
 class MogeEngine(BaseEngine):
     CAPABILITIES = {'single_image': True, 'scene_folder': False}
@@ -19,8 +20,8 @@ class MogeEngine(BaseEngine):
         tensor = torch.tensor(np.array(image)/255.0, dtype=torch.float32, device=self.device).permute(2, 0, 1)
         
         with torch.no_grad():
-             # Convertit directement les tenseurs de sortie en numpy
-             raw_data = {k: v.cpu().numpy() for k, v in self.model.infer(tensor).items()}
+             # Seuls les champs lus par GeometryBuilder sont rapatriés du GPU et convertis en numpy
+             raw_data = {k: v.cpu().numpy() for k, v in self.model.infer(tensor).items() if k in GEOMETRY_FIELDS}
         
         print("Inférence MoGe terminée.")
         return raw_data
\ No newline at end of file
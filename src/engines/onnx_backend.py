@@ -0,0 +1,63 @@
+import os
+import numpy as np
+from src import config
+
+class OnnxExportedModel:
+    """
+    Exécute un réseau feed-forward via ONNX Runtime (CPU, optimisations de graphe).
+    Le modèle PyTorch n'est construit que pour l'export, une seule fois par taille
+    d'entrée : les fichiers .onnx sont ensuite réutilisés depuis le cache disque.
+    """
+    def __init__(self, model_id: str, build_torch_module):
+        self.model_id = model_id
+        self._build_torch_module = build_torch_module
+        self._torch_module = None
+        self._sessions = {}
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Prend un lot NCHW float32 et retourne la première sortie du réseau."""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        session = self._get_session(tuple(batch.shape[2:]))
+        input_name = session.get_inputs()[0].name
+        return session.run(None, {input_name: batch})[0]
+
+    def onnx_path(self, input_shape) -> str:
+        h, w = input_shape
+        safe_id = self.model_id.replace('/', '_')
+        return os.path.join(config.ONNX_CONFIG['cache_dir'], f"{safe_id}_{h}x{w}.onnx")
+
+    def _get_session(self, input_shape):
+        if input_shape not in self._sessions:
+            path = self.onnx_path(input_shape)
+            if not os.path.exists(path):
+                self._export(input_shape, path)
+            self._sessions[input_shape] = self._create_session(path)
+        return self._sessions[input_shape]
+
+    def _export(self, input_shape, path):
+        import torch
+        h, w = input_shape
+        print(f"Export ONNX de '{self.model_id}' pour une entrée {w}x{h} (opération unique)...")
+        if self._torch_module is None:
+            self._torch_module = self._build_torch_module().to('cpu').eval()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        dummy = torch.randn(1, 3, h, w)
+        with torch.no_grad():
+            torch.onnx.export(
+                self._torch_module, dummy, tmp_path,
+                input_names=['image'], output_names=['output'],
+                dynamic_axes={'image': {0: 'batch'}, 'output': {0: 'batch'}},
+                opset_version=config.ONNX_CONFIG['opset']
+            )
+        # Écriture atomique : un export interrompu ne laisse pas de fichier corrompu dans le cache.
+        os.replace(tmp_path, path)
+        print(f"Modèle ONNX mis en cache : {path}")
+
+    def _create_session(self, path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.ONNX_CONFIG.get('intra_op_threads'):
+            options.intra_op_num_threads = config.ONNX_CONFIG['intra_op_threads']
+        return ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
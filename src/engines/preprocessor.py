@@ -1,41 +1,90 @@
-import torch
 from PIL import Image
-from transformers import AutoModelForImageSegmentation
-from torchvision import transforms
 from src import config
+from src.metrics import MODEL_LOAD_DURATION, MODEL_LOADS
+from src.processing.image_codec import apply_mask
+from .onnx_backend import OnnxExportedModel
 import numpy as np
+import time
 
 class RMBGPreprocessor:
-    def __init__(self, device):
-        self.device = device
+    INPUT_SIZE = (1024, 1024)
+
+    def __init__(self, device=None):
+        self._device = device  # None : config.DEVICE, lu seulement au chargement du modèle (import de torch)
         self.model = None
+        self.backend = config.RMBG_CONFIG.get('backend', 'torch')
+
+    @property
+    def device(self):
+        if self._device is None:
+            self._device = config.DEVICE
+        return self._device
+
+    def _build_torch_model(self):
+        from transformers import AutoModelForImageSegmentation
+        cfg = config.RMBG_CONFIG
+        return AutoModelForImageSegmentation.from_pretrained(cfg['model_name'], trust_remote_code=True).eval()
+
+    def _build_export_module(self):
+        """Enveloppe le modèle pour n'exporter que la carte de segmentation principale."""
+        import torch
+
+        class MaskOutput(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, x):
+                return self.model(x)[0][0]
+
+        return MaskOutput(self._build_torch_model())
 
     def load_model_if_needed(self):
         if self.model is None:
             cfg = config.RMBG_CONFIG
-            print(f"Chargement du pré-processeur BG Removal '{cfg['model_name']}'...")
-            self.model = AutoModelForImageSegmentation.from_pretrained(cfg['model_name'], trust_remote_code=True).to(self.device).eval()
+            print(f"Chargement du pré-processeur BG Removal '{cfg['model_name']}' (backend: {self.backend})...")
+            start = time.perf_counter()
+            if self.backend == 'onnx':
+                self.model = OnnxExportedModel(cfg['model_name'], self._build_export_module)
+            else:
+                self.model = self._build_torch_model().to(self.device)
+            MODEL_LOADS.inc(engine='RMBG')
+            MODEL_LOAD_DURATION.observe(time.perf_counter() - start, engine='RMBG')
+
+    def _predict_mask_torch(self, image: Image.Image) -> Image.Image:
+        import torch
+        from torchvision import transforms
 
-    def process(self, image: Image.Image) -> dict:
-        """
-        Traite une image pour en supprimer le fond.
-        Retourne un dictionnaire contenant l'image nettoyée et le masque.
-        """
-        self.load_model_if_needed()
-        
         transform = transforms.Compose([
             transforms.ToTensor(),
             transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
         ])
 
         with torch.no_grad():
-            input_tensor = transform(image.resize((1024, 1024))).unsqueeze(0).to(self.device)
+            input_tensor = transform(image.resize(self.INPUT_SIZE)).unsqueeze(0).to(self.device)
             result = self.model(input_tensor)
             mask_tensor = result[0][0].squeeze()
-        
-        mask = transforms.ToPILImage()(mask_tensor).resize(image.size, Image.Resampling.LANCZOS)
-        
-        cleaned_image = Image.new("RGBA", image.size)
-        cleaned_image.paste(image, mask=mask)
-        
-        return {'image': cleaned_image.convert("RGB"), 'mask': np.array(mask)}
\ No newline at end of file
+
+        return transforms.ToPILImage()(mask_tensor)
+
+    def _predict_mask_onnx(self, image: Image.Image) -> Image.Image:
+        # Même normalisation que le chemin PyTorch : (x - 0.5) / 0.5, en NCHW.
+        arr = np.asarray(image.resize(self.INPUT_SIZE), dtype=np.float32) / 255.0
+        batch = ((arr - 0.5) / 0.5).transpose(2, 0, 1)[None]
+        mask = self.model.run(batch).squeeze()
+        return Image.fromarray((np.clip(mask, 0.0, 1.0) * 255).astype(np.uint8))
+
+    def process(self, image: Image.Image) -> dict:
+        """
+        Traite une image pour en supprimer le fond.
+        Retourne un dictionnaire contenant l'image nettoyée et le masque.
+        """
+        self.load_model_if_needed()
+
+        if self.backend == 'onnx':
+            mask = self._predict_mask_onnx(image)
+        else:
+            mask = self._predict_mask_torch(image)
+        mask = np.array(mask.resize(image.size, Image.Resampling.LANCZOS))
+
+        return {'image': apply_mask(image, mask), 'mask': mask}
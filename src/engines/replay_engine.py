@@ -0,0 +1,206 @@
+import glob
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from PIL import Image
+
+from .base_engine import BaseEngine
+from src.processing.raw_codec import decode_raw_data, encode_raw_data
+from src import config as app_config
+
+# Un enregistrement = '<clé>.npz' (données brutes compactes, voir raw_codec) + '<clé>.json'
+# (moteur, taille de l'image d'entrée, options, latence mesurée), rangés par moteur source.
+
+def inference_options(engine_name: str, options: dict) -> dict:
+    """
+    Options propres au moteur qui changent sa sortie brute (ni 'geometry' ni 'runtime'), valeurs
+    par défaut comprises. Les options du pipeline n'y figurent pas : leur effet (redimensionnement,
+    RMBG) est déjà dans l'image, donc dans son empreinte.
+    """
+    specs = app_config.ENGINES_CONFIG.get(engine_name, {}).get('options', {})
+    return {key: options.get(key, spec.get('default')) for key, spec in specs.items()
+            if spec.get('stage') not in ('geometry', 'runtime')}
+
+def _recording_key(engine_name: str, image_digest: str, options: dict) -> str:
+    payload = json.dumps([engine_name, image_digest, sorted(inference_options(engine_name, options).items())], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _image_digest(image: Image.Image) -> str:
+    return hashlib.sha256(np.asarray(image).tobytes()).hexdigest()
+
+class RawOutputRecorder:
+    """
+    Enregistre les données brutes réellement produites par un moteur (en production ou
+    sur une machine GPU) pour les rejouer ensuite avec ReplayEngine, sans poids ni GPU.
+    """
+    def __init__(self, root: str, max_per_engine: int = None, float_dtype: str = 'float16'):
+        self.root = root
+        self.max_per_engine = max_per_engine
+        self.float_dtype = float_dtype
+
+    @classmethod
+    def from_config(cls):
+        """Enregistreur d'après REPLAY_RECORDING, ou None si l'enregistrement est désactivé."""
+        cfg = app_config.REPLAY_RECORDING
+        return cls(cfg['dir'], cfg['max_per_engine'], cfg['float_dtype']) if cfg['enabled'] else None
+
+    def record(self, engine_name: str, image, options: dict, raw_data: dict, latency_s: float, scene: bool = False):
+        """image : image PIL d'entrée (ou None pour une scène)."""
+        folder = os.path.join(self.root, engine_name)
+        os.makedirs(folder, exist_ok=True)
+        digest = _image_digest(image) if image is not None else None
+        key = _recording_key(engine_name, digest, options)
+        with open(os.path.join(folder, f"{key}.npz"), 'wb') as f:
+            f.write(encode_raw_data(raw_data, float_dtype=self.float_dtype))
+        meta = {
+            'engine': engine_name,
+            'image_sha256': digest,
+            'size': list(image.size) if image is not None else None,  # (largeur, hauteur)
+            'options': options,
+            'latency_s': latency_s,
+            'scene': scene,
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(os.path.join(folder, f"{key}.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, default=str)
+        self._evict(folder)
+
+    def _evict(self, folder: str):
+        if not self.max_per_engine:
+            return
+        metas = sorted(glob.glob(os.path.join(folder, '*.json')), key=os.path.getmtime)
+        for meta_path in metas[:max(0, len(metas) - self.max_per_engine)]:
+            for path in (meta_path, meta_path[:-len('.json')] + '.npz'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+_recorder = None
+
+def record_output(engine_name: str, image, options: dict, raw_data: dict, latency_s: float, scene: bool = False):
+    """Enregistre une sortie de moteur si REPLAY_RECORDING est activé (jamais pour le moteur de rejeu)."""
+    global _recorder
+    if not app_config.REPLAY_RECORDING['enabled'] or raw_data is None:
+        return
+    if app_config.ENGINES_CONFIG.get(engine_name, {}).get('class') == ReplayEngine.__name__:
+        return
+    if _recorder is None:
+        _recorder = RawOutputRecorder.from_config()
+    try:
+        _recorder.record(engine_name, image, options, raw_data, latency_s, scene)
+    except Exception as e:
+        # L'enregistrement ne doit jamais faire échouer un traitement réel.
+        print(f"AVERTISSEMENT: Échec de l'enregistrement de la sortie de '{engine_name}': {e}")
+
+class ReplayEngine(BaseEngine):
+    """
+    Moteur de rejeu : renvoie des sorties brutes enregistrées d'un moteur réel (config
+    'source_engine') avec une latence simulée réaliste, sans poids ni GPU. Sert aux tests
+    de débit du pipeline complet (caches, géométrie, affichage, transfert distant).
+    - Même image et mêmes options d'inférence du moteur source qu'un enregistrement : sortie
+      rejouée telle quelle (options absentes de la requête : valeurs par défaut du moteur source).
+    - Sinon : l'enregistrement de taille la plus proche, ses cartes (H, W, ...) rééchantillonnées
+      à la taille de l'image pour que la géométrie reste cohérente.
+    """
+    CAPABILITIES = {'single_image': True, 'scene_folder': True}
+
+    def __init__(self, engine_config, device):
+        super().__init__(engine_config, device)
+        self.recordings = []  # métadonnées (avec 'path') des enregistrements du moteur source
+        self._loaded_data = {}
+
+    def _load_model(self):
+        folder = os.path.join(self.config['recordings_dir'], self.config['source_engine'])
+        for meta_path in sorted(glob.glob(os.path.join(folder, '*.json'))):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['path'] = meta_path[:-len('.json')] + '.npz'
+            if os.path.exists(meta['path']):
+                self.recordings.append(meta)
+        print(f"Rejeu de '{self.config['source_engine']}' : {len(self.recordings)} enregistrement(s) dans '{folder}'.")
+        if not self.recordings and not self.config.get('synthetic_fallback', False):
+            raise FileNotFoundError(f"Aucun enregistrement dans '{folder}'. Activez REPLAY_RECORDING "
+                                    "lors d'un traitement réel pour en créer.")
+        if self.config.get('load_latency_s'):
+            time.sleep(self.config['load_latency_s'])
+
+    def _raw_data(self, meta: dict) -> dict:
+        """Données d'un enregistrement, décodées une seule fois (ce coût ne fait pas partie de la latence simulée)."""
+        if meta['path'] not in self._loaded_data:
+            with open(meta['path'], 'rb') as f:
+                self._loaded_data[meta['path']] = decode_raw_data(f.read())[0]
+        return self._loaded_data[meta['path']]
+
+    def _simulate_latency(self, meta):
+        latency = self.config.get('latency', 'recorded')
+        if latency == 'recorded':
+            latency = meta.get('latency_s', 0.0) if meta else 0.0
+        delay = float(latency) * self.config.get('latency_scale', 1.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _select(self, image: Image.Image, options: dict, scene: bool = False):
+        candidates = [m for m in self.recordings if bool(m.get('scene')) == scene]
+        if not candidates:
+            return None
+        if image is not None:
+            source = self.config['source_engine']
+            digest, wanted = _image_digest(image), json.dumps(inference_options(source, options), sort_keys=True, default=str)
+            exact = [m for m in candidates if m.get('image_sha256') == digest
+                     and json.dumps(inference_options(source, m.get('options') or {}), sort_keys=True, default=str) == wanted]
+            if exact:
+                return exact[0]
+            width, height = image.size
+            return min(candidates, key=lambda m: abs(np.log((m['size'][0] * m['size'][1]) / (width * height)))
+                       + abs(np.log((m['size'][0] / m['size'][1]) / (width / height))))
+        return candidates[0]
+
+    @staticmethod
+    def _resample(raw_data: dict, recorded_size, target_size) -> dict:
+        """Rééchantillonne (plus proche voisin) les cartes dont les deux premières dimensions sont celles de l'image enregistrée."""
+        (rec_w, rec_h), (w, h) = recorded_size, target_size
+        if (rec_w, rec_h) == (w, h):
+            return dict(raw_data)
+        rows = (np.arange(h) * rec_h // h)[:, None]
+        cols = (np.arange(w) * rec_w // w)[None, :]
+        return {k: v[rows, cols] if v.ndim >= 2 and v.shape[:2] == (rec_h, rec_w) else v for k, v in raw_data.items()}
+
+    @staticmethod
+    def _synthetic_depth(image: Image.Image) -> dict:
+        """Sans enregistrement : carte de profondeur tirée de la luminance (forme d'une sortie Depth Anything V2)."""
+        depth = np.asarray(image.convert('L'), dtype=np.float32) / 255.0
+        return {'depth_map': depth}
+
+    def process(self, image: Image.Image, options: dict) -> dict:
+        meta = self._select(image, options)
+        self._simulate_latency(meta)
+        if meta is None:
+            return self._synthetic_depth(image)
+        raw_data = self._raw_data(meta)
+        if meta.get('size') is None:
+            return dict(raw_data)
+        return self._resample(raw_data, meta['size'], image.size)
+
+    def process_scene(self, images, options: dict):
+        frames = list(images)  # Les vues sont consommées comme par un vrai moteur
+        meta = self._select(None, options, scene=True)
+        self._simulate_latency(meta)
+        if meta is None:
+            if not frames:
+                raise ValueError("Aucune vue dans la scène.")
+            return self._synthetic_scene(frames)
+        return dict(self._raw_data(meta))
+
+    def _synthetic_scene(self, frames: list) -> dict:
+        """Nuage de points (format VGGT) tiré des profondeurs synthétiques des vues, décalées en X."""
+        points, colors = [], []
+        for index, frame in enumerate(frames):
+            depth = self._synthetic_depth(frame)['depth_map'][::4, ::4]
+            h, w = depth.shape
+            yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+            points.append(np.stack([xx / w + index, -yy / h, -depth], axis=-1).reshape(-1, 3))
+            colors.append(np.asarray(frame.convert('RGB'))[::4, ::4].reshape(-1, 3))
+        return {'points': np.concatenate(points), 'vertex_colors': np.concatenate(colors)}
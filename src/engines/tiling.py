@@ -0,0 +1,73 @@
+import numpy as np
+import cv2
+
+def tile_origins(length: int, tile: int, overlap: int) -> list:
+    """Positions de départ des tuiles le long d'un axe ; la dernière tuile est collée au bord."""
+    if length <= tile:
+        return [0]
+    stride = max(1, tile - overlap)
+    origins = list(range(0, length - tile, stride))
+    origins.append(length - tile)
+    return origins
+
+def feather_weights(tile_h: int, tile_w: int, overlap: int) -> np.ndarray:
+    """Poids séparables en rampe linéaire sur la zone de recouvrement, pour un fondu sans couture."""
+    def ramp(n):
+        x = np.arange(n, dtype=np.float32) + 0.5
+        return np.clip(np.minimum(x, n - x) / max(overlap, 1), 1e-3, 1.0)
+    return ramp(tile_h)[:, None] * ramp(tile_w)[None, :]
+
+def fit_scale_shift(pred: np.ndarray, ref: np.ndarray):
+    """Ajuste (échelle, décalage) aux moindres carrés pour que pred * s + t ≈ ref."""
+    p = pred.ravel().astype(np.float64)
+    r = ref.ravel().astype(np.float64)
+    p_mean, r_mean = p.mean(), r.mean()
+    var = ((p - p_mean) ** 2).mean()
+    if var < 1e-12:
+        return 1.0, r_mean - p_mean
+    scale = ((p - p_mean) * (r - r_mean)).mean() / var
+    if scale <= 0:
+        # Tuile quasi uniforme ou incohérente : on ne garde que l'alignement de niveau.
+        return 1.0, r_mean - p_mean
+    return scale, r_mean - scale * p_mean
+
+def _sample_reference(coarse: np.ndarray, full_shape, y0: int, x0: int, th: int, tw: int) -> np.ndarray:
+    """Échantillonne la carte grossière sur la région d'une tuile, en coordonnées pleine résolution."""
+    full_h, full_w = full_shape
+    sy, sx = coarse.shape[0] / full_h, coarse.shape[1] / full_w
+    xs = ((np.arange(x0, x0 + tw, dtype=np.float32) + 0.5) * sx - 0.5)
+    ys = ((np.arange(y0, y0 + th, dtype=np.float32) + 0.5) * sy - 0.5)
+    map_x, map_y = np.meshgrid(xs, ys)
+    return cv2.remap(coarse.astype(np.float32), map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def tiled_depth_inference(rgb: np.ndarray, predict_tiles, coarse_depth: np.ndarray,
+                          tile_size: int, overlap: int, batch_size: int) -> np.ndarray:
+    """
+    Inférence par tuiles recouvrantes à la résolution native du modèle.
+    - predict_tiles(list[np.ndarray RGB]) -> np.ndarray (B, tile, tile)
+    - coarse_depth : prédiction globale basse résolution servant de référence
+      pour aligner chaque tuile (échelle/décalage) avant le fondu.
+    La mémoire de pointe ne dépend que de la taille du lot de tuiles, plus
+    deux accumulateurs float32 de la taille de l'image de sortie.
+    """
+    h, w = rgb.shape[:2]
+    th, tw = min(tile_size, h), min(tile_size, w)
+    weights = feather_weights(th, tw, overlap)
+    depth_acc = np.zeros((h, w), dtype=np.float32)
+    weight_acc = np.zeros((h, w), dtype=np.float32)
+
+    positions = [(y, x) for y in tile_origins(h, th, overlap) for x in tile_origins(w, tw, overlap)]
+    print(f"Inférence par tuiles : {len(positions)} tuiles de {tw}x{th} (recouvrement {overlap}px, lots de {batch_size}).")
+
+    for start in range(0, len(positions), batch_size):
+        batch_positions = positions[start:start + batch_size]
+        tiles = [rgb[y:y + th, x:x + tw] for y, x in batch_positions]
+        predictions = predict_tiles(tiles)
+        for (y, x), pred in zip(batch_positions, predictions):
+            ref = _sample_reference(coarse_depth, (h, w), y, x, th, tw)
+            scale, shift = fit_scale_shift(pred, ref)
+            depth_acc[y:y + th, x:x + tw] += (pred * scale + shift) * weights
+            weight_acc[y:y + th, x:x + tw] += weights
+
+    np.divide(depth_acc, weight_acc, out=depth_acc)
+    return depth_acc
@@ -1,47 +1,122 @@
+import contextlib
+import itertools
 import torch
 import numpy as np
-import trimesh
-import os
 from PIL import Image
 from vggt.models.vggt import VGGT
-from vggt.utils.load_fn import load_and_preprocess_images
 from .base_engine import BaseEngine
 
 class VGGTEngine(BaseEngine):
-    CAPABILITIES = {'single_image': True, 'scene_folder': True} # Laissons scene_folder pour l'instant
+    CAPABILITIES = {'single_image': True, 'scene_folder': True}
+
+    # Prétraitement identique à vggt.utils.load_fn.load_and_preprocess_images (mode "crop"),
+    # mais effectué en mémoire : largeur 518, hauteur multiple de 14, recadrage centré.
+    TARGET_SIZE = 518
+    PATCH_SIZE = 14
 
     def __init__(self, engine_config, device):
         super().__init__(engine_config, device)
 
     def _load_model(self):
         print(f"Chargement du modèle VGGT '{self.config['model_name']}'...")
-        self.model = VGGT.from_pretrained(self.config['model_name']).to(self.device)
+        self.model = VGGT.from_pretrained(self.config['model_name']).to(self.device).eval()
 
-    def process(self, image: Image.Image, options: dict):
-        # VGGT attend des chemins de fichiers, nous devons donc sauvegarder temporairement l'image traitée
-        temp_path = "temp_vggt_input.png"
-        image.save(temp_path)
+    def _preprocess(self, image: Image.Image) -> np.ndarray:
+        """Convertit une image PIL en tableau CHW float32 [0, 1] à la taille attendue par VGGT."""
+        if image.mode == "RGBA":
+            background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+            image = Image.alpha_composite(background, image)
+        image = image.convert("RGB")
+
+        width, height = image.size
+        new_width = self.TARGET_SIZE
+        new_height = round(height * (new_width / width) / self.PATCH_SIZE) * self.PATCH_SIZE
+        arr = np.asarray(image.resize((new_width, new_height), Image.Resampling.BICUBIC), dtype=np.float32) / 255.0
+
+        if new_height > self.TARGET_SIZE:
+            start_y = (new_height - self.TARGET_SIZE) // 2
+            arr = arr[start_y:start_y + self.TARGET_SIZE]
+        return np.ascontiguousarray(arr.transpose(2, 0, 1))
 
-        images_to_load = [temp_path]
-        
-        images = load_and_preprocess_images(images_to_load).to(self.device)
-        os.remove(temp_path) # Nettoyage immédiat
+    def _stack_frames(self, frames: list) -> torch.Tensor:
+        """Empile des images de tailles éventuellement différentes en les complétant (blanc) au centre."""
+        max_h = max(f.shape[1] for f in frames)
+        max_w = max(f.shape[2] for f in frames)
+        batch = np.ones((len(frames), 3, max_h, max_w), dtype=np.float32)
+        for i, f in enumerate(frames):
+            top, left = (max_h - f.shape[1]) // 2, (max_w - f.shape[2]) // 2
+            batch[i, :, top:top + f.shape[1], left:left + f.shape[2]] = f
+        return torch.from_numpy(batch).to(self.device)
 
-        dtype = torch.bfloat16 if torch.cuda.get_device_capability()[0] >= 8 else torch.float16
+    def _autocast(self):
+        if str(self.device).startswith('cuda') and torch.cuda.is_available():
+            dtype = torch.bfloat16 if torch.cuda.get_device_capability()[0] >= 8 else torch.float16
+            return torch.cuda.amp.autocast(dtype=dtype)
+        return contextlib.nullcontext()
 
-        with torch.no_grad(), torch.cuda.amp.autocast(dtype=dtype):
+    def _predict_chunk(self, frames: list):
+        """Inférence multi-vues sur un lot de frames ; retourne (points, confiance, couleurs)."""
+        images = self._stack_frames(frames)
+        with torch.no_grad(), self._autocast():
             predictions = self.model(images)
+        points = predictions["world_points"].float().squeeze(0).cpu().numpy()    # (S, H, W, 3)
+        conf = predictions["world_points_conf"].float().squeeze(0).cpu().numpy() # (S, H, W)
+        colors = (images.permute(0, 2, 3, 1).cpu().numpy() * 255).astype(np.uint8)
+        return points, conf, colors
+
+    def _select_confident(self, points, conf, colors, percentile):
+        threshold = max(np.percentile(conf, percentile), 1e-5) if percentile > 0 else 1e-5
+        keep = conf >= threshold
+        return points[keep].astype(np.float32), colors[keep]
+
+    def process(self, image: Image.Image, options: dict):
+        return self.process_scene([image], options)
+
+    def process_scene(self, images, options: dict) -> dict:
+        """
+        Reconstruction multi-vues d'une séquence d'images (itérable de PIL.Image).
+        Les longues séquences sont traitées par lots : la première vue est incluse
+        dans chaque lot pour partager le même repère monde, et l'échelle de chaque
+        lot est recalée sur celle du premier via cette vue de référence.
+        """
+        chunk_size = max(2, options.get('chunk_size', 16))
+        percentile = options.get('conf_percentile', 50)
+
+        # Les vues sont lues et prétraitées au fil des lots : seule la vue de référence est conservée.
+        frames = (self._preprocess(img) for img in images)
+        first_chunk = list(itertools.islice(frames, chunk_size))
+        if not first_chunk:
+            raise ValueError("Aucune image à reconstruire.")
+        print(f"Lancement de la reconstruction VGGT (lots de {chunk_size} vues)...")
+
+        reference = first_chunk[0]
+        all_points, all_colors = [], []
+
+        points, conf, colors = self._predict_chunk(first_chunk)
+        reference_points, reference_conf = points[0], conf[0]
+        pts, cols = self._select_confident(points, conf, colors, percentile)
+        all_points.append(pts)
+        all_colors.append(cols)
+        view_count = len(first_chunk)
+        del first_chunk
+
+        step = chunk_size - 1
+        while chunk_views := list(itertools.islice(frames, step)):
+            chunk = [reference] + chunk_views
+            print(f"  - Lot de vues {view_count} à {view_count + len(chunk_views) - 1}...")
+            view_count += len(chunk_views)
+            points, conf, colors = self._predict_chunk(chunk)
+
+            # Recalage d'échelle (moindres carrés) sur les points confiants de la vue de référence.
+            valid = (reference_conf > np.median(reference_conf)) & (conf[0] > np.median(conf[0]))
+            a, b = reference_points[valid].reshape(-1), points[0][valid].reshape(-1)
+            scale = float(np.dot(a, b) / np.dot(b, b)) if np.dot(b, b) > 0 else 1.0
+
+            pts, cols = self._select_confident(points[1:], conf[1:], colors[1:], percentile)
+            all_points.append(pts * scale)
+            all_colors.append(cols)
 
-        if "point_map" not in predictions or predictions["point_map"] is None: return None
-        points = predictions["point_map"].reshape(-1, 3).cpu().numpy()
-        
-        z_coords = points[:, 2]
-        z_min, z_max = z_coords.min(), z_coords.max()
-        colors = np.zeros_like(points, dtype=np.uint8)
-        if z_max > z_min:
-            z_norm = (z_coords - z_min) / (z_max - z_min)
-            colors[:, 0] = 255 * z_norm
-            colors[:, 2] = 255 * (1 - z_norm)
-
-        print("Reconstruction VGGT terminée.")
-        return trimesh.Trimesh(vertices=points, vertex_colors=colors)
\ No newline at end of file
+        points = np.concatenate(all_points)
+        vertex_colors = np.concatenate(all_colors)
+        print(f"Reconstruction VGGT terminée : {view_count} vue(s), {len(points)} points fusionnés.")
+        return {'points': points, 'vertex_colors': vertex_colors}
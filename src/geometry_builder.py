@@ -1,33 +1,51 @@
 import trimesh
 import numpy as np
 from PIL import Image
-import open3d as o3d
-from scipy.spatial import KDTree
 from src import config
+from src.budget import BudgetReport, ResourceBudget
+from src.profiling import trace_span
 
 class GeometryBuilder:
     """
     Centralise la logique de construction de maillages 3D à partir
     de différentes formes de données brutes issues des moteurs IA.
+    Le nombre de points produits est borné par le budget de ressources.
     """
-    def build(self, raw_data: dict, processed_image: np.ndarray, fg_mask: np.ndarray = None, options: dict = None):
+    def __init__(self, budget: ResourceBudget = None):
+        self.budget = budget or ResourceBudget.from_config()
+
+    def build(self, raw_data: dict, processed_image: np.ndarray, fg_mask: np.ndarray = None, options: dict = None,
+              report: BudgetReport = None):
         """
         Aiguille vers la bonne méthode de construction en fonction des données et des options.
         """
+        with trace_span("géométrie"):
+            # Entrées du cache compact (CompactRawData, CompactImage) : décodées une seule fois ici,
+            # pour toute la durée de la construction.
+            raw_data = dict(raw_data)
+            if processed_image is not None:
+                processed_image = np.asarray(processed_image)
+            if fg_mask is not None:
+                fg_mask = np.asarray(fg_mask)
+            return self._build(raw_data, processed_image, fg_mask, options, report)
+
+    def _build(self, raw_data, processed_image, fg_mask, options, report):
         print("--- Démarrage de la construction de la géométrie ---")
         if options is None:
             options = {}
+        if report is None:
+            report = BudgetReport()
 
         if options.get('render_mode') is True and 'points' in raw_data:
             print("Option 'Nuage de Points' sélectionnée. Construction simplifiée.")
-            return self._build_point_cloud_from_moge_data(raw_data, processed_image, fg_mask)
+            return self._build_point_cloud_from_moge_data(raw_data, processed_image, fg_mask, report)
 
         if 'depth_map' in raw_data:
-            return self._build_from_depth_map(raw_data['depth_map'], processed_image, options)
+            return self._build_from_depth_map(raw_data['depth_map'], processed_image, options, report)
         elif 'points' in raw_data and 'normal' in raw_data:
-            return self._build_from_points_and_normals(raw_data, processed_image, fg_mask, options)
+            return self._build_from_points_and_normals(raw_data, processed_image, fg_mask, options, report)
         elif 'points' in raw_data:
-            return self._build_from_points_only(raw_data)
+            return self._build_from_points_only(raw_data, report)
         else:
             print("ERREUR: Données brutes non reconnues pour la construction du maillage.")
             return None
@@ -45,25 +63,60 @@ class GeometryBuilder:
         
         return model_mask & (fg_mask > 128)
 
-    def _build_point_cloud_from_moge_data(self, data, img_rgb, fg_mask):
-        """Construit un simple nuage de points coloré pour MoGe."""
+    def _select_masked(self, data, img_rgb, fg_mask, report, with_normals=False):
+        """
+        Applique les masques puis, si le budget de points est dépassé, un pas de
+        grille régulier avant la sélection (pas de copie pleine taille intermédiaire).
+        """
         final_mask = self._apply_fg_mask(data['mask'], fg_mask)
-        pts = data['points'][final_mask]
-        colors = img_rgb[final_mask]
+        count = int(np.count_nonzero(final_mask))
+        stride = self.budget.grid_stride(count)
+        if stride > 1:
+            report.add("géométrie", f"{count} points valides > {self.budget.max_geometry_points}, pas de grille {stride}")
+            final_mask = final_mask[::stride, ::stride]
+            return (data['points'][::stride, ::stride][final_mask],
+                    data['normal'][::stride, ::stride][final_mask] if with_normals else None,
+                    img_rgb[::stride, ::stride][final_mask])
+        return (data['points'][final_mask],
+                data['normal'][final_mask] if with_normals else None,
+                img_rgb[final_mask])
+
+    def _build_point_cloud_from_moge_data(self, data, img_rgb, fg_mask, report):
+        """Construit un simple nuage de points coloré pour MoGe."""
+        if 'mask' not in data:
+            # Points sans masque de validité (VGGT, y compris image par image dans une séquence).
+            return self._build_from_points_only(data, report)
+        pts, _, colors = self._select_masked(data, img_rgb, fg_mask, report)
         return trimesh.Trimesh(vertices=pts, vertex_colors=colors)
 
-    def _build_from_points_only(self, data):
+    def _build_from_points_only(self, data, report):
         """Pour les moteurs simples comme VGGT."""
         print("Construction à partir d'un nuage de points simple.")
-        return trimesh.Trimesh(vertices=data['points'], vertex_colors=data.get('vertex_colors'))
+        points, colors = data['points'], data.get('vertex_colors')
+        stride = self.budget.point_stride(len(points))
+        if stride > 1:
+            report.add("géométrie", f"{len(points)} points > {self.budget.max_geometry_points}, 1 point sur {stride} conservé")
+            points = points[::stride]
+            colors = colors[::stride] if colors is not None else None
+        return trimesh.Trimesh(vertices=points, vertex_colors=colors)
 
-    def _build_from_depth_map(self, depth_map, rgb_image, options: dict):
+    def _build_from_depth_map(self, depth_map, rgb_image, options: dict, report):
         """Pour les moteurs comme DepthFM et Depth Anything V2."""
         print("Construction à partir d'une carte de profondeur.")
         h, w = depth_map.shape
         fx = fy = w * 1.2
         cx, cy = w / 2, h / 2
-        jj, ii = np.meshgrid(np.arange(w), np.arange(h))
+
+        # Sous-échantillonnage par pas de grille si le budget de points est dépassé. Les coordonnées
+        # pixel restent celles de la pleine résolution : la forme de l'objet ne change pas.
+        stride = self.budget.grid_stride(h * w)
+        if stride > 1:
+            report.add("géométrie", f"carte {w}x{h} ({h * w} points) > {self.budget.max_geometry_points}, pas de grille {stride}")
+            depth_map = depth_map[::stride, ::stride]
+            rgb_image = rgb_image[::stride, ::stride]
+        # Grilles de coordonnées diffusées (broadcast) au lieu d'un meshgrid pleine taille.
+        jj = np.arange(0, w, stride, dtype=np.float32)[None, :]
+        ii = np.arange(0, h, stride, dtype=np.float32)[:, None]
         
         # --- CORRECTION FINALE DE LA LOGIQUE GÉOMÉTRIQUE ---
 
@@ -89,18 +142,21 @@ class GeometryBuilder:
         colors = rgb_image.reshape(-1, 3)
         return trimesh.Trimesh(vertices=points, vertex_colors=colors)
 
-    def _build_from_points_and_normals(self, data, img_rgb, fg_mask, options: dict):
+    def _build_from_points_and_normals(self, data, img_rgb, fg_mask, options: dict, report):
         """Logique avancée pour MoGe, utilisant la reconstruction de surface."""
-        final_mask = self._apply_fg_mask(data['mask'], fg_mask)
-        pts, norms, colors = data['points'][final_mask], data['normal'][final_mask], img_rgb[final_mask]
+        pts, norms, colors = self._select_masked(data, img_rgb, fg_mask, report, with_normals=True)
         if len(pts) < 100:
             print("AVERTISSEMENT: Pas assez de points valides, retour à un simple nuage de points.")
             return trimesh.Trimesh(vertices=pts, vertex_colors=colors)
         print("Lancement de la reconstruction de surface Poisson...")
         try:
+            # Imports différés : open3d et scipy ne servent qu'à cette branche et ralentiraient le démarrage.
+            import open3d as o3d
+            from scipy.spatial import KDTree
             pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(pts))
             pcd.normals = o3d.utility.Vector3dVector(norms)
-            mesh_o3d, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pcd, depth=config.POISSON_DEPTH)
+            with trace_span("Poisson", points=len(pts)):
+                mesh_o3d, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pcd, depth=options.get('poisson_depth', config.POISSON_DEPTH))
             if not mesh_o3d: raise ValueError("Échec de la reconstruction Poisson.")
             if options.get('quality_filters', True):
                 print("Application des filtres de qualité...")
@@ -109,8 +165,9 @@ class GeometryBuilder:
                 mesh_o3d.remove_vertices_by_mask(~keep_mask)
             mesh = trimesh.Trimesh(np.asarray(mesh_o3d.vertices), np.asarray(mesh_o3d.triangles), process=False)
             if comps := mesh.split(only_watertight=False): mesh = max(comps, key=lambda c: len(c.faces))
-            _, idx = KDTree(pts).query(mesh.vertices, k=1)
-            mesh.visual.vertex_colors = colors[idx]
+            with trace_span("transfert des couleurs"):
+                _, idx = KDTree(pts).query(mesh.vertices, k=1)
+                mesh.visual.vertex_colors = colors[idx]
             print("Maillage de surface de haute qualité construit.")
             return mesh
         except Exception as e:
@@ -1,7 +1,8 @@
-import sys, os
+import sys, os, time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
                              QListWidget, QListWidgetItem, QLabel, QStatusBar, QComboBox,
-                             QPushButton, QGroupBox, QCheckBox, QStyle, QMessageBox, QSpinBox, QFormLayout, QDoubleSpinBox)
+                             QPushButton, QGroupBox, QCheckBox, QStyle, QMessageBox, QSpinBox, QFormLayout, QDoubleSpinBox,
+                             QFileDialog)
 from PyQt6.QtGui import QIcon, QPixmap, QImage
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from pyvistaqt import QtInteractor
@@ -10,7 +11,12 @@ import trimesh
 from src import config
 from src.app_controller import AppController
 from src.processing.local_processor import LocalProcessor
-from src.processing.remote_processor import RemoteProcessor
+from src.processing.export_processor import ExportProcessor
+from src.processing.index_processor import SpatialIndexProcessor
+from src.comparison_window import ComparisonWindow
+from src.budget import BudgetReport
+from src.metrics import record_cache
+from src.profiling import Tracer, activate_tracer, trace_path, trace_span
 
 from src.config import DEFAULT_ENGINE, PIPELINE_OPTIONS
 from PIL.ImageQt import ImageQt
@@ -20,7 +26,11 @@ import numpy as np
 class MainWindow(QMainWindow):
     # Ce signal est maintenant agnostique : il demande juste un traitement.
     processing_request = pyqtSignal(str, str, dict)
+    batch_request = pyqtSignal(list, str, dict)
+    comparison_request = pyqtSignal(str, dict)
     thumbnail_request = pyqtSignal()
+    export_request = pyqtSignal(str, object, object)
+    index_request = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
@@ -29,6 +39,12 @@ class MainWindow(QMainWindow):
 
         self.controller = AppController()
         self.option_widgets = {}
+        self.comparison_checkboxes = {}
+        self.batch_options = None
+        self.comparison_windows = []
+        self.tracer = None  # Traceur du traitement en cours (spans de toutes les étapes)
+        self.displayed_mesh = None
+        self.picked_points = []  # Derniers points sélectionnés : (indice du sommet, position)
 
         # --- INSTANCIATION DU PROCESSEUR SELON LA CONFIGURATION ---
         self.thread = QThread()
@@ -36,16 +52,20 @@ class MainWindow(QMainWindow):
         if config.PROCESSING_MODE == "local":
             print("INFO: Initialisation en mode de traitement LOCAL.")
             self.processor = LocalProcessor(self.controller)
-        elif config.PROCESSING_MODE == "remote":
-            print("INFO: Initialisation en mode de traitement REMOTE.")
+        elif config.PROCESSING_MODE in ("remote", "hybrid"):
+            print(f"INFO: Initialisation en mode de traitement {config.PROCESSING_MODE.upper()}.")
             api_key = os.environ.get("RUNPOD_API_KEY")
             if not api_key:
                 QMessageBox.critical(self, "Erreur de Configuration",
                                      "La variable d'environnement RUNPOD_API_KEY n'est pas définie.\n"
-                                     "Le mode 'remote' est indisponible.")
+                                     f"Le mode '{config.PROCESSING_MODE}' est indisponible.")
                 # Fallback ou sortie gracieuse
                 sys.exit("Clé API RunPod non trouvée.")
-            self.processor = RemoteProcessor(api_key, config.RUNPOD_ENDPOINT_ID)
+            endpoint_ids = config.RUNPOD_ENDPOINT_IDS or config.RUNPOD_ENDPOINT_ID
+            # Import différé : le client HTTP (requests, aiohttp) ne sert qu'aux modes distants.
+            from src.processing.remote_processor import RemoteProcessor
+            self.processor = RemoteProcessor(api_key, endpoint_ids, self.controller,
+                                             hybrid=config.PROCESSING_MODE == "hybrid")
         else:
             raise ValueError(f"Mode de traitement inconnu : {config.PROCESSING_MODE}")
 
@@ -54,6 +74,13 @@ class MainWindow(QMainWindow):
         self.processing_request.connect(self.processor.process)
         self.processor.finished.connect(self.on_processing_finished)
         self.processor.error.connect(self.on_error)
+        self.processor.status_message.connect(self.on_status_message)
+        self.batch_request.connect(self.processor.process_batch)
+        self.processor.batch_item_finished.connect(self.on_batch_item_finished)
+        self.processor.batch_finished.connect(self.on_batch_finished)
+        if hasattr(self.processor, 'process_comparison'):
+            self.comparison_request.connect(self.processor.process_comparison)
+            self.processor.comparison_finished.connect(self.on_comparison_finished)
         
         # Le chargement des miniatures reste local et rapide
         self.local_thumb_worker = LocalProcessor(self.controller)
@@ -62,6 +89,24 @@ class MainWindow(QMainWindow):
         self.thumbnail_request.connect(self.local_thumb_worker.load_thumbnails)
         self.local_thumb_worker.thumbnail_data_ready.connect(self.on_thumbnail_data_ready)
         self.thumb_thread.start()
+
+        # L'export a son propre thread : il peut tourner pendant un traitement.
+        self.export_processor = ExportProcessor()
+        self.export_thread = QThread()
+        self.export_processor.moveToThread(self.export_thread)
+        self.export_request.connect(self.export_processor.export_cached)
+        self.export_processor.finished.connect(self.on_export_finished)
+        self.export_processor.error.connect(self.on_error)
+        self.export_processor.status_message.connect(self.on_status_message)
+        self.export_thread.start()
+
+        # Index spatial des résultats affichés (outils de mesure), construit hors du thread de l'interface.
+        self.index_processor = SpatialIndexProcessor(self.controller)
+        self.index_thread = QThread()
+        self.index_processor.moveToThread(self.index_thread)
+        self.index_request.connect(self.index_processor.build)
+        self.index_processor.index_ready.connect(self.on_index_ready)
+        self.index_thread.start()
         # --- FIN DE L'INSTANCIATION ---
 
         self.thread.started.connect(self.start_background_tasks)
@@ -89,7 +134,10 @@ class MainWindow(QMainWindow):
         for path in self.controller.items:
             item = QListWidgetItem(os.path.basename(path))
             item.setData(Qt.ItemDataRole.UserRole, path)
-            icon_type = QStyle.StandardPixmap.SP_DirIcon if os.path.isdir(path) else QStyle.StandardPixmap.SP_FileIcon
+            if self.controller.is_sequence(path):
+                icon_type = QStyle.StandardPixmap.SP_MediaPlay
+            else:
+                icon_type = QStyle.StandardPixmap.SP_DirIcon if os.path.isdir(path) else QStyle.StandardPixmap.SP_FileIcon
             item.setIcon(self.style().standardIcon(icon_type))
             self.item_browser.addItem(item)
         self.item_browser.itemClicked.connect(self.on_item_selected)
@@ -102,7 +150,7 @@ class MainWindow(QMainWindow):
         left_panel_layout.addWidget(self.preview_label, 2)
         left_panel_layout.addWidget(QLabel("<b>2. Choisissez un Moteur de Reconstruction:</b>"))
         self.engine_selector = QComboBox()
-        self.engine_selector.addItems(self.controller.engines.keys())
+        self.engine_selector.addItems(self.controller.engine_names())
         self.engine_selector.setCurrentText(DEFAULT_ENGINE)
         left_panel_layout.addWidget(self.engine_selector)
         self.pipeline_options_group = QGroupBox("3. Options de Pré-traitement")
@@ -113,11 +161,48 @@ class MainWindow(QMainWindow):
         self.engine_options_layout = QFormLayout()
         self.engine_options_group.setLayout(self.engine_options_layout)
         left_panel_layout.addWidget(self.engine_options_group)
+        self.comparison_group = QGroupBox("5. Comparaison des Moteurs")
+        comparison_layout = QVBoxLayout()
+        for name in self.controller.engine_names():
+            checkbox = QCheckBox(name)
+            checkbox.setChecked(True)
+            comparison_layout.addWidget(checkbox)
+            self.comparison_checkboxes[name] = checkbox
+        compare_button = QPushButton("Comparer les moteurs sélectionnés")
+        compare_button.clicked.connect(self.on_compare_clicked)
+        comparison_layout.addWidget(compare_button)
+        self.comparison_group.setLayout(comparison_layout)
+        # La comparaison s'appuie sur le pipeline local (pré-traitement partagé en mémoire).
+        self.comparison_group.setVisible(config.PROCESSING_MODE == "local")
+        left_panel_layout.addWidget(self.comparison_group)
+        self.measure_group = QGroupBox("6. Mesure et Coupe")
+        measure_layout = QFormLayout()
+        self.picking_checkbox = QCheckBox("Sélection de points (clic droit)")
+        self.picking_checkbox.toggled.connect(self.on_picking_toggled)
+        measure_layout.addRow(self.picking_checkbox)
+        self.slice_axis_selector = QComboBox()
+        self.slice_axis_selector.addItems(["Vue", "X", "Y", "Z"])
+        measure_layout.addRow("Normale de la coupe", self.slice_axis_selector)
+        slice_button = QPushButton("Couper au dernier point sélectionné")
+        slice_button.clicked.connect(self.on_slice_clicked)
+        measure_layout.addRow(slice_button)
+        clear_button = QPushButton("Effacer la sélection")
+        clear_button.clicked.connect(self.clear_measurements)
+        measure_layout.addRow(clear_button)
+        self.measure_group.setLayout(measure_layout)
+        self.measure_group.setVisible(config.SPATIAL_INDEX_CONFIG['enabled'])
+        left_panel_layout.addWidget(self.measure_group)
         left_panel_layout.addStretch()
         process_button = QPushButton("Lancer le Traitement")
         process_button.setStyleSheet("font-size: 16px; padding: 10px; background-color: #4CAF50; color: white;")
         process_button.clicked.connect(self.on_process_clicked)
         left_panel_layout.addWidget(process_button)
+        batch_button = QPushButton("Traiter toutes les images")
+        batch_button.clicked.connect(self.on_batch_clicked)
+        left_panel_layout.addWidget(batch_button)
+        export_button = QPushButton("Exporter les résultats")
+        export_button.clicked.connect(self.on_export_clicked)
+        left_panel_layout.addWidget(export_button)
         main_layout.addWidget(left_panel_widget)
         self.plotter = QtInteractor(self)
         main_layout.addWidget(self.plotter.interactor, 4)
@@ -136,14 +221,14 @@ class MainWindow(QMainWindow):
             elif params['type'] == 'choice': widget = QComboBox(); widget.addItems(params.get('choices', [])); widget.setCurrentText(params.get('default', ''))
             elif params['type'] == 'float': widget = QDoubleSpinBox(); widget.setRange(params.get('min', 0.0), params.get('max', 100.0)); widget.setSingleStep(params.get('step', 0.1)); widget.setValue(params.get('default', 1.0))
             if widget: self.pipeline_options_layout.addRow(params['label'], widget); self.option_widgets[key] = widget
-        engine = self.controller.get_engine(engine_name)
-        if engine and 'options' in engine.config:
-            for key, params in engine.config['options'].items():
-                widget = None
-                if params['type'] == 'bool': widget = QCheckBox(); widget.setChecked(params.get('default', False))
-                elif params['type'] == 'int': widget = QSpinBox(); widget.setRange(params.get('min', 0), params.get('max', 100)); widget.setValue(params.get('default', 0))
-                elif params['type'] == 'choice': widget = QComboBox(); widget.addItems(params.get('choices', [])); widget.setCurrentText(str(params.get('default', '')))
-                if widget: self.engine_options_layout.addRow(params['label'], widget); self.option_widgets[key] = widget
+        # Options lues dans la configuration : le moteur n'est chargé qu'au lancement d'un traitement.
+        for key, params in self.controller.get_engine_option_specs(engine_name).items():
+            widget = None
+            if params['type'] == 'bool': widget = QCheckBox(); widget.setChecked(params.get('default', False))
+            elif params['type'] == 'int': widget = QSpinBox(); widget.setRange(params.get('min', 0), params.get('max', 100)); widget.setValue(params.get('default', 0))
+            elif params['type'] == 'float': widget = QDoubleSpinBox(); widget.setDecimals(params.get('decimals', 2)); widget.setRange(params.get('min', 0.0), params.get('max', 100.0)); widget.setSingleStep(params.get('step', 0.1)); widget.setValue(params.get('default', 1.0))
+            elif params['type'] == 'choice': widget = QComboBox(); widget.addItems(params.get('choices', [])); widget.setCurrentText(str(params.get('default', '')))
+            if widget: self.engine_options_layout.addRow(params['label'], widget); self.option_widgets[key] = widget
         self.engine_options_group.setVisible(self.engine_options_layout.rowCount() > 0)
 
 
@@ -171,6 +256,9 @@ class MainWindow(QMainWindow):
         else: self.preview_label.setText("Pas d'aperçu pour les scènes.")
 
 
+    def _current_options(self) -> dict:
+        return {k: w.isChecked() if isinstance(w, QCheckBox) else w.value() if isinstance(w, (QSpinBox, QDoubleSpinBox)) else w.currentText() for k, w in self.option_widgets.items()}
+
     def on_process_clicked(self):
         if not (current_item := self.item_browser.currentItem()):
             self.statusBar().showMessage("Veuillez sélectionner une image.", 5000)
@@ -178,18 +266,18 @@ class MainWindow(QMainWindow):
 
         path = current_item.data(Qt.ItemDataRole.UserRole)
         engine_name = self.engine_selector.currentText()
-        options = {k: w.isChecked() if isinstance(w, QCheckBox) else w.value() if isinstance(w, (QSpinBox, QDoubleSpinBox)) else w.currentText() for k, w in self.option_widgets.items()}
+        options = self._current_options()
         
-        # Le cache n'est pertinent qu'en mode local pour l'instant.
-        # Le worker distant pourrait avoir son propre cache, mais c'est transparent pour nous.
-        if config.PROCESSING_MODE == "local":
-             mesh_cache_key = self.controller.get_mesh_cache_key(path, engine_name, options)
-             if mesh_cache_key in self.controller.mesh_cache:
-                 print(f"Cache HIT (Maillage final) pour {os.path.basename(path)}")
-                 self.update_3d_view(self.controller.mesh_cache[mesh_cache_key])
-                 return
+        # Le cache de maillages sert dans tous les modes : un résultat distant déjà reçu n'est pas redemandé.
+        mesh_cache_key = self.controller.get_mesh_cache_key(path, engine_name, options)
+        record_cache('mesh', mesh_cache_key in self.controller.mesh_cache)
+        if mesh_cache_key in self.controller.mesh_cache:
+            print(f"Cache HIT (Maillage final) pour {os.path.basename(path)}")
+            self.update_3d_view(self.controller.mesh_cache[mesh_cache_key])
+            return
 
         self.statusBar().showMessage(f"Lancement du traitement avec {engine_name} en mode {config.PROCESSING_MODE}...")
+        self._start_trace(f"{engine_name}_{os.path.basename(path)}")
         self.processing_request.emit(path, engine_name, options)
 
     def on_processing_finished(self, mesh: trimesh.Trimesh):
@@ -199,24 +287,205 @@ class MainWindow(QMainWindow):
         """
         self.statusBar().showMessage("Traitement terminé avec succès.", 5000)
         self.update_3d_view(mesh, reset_camera=True)
+        self._finish_trace("Traitement terminé")
         
-        if config.PROCESSING_MODE == 'local' and self.item_browser.currentItem():
+        if self.item_browser.currentItem():
             path = self.item_browser.currentItem().data(Qt.ItemDataRole.UserRole)
             engine_name = self.engine_selector.currentText()
-            options = {k: w.isChecked() if isinstance(w, QCheckBox) else w.value() if isinstance(w, (QSpinBox, QDoubleSpinBox)) else w.currentText() for k, w in self.option_widgets.items()}
+            options = self._current_options()
             mesh_cache_key = self.controller.get_mesh_cache_key(path, engine_name, options)
             self.controller.mesh_cache[mesh_cache_key] = mesh
 
 
+    def on_batch_clicked(self):
+        paths = [p for p in self.controller.items if not os.path.isdir(p) and not self.controller.is_sequence(p)]
+        if not paths:
+            self.statusBar().showMessage("Aucune image à traiter.", 5000)
+            return
+        self.batch_options = (self.engine_selector.currentText(), self._current_options())
+        self.statusBar().showMessage(f"Traitement par lot de {len(paths)} images en mode {config.PROCESSING_MODE}...")
+        self._start_trace(f"lot_{self.batch_options[0]}")
+        self.batch_request.emit(paths, *self.batch_options)
+
+    def on_batch_item_finished(self, path: str, mesh: trimesh.Trimesh):
+        engine_name, options = self.batch_options
+        self.controller.mesh_cache[self.controller.get_mesh_cache_key(path, engine_name, options)] = mesh
+        if (item := self.item_browser.currentItem()) and item.data(Qt.ItemDataRole.UserRole) == path:
+            self.update_3d_view(mesh, reset_camera=True)
+
+    def on_batch_finished(self, succeeded: int, failed: int):
+        self.statusBar().showMessage(f"Traitement par lot terminé : {succeeded} réussite(s), {failed} échec(s).", 10000)
+        self._finish_trace(f"Lot terminé ({succeeded} réussite(s), {failed} échec(s))")
+
+    def on_export_clicked(self):
+        if not self.controller.mesh_cache and not len(self.controller.raw_data_cache):
+            self.statusBar().showMessage("Aucun résultat en cache à exporter.", 5000)
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Dossier d'export", config.EXPORT_CONFIG['output_dir'])
+        if not output_dir:
+            return
+        self.statusBar().showMessage(f"Export de {len(self.controller.mesh_cache)} résultat(s) vers {output_dir}...")
+        self.export_request.emit(output_dir, self.controller.mesh_cache.snapshot(), self.controller.raw_data_cache.snapshot())
+
+    def on_export_finished(self, summary: dict):
+        message = (f"Export terminé : {len(summary['files'])} fichier(s), {summary['bytes'] / 1024 ** 2:.0f} Mo "
+                   f"en {summary['elapsed_s']:.1f}s")
+        if summary['failed']:
+            message += f", {len(summary['failed'])} échec(s)"
+        print(message)
+        self.statusBar().showMessage(message, 10000)
+
+    def on_compare_clicked(self):
+        if not (current_item := self.item_browser.currentItem()):
+            self.statusBar().showMessage("Veuillez sélectionner une image.", 5000)
+            return
+        engine_names = [name for name, cb in self.comparison_checkboxes.items() if cb.isChecked()]
+        if len(engine_names) < 2:
+            self.statusBar().showMessage("Sélectionnez au moins deux moteurs à comparer.", 5000)
+            return
+
+        # Options du pipeline communes à tous ; options propres à chaque moteur : valeurs par défaut,
+        # sauf pour le moteur actuellement affiché dont on reprend les réglages de l'interface.
+        current_options = self._current_options()
+        pipeline_options = {k: v for k, v in current_options.items() if k in PIPELINE_OPTIONS}
+        selected_engine = self.engine_selector.currentText()
+        options_by_engine = {}
+        for name in engine_names:
+            options = {**self.controller.get_default_options(name), **pipeline_options}
+            if name == selected_engine:
+                options.update(current_options)
+            options_by_engine[name] = options
+
+        path = current_item.data(Qt.ItemDataRole.UserRole)
+        self.statusBar().showMessage(f"Comparaison de {len(engine_names)} moteurs en cours...")
+        self._start_trace("comparaison")
+        self.comparison_request.emit(path, options_by_engine)
+
+    def on_comparison_finished(self, results: dict):
+        summary = " | ".join(f"{name}: {r['latency_s']:.1f}s" if not r.get('error') else f"{name}: échec" for name, r in results.items())
+        self.statusBar().showMessage(f"Comparaison terminée — {summary}", 10000)
+        self._finish_trace(f"Comparaison terminée — {summary}")
+        window = ComparisonWindow(self.controller, results, self)
+        self.comparison_windows.append(window)
+        window.show()
+
+    def on_index_ready(self, mesh, index):
+        if mesh is self.displayed_mesh:
+            self.statusBar().showMessage(f"Index spatial prêt ({len(index)} sommets, {index.build_time_s:.2f}s).", 5000)
+
+    def _displayed_index(self):
+        index = self.controller.spatial_indexes.get(self.displayed_mesh) if self.displayed_mesh is not None else None
+        if index is None:
+            self.statusBar().showMessage("Index spatial en cours de construction, réessayez dans un instant.", 5000)
+        return index
+
+    def _mesh_diagonal(self) -> float:
+        return float(np.linalg.norm(np.ptp(self.displayed_mesh.vertices, axis=0))) or 1.0
+
+    def on_picking_toggled(self, enabled: bool):
+        if enabled:
+            self.plotter.track_click_position(callback=self.on_viewer_click, side='right')
+        else:
+            self.plotter.untrack_click_position(side='right')
+
+    def on_viewer_click(self, position):
+        """Clic droit : le point visé est ramené au sommet le plus proche du résultat complet (non décimé)."""
+        if (index := self._displayed_index()) is None:
+            return
+        import pyvista as pv
+        start = time.perf_counter()
+        vertex, _ = index.nearest(position)
+        point = np.asarray(self.displayed_mesh.vertices[vertex], dtype=np.float64)
+        radius = self._mesh_diagonal() * config.SPATIAL_INDEX_CONFIG['neighborhood_ratio']
+        neighbors = len(index.query_sphere(point, radius))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.picked_points = (self.picked_points + [(vertex, point)])[-2:]
+
+        positions = np.array([p for _, p in self.picked_points])
+        self.plotter.add_points(positions, color='red', point_size=12, render_points_as_spheres=True,
+                                name='selection', reset_camera=False)
+        message = (f"Sommet {vertex} ({point[0]:.3f}, {point[1]:.3f}, {point[2]:.3f}) — "
+                   f"{neighbors} voisin(s) à moins de {radius:.3f}")
+        if len(self.picked_points) == 2:
+            self.plotter.add_mesh(pv.Line(positions[0], positions[1]), color='red', line_width=3,
+                                  name='mesure', reset_camera=False)
+            message += f" — distance : {np.linalg.norm(positions[1] - positions[0]):.4f}"
+        self.statusBar().showMessage(f"{message} ({elapsed_ms:.1f} ms)", 15000)
+
+    def on_slice_clicked(self):
+        if (index := self._displayed_index()) is None:
+            return
+        axis = self.slice_axis_selector.currentText()
+        if axis == "Vue":
+            normal = np.asarray(self.plotter.camera.direction, dtype=np.float64)
+        else:
+            normal = np.eye(3)["XYZ".index(axis)]
+        vertices = self.displayed_mesh.vertices
+        origin = self.picked_points[-1][1] if self.picked_points else (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+        thickness = self._mesh_diagonal() * config.SPATIAL_INDEX_CONFIG['slice_thickness_ratio']
+        start = time.perf_counter()
+        indices = index.slice_plane(origin, normal, thickness)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if len(indices):
+            self.plotter.add_points(np.asarray(vertices[indices]), color='yellow', point_size=3,
+                                    name='coupe', reset_camera=False)
+        else:
+            self.plotter.remove_actor('coupe')
+        self.statusBar().showMessage(f"Coupe : {len(indices)} sommet(s) dans une tranche de {thickness:.4f} "
+                                     f"({elapsed_ms:.1f} ms)", 15000)
+
+    def clear_measurements(self):
+        self.picked_points = []
+        for name in ('selection', 'mesure', 'coupe'):
+            self.plotter.remove_actor(name)
+
+    def on_status_message(self, message: str):
+        self.statusBar().showMessage(message, 10000)
+
+    def _start_trace(self, label: str):
+        """Active un traceur pour le traitement qui commence (spans de tous les threads)."""
+        if not config.PROFILING_CONFIG['enabled']:
+            return
+        if self.tracer is not None:
+            # Un traceur encore actif serait écrasé sans être exporté : on le clôt d'abord.
+            self._finish_trace("Trace précédente close avant sa fin")
+        self.tracer = Tracer(label, config.PROFILING_CONFIG['sample_interval_s'])
+        activate_tracer(self.tracer)
+
+    def _finish_trace(self, prefix: str):
+        """Désactive le traceur, exporte la trace Chrome et résume les étapes dans la barre d'état."""
+        if self.tracer is None:
+            return
+        tracer, self.tracer = self.tracer, None
+        activate_tracer(None)
+        message = f"{prefix} — {tracer.summary()}"
+        if config.PROFILING_CONFIG['export_traces'] and tracer.spans:
+            path = tracer.export_chrome_trace(trace_path(config.PROFILING_CONFIG['trace_dir'], tracer.name))
+            print(f"Trace exportée : {path}")
+            message += f" — trace : {path}"
+        print(f"Profil : {tracer.summary()}")
+        self.statusBar().showMessage(message, 20000)
+
     def on_error(self, message):
+        self._finish_trace("Échec")
         self.statusBar().showMessage(f"Erreur: {message}", 10000)
         QMessageBox.critical(self, "Erreur Critique", message)
     
     def update_3d_view(self, mesh, reset_camera: bool = True):
         self.plotter.clear()
+        self.picked_points = []
+        self.displayed_mesh = mesh if isinstance(mesh, trimesh.Trimesh) and len(mesh.vertices) else None
+        if self.displayed_mesh is not None and config.SPATIAL_INDEX_CONFIG['enabled']:
+            # Un résultat réaffiché depuis le cache retrouve son index ; sinon il est construit en arrière-plan.
+            if self.displayed_mesh not in self.controller.spatial_indexes:
+                self.index_request.emit(self.displayed_mesh)
         if mesh and isinstance(mesh, trimesh.Trimesh):
-            pv_mesh = self.controller.trimesh_to_polydata(mesh)
-            self.plotter.add_mesh(pv_mesh, scalars='colors', rgb=True, smooth_shading=True, specular=0.3)
+            report = BudgetReport()
+            pv_mesh = self.controller.trimesh_to_polydata(mesh, report)
+            if report.decisions:
+                self.statusBar().showMessage(f"Budget d'affichage — {report.summary()}", 10000)
+            with trace_span("rendu"):
+                self.plotter.add_mesh(pv_mesh, scalars='colors', rgb=True, smooth_shading=True, specular=0.3)
         
         if reset_camera:
             self.plotter.reset_camera()
@@ -226,4 +495,8 @@ class MainWindow(QMainWindow):
         self.thread.wait()
         self.thumb_thread.quit()
         self.thumb_thread.wait()
+        self.export_thread.quit()
+        self.export_thread.wait()
+        self.index_thread.quit()
+        self.index_thread.wait()
         super().closeEvent(event)
\ No newline at end of file
@@ -0,0 +1,205 @@
+import atexit
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Registre de métriques (compteurs, jauges, histogrammes) au format texte Prometheus, pour le
+# dimensionnement de la flotte RunPod et de l'interface locale. Une mise à jour coûte une
+# recherche dans un dict et un verrou : négligeable face aux étapes mesurées.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, values, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # valeurs des étiquettes (tuple) -> état
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, state in sorted(items):
+            lines.extend(self._render_sample(key, state))
+        return lines
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect_left(self.buckets, value)  # len(buckets) : au-delà du dernier seuil (+Inf)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            bucket_labels = _format_labels(self.labelnames, key, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        """Toutes les métriques au format d'exposition texte de Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def dump(self, path: str):
+        """Écrit les métriques dans un fichier (remplacé atomiquement), par ex. pour le collecteur textfile de node_exporter."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Expose GET /metrics sur un petit serveur HTTP local, dans un thread d'arrière-plan."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Pas de ligne de journal à chaque collecte
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="métriques HTTP", daemon=True).start()
+        print(f"Métriques exposées sur http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def start_dump(self, path: str, interval_s: float):
+        """Réécrit le fichier toutes les interval_s secondes, et une dernière fois à la sortie."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval_s):
+                self._safe_dump(path)
+
+        threading.Thread(target=loop, name="métriques fichier", daemon=True).start()
+        atexit.register(lambda: (stop.set(), self._safe_dump(path)))
+        print(f"Métriques écrites dans {path} (toutes les {interval_s:.0f}s)")
+
+    def _safe_dump(self, path: str):
+        try:
+            self.dump(path)
+        except OSError as e:
+            print(f"AVERTISSEMENT: Échec de l'écriture des métriques dans {path}: {e}")
+
+REGISTRY = MetricsRegistry()
+
+# --- Métriques de l'application (mode : 'local', 'remote', 'hybrid' ou 'worker') ---
+JOBS = REGISTRY.counter(
+    'laforge_jobs_total', "Traitements terminés, par moteur, mode et statut.", ('engine', 'mode', 'status'))
+JOB_DURATION = REGISTRY.histogram(
+    'laforge_job_duration_seconds', "Durée totale d'un traitement, de la demande au résultat.", ('engine', 'mode'))
+QUEUE_WAIT = REGISTRY.histogram(
+    'laforge_queue_wait_seconds', "Attente en file avant l'exécution d'une tâche distante (delayTime RunPod).", ('endpoint',))
+STAGE_DURATION = REGISTRY.histogram(
+    'laforge_stage_duration_seconds', "Durée des étapes du pipeline (spans de trace_span).", ('stage',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'laforge_cache_requests_total', "Consultations des caches, par cache et résultat (hit/miss).", ('cache', 'result'))
+MODEL_LOADS = REGISTRY.counter(
+    'laforge_model_loads_total', "Chargements de modèles.", ('engine',))
+MODEL_LOAD_DURATION = REGISTRY.histogram(
+    'laforge_model_load_seconds', "Durée de chargement des modèles.", ('engine',))
+ENSEMBLE_MEMBERS = REGISTRY.histogram(
+    'laforge_ensemble_members', "Membres d'ensemble calculés par inférence (ensemble adaptatif).", ('engine',),
+    buckets=(1, 2, 3, 4, 5, 6, 7, 8, 12, 16))
+TRANSFERRED_BYTES = REGISTRY.counter(
+    'laforge_transferred_bytes_total', "Octets échangés avec les workers, par sens et canal.", ('direction', 'channel'))
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+def start_exporters(http_port: int = None, dump_path: str = None, dump_interval_s: float = 30.0, host: str = '127.0.0.1'):
+    """Démarre l'exposition HTTP et/ou l'écriture périodique dans un fichier (rien si les deux sont absents)."""
+    if http_port:
+        try:
+            REGISTRY.serve(int(http_port), host)
+        except OSError as e:
+            print(f"AVERTISSEMENT: Impossible d'exposer les métriques sur le port {http_port}: {e}")
+    if dump_path:
+        REGISTRY.start_dump(dump_path, dump_interval_s)
@@ -0,0 +1,354 @@
+import asyncio
+import io
+import aiohttp
+
+from src import config as app_config
+from .endpoint_router import EndpointRouter
+from .runpod_client import (AdaptivePoller, TRANSIENT_STATUS_CODES, TransientHTTPError,
+                            backoff_delay, load_result_mesh, normalize_endpoint_ids, parse_result_output,
+                            record_completion, record_result_bytes, record_submission)
+from .raw_codec import decode_raw_data
+from .result_cache import DiskResultCache
+from .upload import UploadPreparer
+
+class AsyncRunPodClient:
+    """
+    Client asyncio pour RunPod Serverless : garde de nombreuses tâches en vol
+    (limite de concurrence), interroge leur statut de façon adaptative et
+    restitue les résultats sous forme de flux asynchrone, dans l'ordre d'achèvement.
+    À utiliser comme gestionnaire de contexte : async with AsyncRunPodClient(...) as client.
+    Routage multi-endpoints et hedging identiques à RunPodClient (EndpointRouter partageable).
+    """
+    def __init__(self, api_key: str, endpoint_id, base_url: str = None, http_config: dict = None,
+                 uploader: UploadPreparer = None, result_cache: DiskResultCache = None,
+                 router: EndpointRouter = None):
+        if not api_key:
+            raise ValueError("La clé API RunPod ne peut pas être vide.")
+        endpoint_ids = normalize_endpoint_ids(endpoint_id)
+
+        self.api_key = api_key
+        self.http_config = {**app_config.REMOTE_HTTP_CONFIG, **(http_config or {})}
+        self.base_url = (base_url or app_config.RUNPOD_API_BASE_URL).rstrip('/')
+        self.router = router or EndpointRouter(endpoint_ids)
+        self.health_lock = asyncio.Lock()
+        self.session = None
+        self.uploader = uploader or UploadPreparer()
+        self.result_cache = result_cache
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.http_config['max_in_flight'] * 2)
+        timeout = aiohttp.ClientTimeout(total=self.http_config['timeout_s'])
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    def _get_headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    async def _retry_sleep(self, attempt: int):
+        await asyncio.sleep(backoff_delay(attempt, self.http_config['backoff_base_s'], self.http_config['backoff_max_s']))
+
+    async def _request_json(self, method: str, url: str, payload: dict = None, timeout_s: float = None,
+                            idempotent: bool = True) -> dict:
+        """
+        Requête API authentifiée (JSON), réessayée avec backoff sur les erreurs transitoires.
+        Une soumission de tâche (non idempotente) n'est renvoyée que si la connexion n'a pas pu
+        être établie, comme RunPodClient._request ; un 429 y est une demande refusée.
+        """
+        max_retries = self.http_config['max_retries']
+        timeout = aiohttp.ClientTimeout(total=timeout_s) if timeout_s else None
+        for attempt in range(max_retries + 1):
+            try:
+                async with self.session.request(method, url, json=payload, headers=self._get_headers(),
+                                                timeout=timeout) as response:
+                    if response.status in TRANSIENT_STATUS_CODES and (idempotent or response.status != 429):
+                        raise TransientHTTPError(f"Statut {response.status}")
+                    if response.status != 200:
+                        raise ConnectionError(f"Requête RunPod refusée. Statut: {response.status}, Réponse: {await response.text()}")
+                    return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError, TransientHTTPError) as e:
+                if attempt == max_retries or not (idempotent or isinstance(e, aiohttp.ClientConnectorError)):
+                    raise
+                await self._retry_sleep(attempt)
+
+    async def _download(self, url: str) -> bytes:
+        """
+        Télécharge un fichier en streaming, avec reprise (en-tête Range) comme RunPodClient.download.
+        Le délai global de la session ne s'applique pas : un gros nuage de points peut prendre
+        plus de 'timeout_s' ; seules la connexion et chaque lecture sont bornées.
+        """
+        buffer = io.BytesIO()
+        max_retries = self.http_config['max_retries']
+        chunk_size = self.http_config['download_chunk_bytes']
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.http_config['timeout_s'],
+                                        sock_read=self.http_config['timeout_s'])
+        for attempt in range(max_retries + 1):
+            offset = buffer.tell()
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                async with self.session.get(url, headers=headers, timeout=timeout) as response:
+                    if response.status in TRANSIENT_STATUS_CODES:
+                        raise TransientHTTPError(f"Statut {response.status}")
+                    if response.status == 200 and offset:
+                        buffer.seek(0)
+                        buffer.truncate()
+                    elif response.status not in (200, 206):
+                        raise IOError(f"Impossible de télécharger le fichier de maillage. Statut: {response.status}")
+
+                    expected_total = self._expected_total(response, buffer.tell())
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        buffer.write(chunk)
+                    if expected_total is not None and buffer.tell() < expected_total:
+                        raise TransientHTTPError(f"Téléchargement tronqué ({buffer.tell()}/{expected_total} octets)")
+                return buffer.getvalue()
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError, TransientHTTPError):
+                if attempt == max_retries:
+                    raise
+                await self._retry_sleep(attempt)
+
+    @staticmethod
+    def _expected_total(response, offset: int):
+        """Taille totale attendue du fichier, d'après Content-Range (206) ou Content-Length (200)."""
+        content_range = response.headers.get("Content-Range")
+        if response.status == 206 and content_range and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+        length = response.headers.get("Content-Length")
+        return offset + int(length) if length and length.isdigit() else None
+
+    def _endpoint_url(self, endpoint_id: str) -> str:
+        return f"{self.base_url}/{endpoint_id}"
+
+    async def _refresh_health(self):
+        """Interroge /health des endpoints dont l'état date (une seule tâche à la fois s'en charge)."""
+        async with self.health_lock:
+            for endpoint_id in self.router.endpoint_ids:
+                if not self.router.needs_health_check(endpoint_id):
+                    continue
+                try:
+                    health = await self._request_json("GET", f"{self._endpoint_url(endpoint_id)}/health")
+                except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, TransientHTTPError):
+                    health = None
+                self.router.record_health(endpoint_id, health)
+
+    async def _start_job(self, payload: dict, engine_name: str, tried: set) -> dict:
+        """
+        Soumet la tâche à l'endpoint le mieux classé (le suivant s'il la refuse).
+        Les moteurs rapides passent par /runsync : le résultat revient souvent dans la réponse même.
+        Si la tâche dépasse l'attente synchrone, RunPod renvoie un statut en cours et on interroge /status.
+        Si l'issue de la soumission est incertaine (délai dépassé, connexion coupée, erreur 5xx),
+        l'erreur est levée : la tâche a pu être créée et la soumettre ailleurs la doublerait.
+        """
+        route = "runsync" if engine_name in self.http_config['runsync_engines'] else "run"
+        loop = asyncio.get_running_loop()
+        last_error = None
+        while (endpoint_id := self.router.choose(exclude=tried)) is not None:
+            tried.add(endpoint_id)
+            started = loop.time()
+            try:
+                status = await self._request_json("POST", f"{self._endpoint_url(endpoint_id)}/{route}", payload,
+                                                  timeout_s=self.http_config['job_timeout_s'] if route == "runsync" else None,
+                                                  idempotent=False)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, TransientHTTPError) as e:
+                self.router.record_failure(endpoint_id)
+                if not isinstance(e, (ConnectionError, aiohttp.ClientConnectorError)):
+                    raise
+                last_error = e
+                continue
+            self.router.record_submit(endpoint_id)
+            record_submission(payload)
+            return {'endpoint': endpoint_id, 'id': status['id'], 'started': started, 'status': status}
+        raise last_error or ConnectionError("Aucun endpoint RunPod disponible.")
+
+    async def _cancel_job(self, job: dict):
+        self.router.record_done(job['endpoint'])
+        try:
+            await self._request_json("POST", f"{self._endpoint_url(job['endpoint'])}/cancel/{job['id']}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, TransientHTTPError):
+            pass
+
+    async def _run_job(self, payload: dict, engine_name: str):
+        """
+        Soumet une tâche et interroge son statut (intervalles adaptatifs) jusqu'à sa fin.
+        Au-delà du délai de hedging, un doublon part sur un autre endpoint (via /run) :
+        le premier résultat gagne et l'autre tâche est annulée.
+        """
+        await self._refresh_health()
+        tried = set()
+        jobs = [await self._start_job(payload, engine_name, tried)]
+        hedge_delay = self.router.hedge_delay()
+        poller = AdaptivePoller.from_config(self.http_config)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.http_config['job_timeout_s']
+        last_failure = None
+        try:
+            while True:
+                for job in list(jobs):
+                    status = job.pop('status', None) or await self._request_json(
+                        "GET", f"{self._endpoint_url(job['endpoint'])}/status/{job['id']}")
+                    state = status.get("status")
+                    if state == "COMPLETED":
+                        jobs.remove(job)
+                        self.router.record_done(job['endpoint'])
+                        if status.get("output") is None:
+                            raise ValueError("La tâche est terminée mais n'a retourné aucune sortie ('output').")
+                        self.router.record_success(job['endpoint'], loop.time() - job['started'], status)
+                        record_completion(job['endpoint'], status)
+                        return status["output"]
+                    if state in ("FAILED", "CANCELLED", "TIMED_OUT"):
+                        jobs.remove(job)
+                        self.router.record_done(job['endpoint'])
+                        if state != "CANCELLED":
+                            # Un worker qui échoue à chaque tâche doit finir par être écarté.
+                            self.router.record_failure(job['endpoint'])
+                        last_failure = RuntimeError(f"La tâche RunPod a échoué avec le statut '{state}'. Détails: {status.get('output', status.get('error'))}")
+                if not jobs:
+                    raise last_failure
+                if loop.time() > deadline:
+                    raise TimeoutError("Le délai d'attente pour la tâche RunPod a été dépassé.")
+                if hedge_delay is not None and loop.time() - start > hedge_delay:
+                    hedge_delay = None
+                    try:
+                        jobs.append(await self._start_job(payload, None, tried))
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, TransientHTTPError):
+                        pass
+                await asyncio.sleep(poller.next_delay())
+        finally:
+            # Tâches encore en cours : perdantes du hedging ou abandonnées.
+            for job in jobs:
+                await self._cancel_job(job)
+
+    async def _cached_result(self, prepared: dict, engine_name: str, raw_output: bool):
+        """Résultat d'une requête identique déjà servie (cache disque), ou None."""
+        if self.result_cache is None:
+            return None
+        return await asyncio.to_thread(self.result_cache.get, self.uploader.cache_key(prepared, engine_name, raw_output))
+
+    async def _decode_result(self, prepared: dict, engine_name: str, output: dict, raw_output: bool):
+        """Récupère le résultat (en ligne ou téléchargé), le met en cache puis le décode."""
+        result_format, data, result_url = parse_result_output(output)
+        if data is None:
+            data = await self._download(result_url)
+        record_result_bytes(data, downloaded=result_url is not None)
+        if self.result_cache is not None:
+            cache_key = self.uploader.cache_key(prepared, engine_name, raw_output)
+            await asyncio.to_thread(self.result_cache.put, cache_key, result_format, data)
+        return await self._decode_data(prepared, result_format, data, raw_output)
+
+    async def _decode_data(self, prepared: dict, result_format: str, data: bytes, raw_output: bool):
+        # Le décodage est coûteux en CPU : hors de la boucle d'événements.
+        if raw_output:
+            raw_data, worker_mask = await asyncio.to_thread(decode_raw_data, data)
+            img_rgb, fg_mask = await asyncio.to_thread(self.uploader.worker_view, prepared, worker_mask)
+            return raw_data, img_rgb, fg_mask
+        return await asyncio.to_thread(load_result_mesh, data, result_format)
+
+    async def process_one(self, image_path: str, engine_name: str, options: dict, raw_output: bool = False):
+        """
+        Cycle de vie complet d'une tâche : soumission, attente, téléchargement, décodage.
+        Retourne le maillage, ou (données brutes, image RGB, masque) si raw_output (mode "hybrid").
+        """
+        prepared = await asyncio.to_thread(self.uploader.prepare, image_path, options)
+        if (cached := await self._cached_result(prepared, engine_name, raw_output)) is not None:
+            return await self._decode_data(prepared, *cached, raw_output)
+        payload = self.uploader.build_payload(prepared, engine_name, raw_output=raw_output)
+        output = await self._run_job(payload, engine_name)
+        if isinstance(output, dict) and output.get("missing_image"):
+            self.uploader.forget(prepared)
+            payload = self.uploader.build_payload(prepared, engine_name, force_data=True, raw_output=raw_output)
+            output = await self._run_job(payload, engine_name)
+        self.uploader.mark_uploaded(prepared)
+        return await self._decode_result(prepared, engine_name, output, raw_output)
+
+    def _payload_groups(self, entries: list):
+        """Découpe les éléments préparés en groupes dont la charge utile respecte la limite RunPod."""
+        limit = self.uploader.upload_config['max_payload_bytes']
+        group, size = [], 0
+        for entry in entries:
+            entry_size = entry[1]['payload_bytes']
+            if group and size + entry_size > limit:
+                yield group
+                group, size = [], 0
+            group.append(entry)
+            size += entry_size
+        if group:
+            yield group
+
+    async def process_batch_job(self, image_paths: list, engine_name: str, options: dict, raw_output: bool = False):
+        """
+        Traite plusieurs images en une seule tâche RunPod (une file d'attente, un démarrage,
+        des passes avant groupées). Retourne [(chemin, résultat, erreur)] ; les images inconnues
+        du worker sont renvoyées avec leurs données dans une seconde tâche.
+        """
+        outcomes = {}
+        pending = []
+        for path in image_paths:
+            try:
+                prepared = await asyncio.to_thread(self.uploader.prepare, path, options)
+                if (cached := await self._cached_result(prepared, engine_name, raw_output)) is not None:
+                    outcomes[path] = (await self._decode_data(prepared, *cached, raw_output), None)
+                else:
+                    pending.append((path, prepared))
+            except Exception as e:
+                outcomes[path] = (None, e)
+
+        for force_data in (False, True):
+            retry = []
+            for group in self._payload_groups(pending):
+                payload = self.uploader.build_batch_payload([prepared for _, prepared in group], engine_name,
+                                                            force_data=force_data, raw_output=raw_output)
+                try:
+                    output = await self._run_job(payload, engine_name)
+                    results = {item.get('id'): item for item in output['results']}
+                except Exception as e:
+                    outcomes.update((path, (None, e)) for path, _ in group)
+                    continue
+                for index, (path, prepared) in enumerate(group):
+                    item = results.get(index, {"error": "Aucun résultat renvoyé pour cet élément."})
+                    if item.get("missing_image") and not force_data:
+                        self.uploader.forget(prepared)
+                        retry.append((path, prepared))
+                    elif item.get("error") or item.get("missing_image"):
+                        outcomes[path] = (None, RuntimeError(item.get("error") or "Image absente du worker."))
+                    else:
+                        self.uploader.mark_uploaded(prepared)
+                        try:
+                            outcomes[path] = (await self._decode_result(prepared, engine_name, item, raw_output), None)
+                        except Exception as e:
+                            outcomes[path] = (None, e)
+            pending = retry
+            if not pending:
+                break
+        return [(path, *outcomes[path]) for path in image_paths]
+
+    async def process_many(self, image_paths, engine_name: str, options: dict, raw_output: bool = False):
+        """
+        Générateur asynchrone : soumet toutes les images par tâches de 'batch_job_size' images
+        (au plus 'max_in_flight' tâches simultanées) et produit (chemin, résultat, erreur)
+        dès que la tâche contenant l'image se termine.
+        """
+        semaphore = asyncio.Semaphore(self.http_config['max_in_flight'])
+        batch_size = max(1, self.http_config['batch_job_size'])
+        image_paths = list(image_paths)
+
+        async def run(chunk):
+            async with semaphore:
+                try:
+                    if len(chunk) == 1:
+                        return [(chunk[0], await self.process_one(chunk[0], engine_name, options, raw_output), None)]
+                    return await self.process_batch_job(chunk, engine_name, options, raw_output)
+                except Exception as e:
+                    return [(path, None, e) for path in chunk]
+
+        tasks = [asyncio.create_task(run(image_paths[i:i + batch_size])) for i in range(0, len(image_paths), batch_size)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for entry in await next_done:
+                    yield entry
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,182 @@
+import io
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+import numpy as np
+from PIL import Image
+
+from src import config as app_config
+from .raw_codec import reduce_precision
+
+# Champs des données brutes effectivement lus par GeometryBuilder ; les autres tableaux
+# des moteurs (profondeur MoGe, intrinsèques...) ne sont pas conservés en cache. Les
+# métadonnées scalaires (ensemble_members de DepthFM...) sont gardées telles quelles.
+GEOMETRY_FIELDS = ('depth_map', 'points', 'normal', 'mask', 'vertex_colors')
+
+class CompactRawData(Mapping):
+    """
+    Données brutes d'un moteur stockées de façon compacte, décodées à chaque accès :
+    - masques booléens : bits empaquetés (1 bit par pixel) ;
+    - carte de profondeur : uint16 avec échelle et décalage (quantification sur sa plage) ;
+    - points, normales et autres flottants : float16 si leurs valeurs le permettent ;
+    - métadonnées scalaires : conservées telles quelles (taille négligeable).
+    S'utilise comme le dict d'origine (raw_data['points'], 'mask' in raw_data, .get...).
+    Chaque accès décode : GeometryBuilder.build en fait un dict au départ (dict(raw_data)),
+    si bien qu'un champ n'est décodé qu'une fois par construction.
+    """
+    def __init__(self, raw_data: Mapping, float_dtype: str = 'float16'):
+        float_dtype = np.dtype(float_dtype)
+        self._fields = {key: self._encode(key, np.asarray(raw_data[key]), float_dtype)
+                        for key in GEOMETRY_FIELDS if key in raw_data}
+        self._scalars = {key: value for key, value in raw_data.items()
+                         if key not in self._fields and np.ndim(value) == 0}
+
+    @classmethod
+    def from_raw(cls, raw_data: Mapping, float_dtype: str = 'float16'):
+        return raw_data if isinstance(raw_data, cls) else cls(raw_data, float_dtype)
+
+    @staticmethod
+    def _encode(key: str, value: np.ndarray, float_dtype: np.dtype):
+        if value.dtype == np.bool_:
+            return ('bits', np.packbits(value.ravel()), value.shape)
+        if key == 'depth_map' and value.dtype.kind == 'f' and value.size and np.isfinite(value).all():
+            offset, span = float(value.min()), float(value.max() - value.min())
+            scale = span / 65535 if span > 0 else 1.0
+            quantized = np.round((value - offset) / scale).astype(np.uint16)
+            return ('uint16', quantized, (offset, scale))
+        return ('array', reduce_precision(value, float_dtype), value.dtype)
+
+    def __getitem__(self, key):
+        if key in self._scalars:
+            return self._scalars[key]
+        kind, payload, meta = self._fields[key]
+        if kind == 'bits':
+            return np.unpackbits(payload, count=int(np.prod(meta))).reshape(meta).astype(bool)
+        if kind == 'uint16':
+            offset, scale = meta
+            return payload.astype(np.float32) * np.float32(scale) + np.float32(offset)
+        return payload.astype(np.float32) if payload.dtype != meta and meta.kind == 'f' else payload
+
+    def __iter__(self):
+        yield from self._fields
+        yield from self._scalars
+
+    def __len__(self):
+        return len(self._fields) + len(self._scalars)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(payload.nbytes for _, payload, _ in self._fields.values())
+
+class CompactImage:
+    """
+    Image RGB ou masque uint8 du cache, compressé en mémoire : masque en PNG (sans perte),
+    image dans 'image_format' (JPEG par défaut : 10 à 20 fois plus petit que les pixels bruts).
+    np.asarray(compact_image) restitue le tableau uint8.
+    """
+    def __init__(self, array: np.ndarray, image_format: str = 'JPEG', quality: int = 95):
+        self.shape = array.shape
+        image_format = 'PNG' if array.ndim == 2 else image_format.upper()
+        buffer = io.BytesIO()
+        if image_format == 'PNG':
+            Image.fromarray(array).save(buffer, format='PNG', compress_level=1)
+        else:
+            Image.fromarray(array).save(buffer, format=image_format, quality=quality)
+        self._data = buffer.getvalue()
+
+    @classmethod
+    def from_array(cls, array, image_format: str = 'JPEG', quality: int = 95):
+        """Compresse les tableaux uint8 (H, W) ou (H, W, 3) ; tout le reste est renvoyé tel quel."""
+        if not isinstance(array, np.ndarray) or array.dtype != np.uint8 or not array.size:
+            return array
+        if array.ndim == 2 or (array.ndim == 3 and array.shape[2] == 3):
+            return cls(array, image_format, quality)
+        return array
+
+    def __array__(self, dtype=None, copy=None):
+        array = np.asarray(Image.open(io.BytesIO(self._data)))
+        return array.astype(dtype) if dtype is not None else array
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data)
+
+def entry_nbytes(entry) -> int:
+    """Taille en mémoire d'une entrée du cache : données brutes seules ou tuple (données, image, masque)."""
+    parts = entry if isinstance(entry, tuple) else (entry,)
+    total = 0
+    for part in parts:
+        if isinstance(part, Mapping):
+            total += getattr(part, 'nbytes', None) or sum(np.asarray(v).nbytes for v in part.values())
+        elif part is not None:
+            total += getattr(part, 'nbytes', 0)
+    return total
+
+class RawDataCache(MutableMapping):
+    """
+    Cache mémoire des données brutes (clé -> données ou (données, image RGB, masque)),
+    compactées à l'insertion et bornées en octets : les moins récemment utilisées sont évincées.
+    Les accès sont protégés par un verrou : le cache est rempli depuis les threads de traitement
+    pendant que l'interface en prend des copies (export).
+    """
+    def __init__(self, max_bytes: int = None, compact: bool = True, float_dtype: str = 'float16',
+                 image_format: str = 'JPEG', image_quality: int = 95):
+        self.max_bytes = max_bytes
+        self.compact = compact
+        self.float_dtype = float_dtype
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self._entries = OrderedDict()  # clé -> (entrée, taille)
+        self.total_bytes = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls):
+        cfg = app_config.RAW_DATA_CACHE
+        return cls(cfg['max_bytes'], cfg['compact'], cfg['float_dtype'], cfg['image_format'], cfg['image_quality'])
+
+    def compact_entry(self, entry):
+        """Entrée sous la forme exacte où le cache la conserve (sans l'insérer)."""
+        if not self.compact:
+            return entry
+        if isinstance(entry, tuple):
+            # Image RGB et masque RMBG : sans eux, une entrée pèserait surtout par ses pixels bruts.
+            images = (CompactImage.from_array(part, self.image_format, self.image_quality) for part in entry[1:])
+            return (CompactRawData.from_raw(entry[0], self.float_dtype), *images)
+        return CompactRawData.from_raw(entry, self.float_dtype)
+
+    def __setitem__(self, key, entry):
+        entry = self.compact_entry(entry)
+        size = entry_nbytes(entry)
+        with self._lock:
+            if key in self._entries:
+                del self[key]
+            self._entries[key] = (entry, size)
+            self.total_bytes += size
+            while self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key = next(iter(self._entries))
+                print("Cache des données brutes plein : éviction de l'entrée la moins récemment utilisée.")
+                del self[evicted_key]
+
+    def __getitem__(self, key):
+        with self._lock:
+            entry, _ = self._entries[key]
+            self._entries.move_to_end(key)
+            return entry
+
+    def __delitem__(self, key):
+        with self._lock:
+            _, size = self._entries.pop(key)
+            self.total_bytes -= size
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def snapshot(self) -> dict:
+        """Copie (clé -> entrée) sans modifier l'ordre d'éviction, pour un export depuis un autre thread."""
+        with self._lock:
+            return {key: entry for key, (entry, _) in self._entries.items()}
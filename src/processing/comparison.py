@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+import numpy as np
+
+from src import config as app_config
+from src.profiling import PeakMemoryMonitor
+
+class ComparisonRunner:
+    """
+    Mode comparaison : décode et pré-traite l'image une seule fois, puis envoie
+    la même entrée à plusieurs moteurs (en parallèle si la mémoire du
+    périphérique le permet) et mesure latence et mémoire de pointe de chacun.
+    """
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def _max_parallel(self, engine_count: int) -> int:
+        cfg = app_config.COMPARISON_CONFIG
+        limit = max(1, min(engine_count, cfg['max_parallel_engines']))
+        if str(app_config.DEVICE).startswith('cuda'):
+            import torch
+            free_bytes, _ = torch.cuda.mem_get_info()
+            fitting = int(free_bytes // (cfg['device_memory_per_engine_gb'] * 1024 ** 3))
+            limit = max(1, min(limit, fitting))
+        return limit
+
+    def _run_engine(self, engine_name, img, img_rgb, fg_mask, options, parallel):
+        result = {'mesh': None, 'error': None, 'parallel': parallel}
+        try:
+            with PeakMemoryMonitor() as monitor:
+                start = time.perf_counter()
+                raw_data = self.pipeline.infer(engine_name, img, options)
+                result['inference_s'] = time.perf_counter() - start
+                start = time.perf_counter()
+                result['mesh'] = self.pipeline.build(raw_data, img_rgb, fg_mask, options)
+                result['geometry_s'] = time.perf_counter() - start
+            result.update(monitor.result())
+        except Exception as e:
+            print(f"ERREUR: Le moteur '{engine_name}' a échoué pendant la comparaison : {e}")
+            result['error'] = str(e)
+        return result
+
+    def run(self, path: str, options_by_engine: dict) -> dict:
+        """
+        Retourne {nom_moteur: résultat}, chaque résultat contenant 'mesh', 'latency_s',
+        'inference_s', 'geometry_s', 'peak_rss_mb', 'peak_device_mb', 'parallel' et 'error'.
+        Les pics mémoire sont échantillonnés sur tout le processus : en parallèle, ceux d'un moteur
+        incluent les allocations des autres et ne sont qu'indicatifs.
+        Le pré-traitement utilise les options du premier moteur (elles sont communes).
+        """
+        engine_names = list(options_by_engine)
+        shared_options = options_by_engine[engine_names[0]]
+
+        start = time.perf_counter()
+        img, fg_mask = self.pipeline.preprocess(self.pipeline.load_image(path, shared_options), shared_options)
+        img_rgb = np.array(img)
+        print(f"Pré-traitement partagé effectué en {time.perf_counter() - start:.2f}s.")
+
+        workers = self._max_parallel(len(engine_names))
+        parallel = workers > 1
+        print(f"Comparaison de {len(engine_names)} moteurs ({workers} en parallèle).")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                name: pool.submit(self._run_engine, name, img, img_rgb, fg_mask, options_by_engine[name], parallel)
+                for name in engine_names
+            }
+            results = {name: future.result() for name, future in futures.items()}
+
+        for name, result in results.items():
+            if result['error']:
+                print(f"  - {name}: ÉCHEC ({result['error']})")
+            else:
+                print(f"  - {name}: {result['latency_s']:.2f}s, pic RSS {result['peak_rss_mb']:.0f} Mo, "
+                      f"pic GPU ≈{result['peak_device_mb']:.0f} Mo" + (" (processus, moteurs en parallèle)" if parallel else ""))
+        return results
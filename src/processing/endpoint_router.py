@@ -0,0 +1,117 @@
+import time
+from collections import deque
+import numpy as np
+
+from src import config as app_config
+
+class EndpointStats:
+    """Latences observées et état de santé d'un endpoint RunPod."""
+    def __init__(self, endpoint_id: str, window: int):
+        self.endpoint_id = endpoint_id
+        self.queue_ewma_s = None        # Attente en file (delayTime RunPod), moyenne mobile exponentielle
+        self.execution_ewma_s = None    # Durée d'exécution sur le worker
+        self.latencies = deque(maxlen=window)  # Durées totales (soumission -> résultat)
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.in_queue = 0               # Dernier état de /health
+        self.ready_workers = None
+        self.health_checked_at = 0.0
+
+class EndpointRouter:
+    """
+    Choisit l'endpoint d'une tâche parmi plusieurs, d'après la latence de file observée,
+    les tâches en cours et l'état de santé (/health). Indique aussi quand doubler
+    ('hedging') une tâche lente sur un second endpoint. Ne fait aucune requête lui-même :
+    les clients lui transmettent leurs observations.
+    """
+    def __init__(self, endpoint_ids: list, routing_config: dict = None):
+        if not endpoint_ids:
+            raise ValueError("Au moins un endpoint RunPod est requis.")
+        self.config = {**app_config.REMOTE_ROUTING_CONFIG, **(routing_config or {})}
+        self.stats = {eid: EndpointStats(eid, self.config['latency_window']) for eid in endpoint_ids}
+        self.endpoint_ids = list(endpoint_ids)
+
+    def _ewma(self, previous, value):
+        alpha = self.config['ewma_alpha']
+        return value if previous is None else alpha * value + (1 - alpha) * previous
+
+    def is_healthy(self, endpoint_id: str) -> bool:
+        return time.monotonic() >= self.stats[endpoint_id].unhealthy_until
+
+    def score(self, endpoint_id: str) -> float:
+        """Délai estimé avant le résultat (secondes) ; plus petit = meilleur."""
+        s = self.stats[endpoint_id]
+        # /health sans worker prêt : démarrage à froid à prévoir, même sur un endpoint jamais observé.
+        cold_start_s = self.config['cold_start_penalty_s'] if s.ready_workers == 0 else 0.0
+        if s.queue_ewma_s is None:
+            return cold_start_s  # Endpoint jamais observé : on l'essaie pour apprendre sa latence
+        execution_s = s.execution_ewma_s or 0.0
+        # Les tâches déjà en file (vues par /health ou par nous) passent avant la nôtre.
+        waiting = max(s.in_queue, s.in_flight)
+        return s.queue_ewma_s + execution_s + waiting * execution_s / max(1, s.ready_workers or 1) + cold_start_s
+
+    def choose(self, exclude=()) -> str:
+        """Endpoint au meilleur score parmi les endpoints sains (à défaut, parmi tous)."""
+        candidates = [eid for eid in self.endpoint_ids if eid not in exclude]
+        if not candidates:
+            return None
+        healthy = [eid for eid in candidates if self.is_healthy(eid)] or candidates
+        return min(healthy, key=self.score)
+
+    def needs_health_check(self, endpoint_id: str) -> bool:
+        if len(self.endpoint_ids) < 2:
+            return False
+        return time.monotonic() - self.stats[endpoint_id].health_checked_at > self.config['health_check_interval_s']
+
+    def record_health(self, endpoint_id: str, health: dict):
+        """health : réponse de /health, ou None si l'endpoint n'a pas répondu."""
+        s = self.stats[endpoint_id]
+        s.health_checked_at = time.monotonic()
+        if health is None:
+            self.record_failure(endpoint_id)
+            return
+        jobs, workers = health.get('jobs', {}), health.get('workers', {})
+        s.in_queue = jobs.get('inQueue', 0)
+        s.ready_workers = workers.get('idle', 0) + workers.get('running', 0)
+
+    def record_submit(self, endpoint_id: str):
+        self.stats[endpoint_id].in_flight += 1
+
+    def record_done(self, endpoint_id: str):
+        s = self.stats[endpoint_id]
+        s.in_flight = max(0, s.in_flight - 1)
+
+    def record_success(self, endpoint_id: str, latency_s: float, status_data: dict):
+        """Tâche terminée : met à jour les latences (delayTime/executionTime de RunPod, en ms)."""
+        s = self.stats[endpoint_id]
+        s.latencies.append(latency_s)
+        queue_s = status_data.get('delayTime', latency_s * 1000) / 1000
+        s.queue_ewma_s = self._ewma(s.queue_ewma_s, queue_s)
+        if 'executionTime' in status_data:
+            s.execution_ewma_s = self._ewma(s.execution_ewma_s, status_data['executionTime'] / 1000)
+        s.consecutive_failures = 0
+        s.unhealthy_until = 0.0
+
+    def record_failure(self, endpoint_id: str):
+        """
+        Soumission refusée, endpoint injoignable ou tâche en échec (FAILED, TIMED_OUT) :
+        mis à l'écart après plusieurs échecs de suite.
+        """
+        s = self.stats[endpoint_id]
+        s.consecutive_failures += 1
+        if s.consecutive_failures >= self.config['max_consecutive_failures']:
+            s.unhealthy_until = time.monotonic() + self.config['unhealthy_cooldown_s']
+            print(f"AVERTISSEMENT: Endpoint '{endpoint_id}' écarté pendant {self.config['unhealthy_cooldown_s']}s.")
+
+    def hedge_delay(self):
+        """
+        Délai après lequel une tâche est doublée sur un autre endpoint : percentile configuré
+        des latences observées (tous endpoints). None si le hedging est désactivé ou impossible.
+        """
+        if not self.config['hedge_enabled'] or len(self.endpoint_ids) < 2:
+            return None
+        latencies = [lat for s in self.stats.values() for lat in s.latencies]
+        if len(latencies) < self.config['hedge_min_samples']:
+            return None
+        return max(self.config['hedge_min_delay_s'], float(np.percentile(latencies, self.config['hedge_percentile'])))
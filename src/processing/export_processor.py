@@ -0,0 +1,36 @@
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from .exporter import BatchExporter, export_name
+
+class ExportProcessor(QObject):
+    """
+    Exporte en arrière-plan les résultats en cache (maillages et données brutes),
+    sur son propre thread pour ne bloquer ni l'interface ni les traitements.
+    """
+    finished = pyqtSignal(object)  # résumé de BatchExporter.export_many
+    status_message = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    @pyqtSlot(str, object, object)
+    def export_cached(self, output_dir: str, mesh_entries: dict, raw_entries: dict):
+        """
+        mesh_entries / raw_entries : copies des caches (clé -> maillage / entrée brute),
+        prises sur le thread de l'interface.
+        """
+        try:
+            exporter = BatchExporter.from_config(output_dir)
+            meshes = {export_name(key): mesh for key, mesh in mesh_entries.items() if mesh is not None}
+            raw = {export_name(key): entry for key, entry in raw_entries.items()}
+            print(f"\n--- Export de {len(meshes)} maillage(s) et {len(raw) if exporter.include_raw else 0} "
+                  f"jeu(x) de données brutes vers {output_dir} ---")
+
+            def progress(done, total):
+                if done == total or done % 20 == 0:
+                    self.status_message.emit(f"Export : {done}/{total} fichiers écrits")
+
+            self.finished.emit(exporter.export_many(meshes, raw, progress))
+        except Exception as e:
+            import traceback
+            error_message = f"Erreur lors de l'export: {traceback.format_exc()}"
+            print(error_message)
+            self.error.emit(error_message)
@@ -0,0 +1,248 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+
+from src import config as app_config
+from src.profiling import trace_span
+
+# Écriture directe des formats d'export depuis les tampons contigus du maillage, par blocs
+# de sommets (un seul tampon de bloc réutilisé) : un gros nuage de points n'est jamais
+# recopié en entier, et l'écriture disque (qui libère le GIL) peut tourner en parallèle.
+EXPORT_FORMATS = ('glb', 'ply', 'npz')
+DEFAULT_CHUNK = 1_000_000
+
+# glTF : types de composants et cibles des bufferViews
+_GL_FLOAT, _GL_UNSIGNED_BYTE, _GL_UNSIGNED_INT = 5126, 5121, 5125
+_GL_ARRAY_BUFFER, _GL_ELEMENT_ARRAY_BUFFER = 34962, 34963
+_GL_POINTS, _GL_TRIANGLES = 0, 4
+
+@contextlib.contextmanager
+def _open_target(target):
+    """Chemin ou objet fichier déjà ouvert en écriture binaire."""
+    if hasattr(target, 'write'):
+        yield target
+    else:
+        with open(target, 'wb') as f:
+            yield f
+
+def _mesh_buffers(mesh):
+    """(sommets, faces ou None, couleurs RGBA uint8 par sommet ou None), sans copie quand c'est possible."""
+    vertices = np.asarray(mesh.vertices)
+    faces = np.asarray(mesh.faces) if len(mesh.faces) else None
+    colors = np.asarray(mesh.visual.vertex_colors, dtype=np.uint8) if mesh.visual.kind == 'vertex' else None
+    return vertices, faces, colors
+
+def _write_blocks(f, array: np.ndarray, dtype, chunk: int):
+    """Écrit 'array' converti en 'dtype', bloc par bloc (seul un bloc converti existe à la fois)."""
+    dtype = np.dtype(dtype)
+    if array.dtype == dtype and array.flags.c_contiguous:
+        f.write(array.view(np.uint8).reshape(-1) if array.size else b'')
+        return
+    block = np.empty((min(chunk, len(array)),) + array.shape[1:], dtype=dtype)
+    for start in range(0, len(array), chunk):
+        part = block[:min(chunk, len(array) - start)]
+        part[...] = array[start:start + len(part)]
+        f.write(part.view(np.uint8).reshape(-1))
+
+def write_ply(mesh, target, chunk: int = DEFAULT_CHUNK):
+    """PLY binaire little-endian : sommets float32, couleurs RGBA uint8, faces (uchar, int32 x 3)."""
+    vertices, faces, colors = _mesh_buffers(mesh)
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {len(vertices)}",
+              "property float x", "property float y", "property float z"]
+    vertex_dtype = [('xyz', '<f4', (3,))]
+    if colors is not None:
+        header += ["property uchar red", "property uchar green", "property uchar blue", "property uchar alpha"]
+        vertex_dtype.append(('rgba', 'u1', (4,)))
+    if faces is not None:
+        header += [f"element face {len(faces)}", "property list uchar int vertex_indices"]
+    header.append("end_header")
+
+    with _open_target(target) as f:
+        f.write(("\n".join(header) + "\n").encode('ascii'))
+        # Enregistrements entrelacés (x, y, z, r, g, b, a) assemblés dans un seul tampon de bloc.
+        record = np.empty(min(chunk, len(vertices)), dtype=vertex_dtype)
+        for start in range(0, len(vertices), chunk):
+            block = record[:min(chunk, len(vertices) - start)]
+            block['xyz'] = vertices[start:start + len(block)]
+            if colors is not None:
+                block['rgba'] = colors[start:start + len(block)]
+            f.write(block.view(np.uint8))
+        if faces is not None:
+            face_record = np.empty(min(chunk, len(faces)), dtype=[('count', 'u1'), ('indices', '<i4', (3,))])
+            face_record['count'] = 3
+            for start in range(0, len(faces), chunk):
+                block = face_record[:min(chunk, len(faces) - start)]
+                block['indices'] = faces[start:start + len(block)]
+                f.write(block.view(np.uint8))
+
+def write_glb(mesh, target, chunk: int = DEFAULT_CHUNK):
+    """
+    GLB (glTF 2.0 binaire) : POSITION float32, COLOR_0 RGBA uint8 normalisé, indices uint32.
+    Sans faces, la primitive est un nuage de points (mode POINTS). L'en-tête JSON est calculé
+    d'après les tailles, puis les tampons sont écrits bloc par bloc dans le chunk BIN.
+    """
+    vertices, faces, colors = _mesh_buffers(mesh)
+    if not len(vertices):
+        raise ValueError("Impossible d'exporter un maillage vide en GLB.")
+    # (tableau, dtype écrit, type glTF, componentType, cible, attribut)
+    sections = [(vertices, '<f4', 'VEC3', _GL_FLOAT, _GL_ARRAY_BUFFER, 'POSITION')]
+    if colors is not None:
+        sections.append((colors, 'u1', 'VEC4', _GL_UNSIGNED_BYTE, _GL_ARRAY_BUFFER, 'COLOR_0'))
+    if faces is not None:
+        sections.append((faces, '<u4', 'SCALAR', _GL_UNSIGNED_INT, _GL_ELEMENT_ARRAY_BUFFER, None))
+
+    buffer_views, accessors, attributes, offset = [], [], {}, 0
+    primitive = {'attributes': attributes, 'mode': _GL_TRIANGLES if faces is not None else _GL_POINTS}
+    for index, (array, dtype, gl_type, component, view_target, attribute) in enumerate(sections):
+        nbytes = array.size * np.dtype(dtype).itemsize  # Multiple de 4 pour chacun de ces types
+        buffer_views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': nbytes, 'target': view_target})
+        accessor = {'bufferView': index, 'componentType': component, 'type': gl_type,
+                    'count': array.size if gl_type == 'SCALAR' else len(array)}
+        if attribute == 'POSITION':
+            accessor['min'] = vertices.min(axis=0).astype(np.float32).tolist()
+            accessor['max'] = vertices.max(axis=0).astype(np.float32).tolist()
+        elif attribute == 'COLOR_0':
+            accessor['normalized'] = True
+        accessors.append(accessor)
+        if attribute:
+            attributes[attribute] = index
+        else:
+            primitive['indices'] = index
+        offset += nbytes
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'La Forge Visuelle'},
+        'scene': 0, 'scenes': [{'nodes': [0]}], 'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [primitive]}],
+        'buffers': [{'byteLength': offset}], 'bufferViews': buffer_views, 'accessors': accessors,
+    }
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    total = 12 + 8 + len(json_chunk) + 8 + offset
+
+    with _open_target(target) as f:
+        f.write(struct.pack('<4sII', b'glTF', 2, total))
+        f.write(struct.pack('<I4s', len(json_chunk), b'JSON'))
+        f.write(json_chunk)
+        f.write(struct.pack('<I4s', offset, b'BIN\x00'))
+        for array, dtype, *_ in sections:
+            _write_blocks(f, array, dtype, chunk)
+
+def write_npz(arrays: dict, target):
+    """Archive NumPy non compressée : chaque tableau est écrit tel quel, sans copie intermédiaire."""
+    with _open_target(target) as f:
+        np.savez(f, **{k: v for k, v in arrays.items() if v is not None})
+
+def write_mesh_npz(mesh, target, chunk: int = DEFAULT_CHUNK):
+    vertices, faces, colors = _mesh_buffers(mesh)
+    write_npz({'vertices': vertices, 'faces': faces, 'vertex_colors': colors}, target)
+
+def raw_bundle_arrays(entry) -> dict:
+    """Tableaux d'une entrée du cache des données brutes : données seules ou (données, image RGB, masque)."""
+    raw_data, img_rgb, fg_mask = entry if isinstance(entry, tuple) else (entry, None, None)
+    arrays = {key: np.asarray(value) for key, value in raw_data.items()}
+    arrays.update(image=None if img_rgb is None else np.asarray(img_rgb),
+                  fg_mask=None if fg_mask is None else np.asarray(fg_mask))
+    return arrays
+
+WRITERS = {'glb': write_glb, 'ply': write_ply, 'npz': write_mesh_npz}
+
+def export_mesh(mesh, target, file_format: str, chunk: int = DEFAULT_CHUNK):
+    if file_format not in WRITERS:
+        raise ValueError(f"Format d'export inconnu : '{file_format}' (formats : {', '.join(EXPORT_FORMATS)})")
+    WRITERS[file_format](mesh, target, chunk)
+
+def export_bytes(mesh, file_format: str) -> bytes:
+    """Export en mémoire (résultat renvoyé en ligne par le worker)."""
+    buffer = io.BytesIO()
+    export_mesh(mesh, buffer, file_format)
+    return buffer.getvalue()
+
+def export_name(cache_key) -> str:
+    """
+    Nom de fichier stable pour une clé de cache (chemin, moteur, options). L'empreinte couvre
+    la clé entière (chemin absolu compris) : 'photo.jpg' et 'photo.png', ou deux fichiers
+    homonymes de dossiers différents, ne se disputent jamais le même fichier de sortie.
+    """
+    path, engine_name, options_tuple = cache_key
+    stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    full_key = (os.path.abspath(path), engine_name, options_tuple)
+    digest = hashlib.sha256(repr(full_key).encode('utf-8')).hexdigest()[:12]
+    return f"{stem}_{engine_name}_{digest}"
+
+class BatchExporter:
+    """
+    Exporte de nombreux résultats en parallèle : une tâche par fichier dans un pool de threads.
+    Chaque fichier est écrit sous un nom temporaire puis renommé, si bien qu'un export
+    interrompu ne laisse jamais de fichier tronqué sous son nom final.
+    """
+    def __init__(self, output_dir: str, formats=('glb',), include_raw: bool = False,
+                 max_workers: int = None, chunk: int = DEFAULT_CHUNK):
+        unknown = set(formats) - set(EXPORT_FORMATS)
+        if unknown:
+            raise ValueError(f"Format(s) d'export inconnu(s) : {', '.join(sorted(unknown))}")
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.include_raw = include_raw
+        self.max_workers = max_workers
+        self.chunk = chunk
+
+    @classmethod
+    def from_config(cls, output_dir: str = None):
+        cfg = app_config.EXPORT_CONFIG
+        return cls(output_dir or cfg['output_dir'], cfg['formats'], cfg['include_raw'],
+                   cfg['max_workers'], cfg['chunk_vertices'])
+
+    def _write(self, path: str, write):
+        partial_path = f"{path}.part"
+        with trace_span("export", path=os.path.basename(path)):
+            try:
+                with open(partial_path, 'wb') as f:
+                    write(f)
+                os.replace(partial_path, path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(partial_path)
+                raise
+        return os.path.getsize(path)
+
+    def _tasks(self, meshes: dict, raw_entries: dict):
+        for name, mesh in meshes.items():
+            for file_format in self.formats:
+                path = os.path.join(self.output_dir, f"{name}.{file_format}")
+                yield path, lambda f, mesh=mesh, fmt=file_format: export_mesh(mesh, f, fmt, self.chunk)
+        if self.include_raw:
+            for name, entry in (raw_entries or {}).items():
+                path = os.path.join(self.output_dir, f"{name}.raw.npz")
+                yield path, lambda f, entry=entry: write_npz(raw_bundle_arrays(entry), f)
+
+    def export_many(self, meshes: dict, raw_entries: dict = None, progress=None) -> dict:
+        """
+        meshes : {nom: trimesh} ; raw_entries : {nom: entrée du cache des données brutes}.
+        progress(terminés, total) est appelé depuis le thread appelant après chaque fichier.
+        Retourne un résumé : fichiers écrits, octets, échecs [(chemin, erreur)], durée.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        tasks = list(self._tasks(meshes, raw_entries))
+        summary = {'files': [], 'bytes': 0, 'failed': [], 'elapsed_s': 0.0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._write, path, write): path for path, write in tasks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                try:
+                    summary['bytes'] += future.result()
+                    summary['files'].append(path)
+                except Exception as e:
+                    summary['failed'].append((path, f"{type(e).__name__}: {e}"))
+                    print(f"ERREUR: Échec de l'export de {path}: {e}")
+                if progress:
+                    progress(done, len(tasks))
+        summary['elapsed_s'] = time.perf_counter() - start
+        return summary
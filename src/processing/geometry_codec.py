@@ -0,0 +1,80 @@
+import lzma
+import struct
+import zlib
+import numpy as np
+import trimesh
+
+# Format binaire compact "LFVG" pour transférer un maillage ou un nuage de points :
+#   en-tête (64 octets) | positions int16 (n x 3) | couleurs uint8 (n x c) | faces compressées
+# Les positions sont quantifiées sur la boîte englobante (précision : étendue / 65535 par axe).
+# Les indices de faces sont encodés en différences successives, petites donc très compressibles.
+MAGIC = b'LFVG'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBxII3d3d')
+FLAG_LZMA = 0x01
+QUANT_LEVELS = 65535
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == 'lzma':
+        return lzma.compress(data, preset=6)
+    return zlib.compress(data, 6)
+
+def encode_mesh(mesh: trimesh.Trimesh, compression: str = 'zlib') -> bytes:
+    """Encode un maillage (sommets, couleurs par sommet, faces) au format LFVG."""
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    n_vertices = len(vertices)
+    if n_vertices:
+        origin = vertices.min(axis=0)
+        step = (vertices.max(axis=0) - origin) / QUANT_LEVELS
+    else:
+        origin, step = np.zeros(3), np.zeros(3)
+    step[step == 0] = 1.0
+    quantized = (np.rint((vertices - origin) / step) - 32768).astype('<i2')
+
+    colors = b''
+    channels = 0
+    if mesh.visual.kind == 'vertex':
+        rgba = np.asarray(mesh.visual.vertex_colors, dtype=np.uint8)
+        # Le canal alpha n'est transmis que s'il porte une information.
+        channels = 4 if (rgba[:, 3] != 255).any() else 3
+        colors = np.ascontiguousarray(rgba[:, :channels]).tobytes()
+
+    faces = np.asarray(mesh.faces, dtype=np.int64).ravel()
+    n_faces = len(faces) // 3
+    face_data = b''
+    if n_faces:
+        deltas = np.diff(faces, prepend=0).astype('<i4')
+        face_data = _compress(deltas.tobytes(), compression)
+
+    flags = FLAG_LZMA if compression == 'lzma' else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, channels, n_vertices, n_faces, *origin, *step)
+    return b''.join((header, quantized.tobytes(), colors, face_data))
+
+def decode_mesh(data) -> trimesh.Trimesh:
+    """
+    Décode un tampon LFVG. Positions et couleurs sont lues directement dans le tampon
+    (np.frombuffer, sans copie) ; seule la déquantification alloue le tableau final.
+    """
+    buffer = memoryview(data)
+    magic, version, flags, channels, n_vertices, n_faces, *bounds = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Données de géométrie non reconnues (en-tête LFVG invalide).")
+    origin, step = np.array(bounds[:3]), np.array(bounds[3:])
+
+    offset = HEADER.size
+    quantized = np.frombuffer(buffer, dtype='<i2', count=n_vertices * 3, offset=offset).reshape(-1, 3)
+    offset += quantized.nbytes
+    vertices = (quantized + 32768.0) * step + origin
+
+    colors = None
+    if channels:
+        colors = np.frombuffer(buffer, dtype=np.uint8, count=n_vertices * channels, offset=offset).reshape(-1, channels)
+        offset += colors.nbytes
+
+    faces = None
+    if n_faces:
+        compressed = buffer[offset:]
+        raw = lzma.decompress(compressed) if flags & FLAG_LZMA else zlib.decompress(compressed)
+        faces = np.cumsum(np.frombuffer(raw, dtype='<i4'), dtype=np.int64).reshape(-1, 3)
+
+    return trimesh.Trimesh(vertices=vertices, faces=faces, vertex_colors=colors, process=False)
@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import io
+import math
+import os
+import numpy as np
+from PIL import Image
+
+def resize_and_pad(img: Image.Image, target_size: int, divisor: int = 64) -> Image.Image:
+    """Redimensionne et ajoute un rembourrage pour que les dimensions soient divisibles."""
+    img.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
+    new_width = int(math.ceil(img.width / divisor)) * divisor
+    new_height = int(math.ceil(img.height / divisor)) * divisor
+
+    padded_image = Image.new("RGB", (new_width, new_height), (0, 0, 0))
+    paste_x = (new_width - img.width) // 2
+    paste_y = (new_height - img.height) // 2
+    padded_image.paste(img, (paste_x, paste_y))
+
+    print(f"Image redimensionnée à: {img.size}, puis rembourrée à: {padded_image.size}")
+    return padded_image
+
+def apply_mask(image: Image.Image, mask: np.ndarray) -> Image.Image:
+    """Efface l'arrière-plan : l'image est collée sur un fond vide à travers le masque (uint8)."""
+    cleaned_image = Image.new("RGBA", image.size)
+    cleaned_image.paste(image, mask=Image.fromarray(mask))
+    return cleaned_image.convert("RGB")
+
+def encode_image(img: Image.Image, image_format: str, quality: int) -> bytes:
+    """Compresse une image PIL (WEBP/JPEG avec perte, PNG sans perte)."""
+    buffer = io.BytesIO()
+    if image_format.upper() == 'PNG':
+        img.save(buffer, format='PNG', optimize=True)
+    else:
+        img.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+def encode_mask(mask: np.ndarray) -> bytes:
+    """Compresse un masque uint8 en PNG (sans perte)."""
+    buffer = io.BytesIO()
+    Image.fromarray(mask.astype(np.uint8), mode='L').save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def decode_mask(data: bytes) -> np.ndarray:
+    return np.array(Image.open(io.BytesIO(data)).convert('L'))
+
+def to_b85(data: bytes) -> str:
+    """
+    Base85 : 25 % de surcoût au lieu de 33 % pour base64, et un alphabet sans
+    guillemet ni barre oblique inverse, donc transporté tel quel dans du JSON.
+    """
+    return base64.b85encode(data).decode('ascii')
+
+def from_b85(text: str) -> bytes:
+    return base64.b85decode(text)
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class ImageStore:
+    """Stockage disque des images reçues par le worker, indexées par empreinte SHA-256."""
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, f"{digest}.bin")
+
+    def get(self, digest: str):
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def put(self, digest: str, data: bytes):
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
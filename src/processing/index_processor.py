@@ -0,0 +1,32 @@
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from src.spatial_index import VoxelHashIndex
+from src.profiling import trace_span
+from src import config as app_config
+
+class SpatialIndexProcessor(QObject):
+    """
+    Construit en arrière-plan l'index spatial d'un résultat affiché, et le range
+    dans controller.spatial_indexes à côté du résultat mis en cache.
+    """
+    index_ready = pyqtSignal(object, object)  # (maillage, VoxelHashIndex)
+
+    def __init__(self, controller):
+        super().__init__()
+        self.controller = controller
+
+    @pyqtSlot(object)
+    def build(self, mesh):
+        index = self.controller.spatial_indexes.get(mesh)
+        if index is None:
+            try:
+                with trace_span("index spatial", vertices=len(mesh.vertices)):
+                    index = VoxelHashIndex(mesh.vertices, app_config.SPATIAL_INDEX_CONFIG['points_per_cell'])
+            except Exception as e:
+                # Les outils de mesure restent simplement indisponibles pour ce résultat.
+                print(f"AVERTISSEMENT: Échec de la construction de l'index spatial: {e}")
+                return
+            self.controller.spatial_indexes.put(mesh, index)
+            print(f"Index spatial construit : {len(index)} sommets en {index.build_time_s:.2f}s "
+                  f"({index.nbytes / 1024 ** 2:.0f} Mo).")
+        self.index_ready.emit(mesh, index)
@@ -1,87 +1,106 @@
+import time
 from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
-from PIL import Image
-import numpy as np
-import math
-import trimesh
 
-from src.engines.preprocessor import RMBGPreprocessor
-from src.geometry_builder import GeometryBuilder
+from .pipeline import ReconstructionPipeline
+from .comparison import ComparisonRunner
+from src.budget import BudgetReport
+from src.metrics import JOB_DURATION, JOBS
+from src.profiling import capture_profile, trace_path
 from src import config as app_config
 
-def resize_and_pad(img: Image.Image, target_size: int, divisor: int = 64) -> Image.Image:
-    """Redimensionne et ajoute un rembourrage pour que les dimensions soient divisibles."""
-    img.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
-    new_width = int(math.ceil(img.width / divisor)) * divisor
-    new_height = int(math.ceil(img.height / divisor)) * divisor
-    
-    padded_image = Image.new("RGB", (new_width, new_height), (0, 0, 0))
-    paste_x = (new_width - img.width) // 2
-    paste_y = (new_height - img.height) // 2
-    padded_image.paste(img, (paste_x, paste_y))
-    
-    print(f"Image redimensionnée à: {img.size}, puis rembourrée à: {padded_image.size}")
-    return padded_image
-
 class LocalProcessor(QObject):
     """
     Gère le pipeline de traitement de reconstruction 3D sur la machine locale.
     """
     # Le signal finished émet maintenant directement l'objet trimesh final.
-    finished = pyqtSignal(object) 
+    finished = pyqtSignal(object)
+    batch_item_finished = pyqtSignal(str, object)  # (chemin, trimesh)
+    batch_finished = pyqtSignal(int, int)          # (réussites, échecs)
+    comparison_finished = pyqtSignal(object)
+    status_message = pyqtSignal(str)
     error = pyqtSignal(str)
     thumbnail_data_ready = pyqtSignal(int, bytes, int, int)
 
     def __init__(self, controller):
         super().__init__()
         self.controller = controller
-        self.preprocessor = RMBGPreprocessor(app_config.DEVICE)
-        self.builder = GeometryBuilder()
+        self.pipeline = ReconstructionPipeline(controller)
+        self.comparison_runner = ComparisonRunner(self.pipeline)
 
     @pyqtSlot(str, str, dict)
     def process(self, path: str, engine_name: str, options: dict):
         """
         Slot qui exécute le pipeline de reconstruction complet.
         """
+        start = time.perf_counter()
         try:
             print(f"\n--- Démarrage du pipeline de traitement LOCAL pour {engine_name} ---")
-            img = Image.open(path).convert("RGB")
-            
-            # --- Pré-traitement de l'image ---
-            resize_target = options.get('resize_to', 'Original')
-            if resize_target != 'Original':
-                img = resize_and_pad(img, int(resize_target))
-
-            fg_mask = None
-            if options.get('bg_removal', False):
-                print("Application de la suppression d'arrière-plan...")
-                preproc_data = self.preprocessor.process(img)
-                img = preproc_data['image']
-                fg_mask = preproc_data['mask']
-            
-            # --- Inférence du moteur IA ---
-            engine = self.controller.get_engine(engine_name)
-            engine.load_model_if_needed()
-            raw_data = engine.process(img, options)
-            if raw_data is None: 
-                raise ValueError("Le moteur n'a retourné aucune donnée.")
-
-            # --- Construction de la géométrie ---
-            mesh = self.builder.build(raw_data, np.array(img), fg_mask, options)
-            if not isinstance(mesh, trimesh.Trimesh):
-                raise ValueError("La construction du maillage a échoué ou a retourné un type incorrect.")
+            report = BudgetReport()
+            with capture_profile(options.get('profiler', 'Aucun'), trace_path(app_config.PROFILING_CONFIG['trace_dir'], engine_name)):
+                mesh = self.pipeline.run(path, engine_name, options, report, progress=self.status_message.emit)
+            if report.decisions:
+                self.status_message.emit(f"Budget appliqué — {report.summary()}")
 
             # --- Mise en cache (logique simple) ---
             mesh_cache_key = self.controller.get_mesh_cache_key(path, engine_name, options)
             self.controller.mesh_cache[mesh_cache_key] = mesh
+            JOBS.inc(engine=engine_name, mode='local', status='success')
+            JOB_DURATION.observe(time.perf_counter() - start, engine=engine_name, mode='local')
 
             self.finished.emit(mesh)
 
         except Exception as e:
+            JOBS.inc(engine=engine_name, mode='local', status='error')
             import traceback
             error_message = f"Erreur dans le processeur local: {traceback.format_exc()}"
             print(error_message)
             self.error.emit(error_message)
 
+    @pyqtSlot(list, str, dict)
+    def process_batch(self, paths: list, engine_name: str, options: dict):
+        """Traite un lot d'images l'une après l'autre (même interface que RemoteProcessor)."""
+        succeeded, failed = 0, 0
+        with capture_profile(options.get('profiler', 'Aucun'), trace_path(app_config.PROFILING_CONFIG['trace_dir'], f"lot_{engine_name}")):
+            for path in paths:
+                start = time.perf_counter()
+                try:
+                    mesh = self.pipeline.run(path, engine_name, options)
+                    self.controller.mesh_cache[self.controller.get_mesh_cache_key(path, engine_name, options)] = mesh
+                    succeeded += 1
+                    JOBS.inc(engine=engine_name, mode='local', status='success')
+                    JOB_DURATION.observe(time.perf_counter() - start, engine=engine_name, mode='local')
+                    self.batch_item_finished.emit(path, mesh)
+                except Exception as e:
+                    failed += 1
+                    JOBS.inc(engine=engine_name, mode='local', status='error')
+                    print(f"ERREUR: Échec du traitement de {path}: {e}")
+                self.status_message.emit(f"Lot local : {succeeded + failed}/{len(paths)} terminés ({failed} échec(s))")
+        self.batch_finished.emit(succeeded, failed)
+
+    @pyqtSlot(str, dict)
+    def process_comparison(self, path: str, options_by_engine: dict):
+        """
+        Slot du mode comparaison : un seul décodage/pré-traitement, puis plusieurs moteurs.
+        options_by_engine : {nom_moteur: options effectives}.
+        """
+        try:
+            print(f"\n--- Démarrage de la comparaison LOCALE ({', '.join(options_by_engine)}) ---")
+            profiler_mode = next(iter(options_by_engine.values())).get('profiler', 'Aucun')
+            # Les moteurs tournent dans le pool de ComparisonRunner : un profil par thread, fusionnés.
+            with capture_profile(profiler_mode, trace_path(app_config.PROFILING_CONFIG['trace_dir'], "comparaison"),
+                                 all_threads=True):
+                results = self.comparison_runner.run(path, options_by_engine)
+            for engine_name, result in results.items():
+                if result.get('mesh') is not None:
+                    key = self.controller.get_mesh_cache_key(path, engine_name, options_by_engine[engine_name])
+                    self.controller.mesh_cache[key] = result['mesh']
+            self.comparison_finished.emit(results)
+        except Exception as e:
+            import traceback
+            error_message = f"Erreur dans la comparaison locale: {traceback.format_exc()}"
+            print(error_message)
+            self.error.emit(error_message)
+
     @pyqtSlot()
     def load_thumbnails(self):
         """Charge les miniatures en arrière-plan (cette partie reste toujours locale)."""
@@ -95,4 +114,4 @@ class LocalProcessor(QObject):
                     self.thumbnail_data_ready.emit(index, thumb_rgba, width, height)
             except Exception as e:
                 print(f"Erreur miniature {index}: {e}")
-        print("Chargement des miniatures terminé.")
\ No newline at end of file
+        print("Chargement des miniatures terminé.")
@@ -0,0 +1,255 @@
+from PIL import Image
+import numpy as np
+import os
+import time
+import trimesh
+
+from src.engines.preprocessor import RMBGPreprocessor
+from src.engines.replay_engine import record_output
+from .image_codec import apply_mask, resize_and_pad
+from .sequence import (FramePrefetcher, SequenceWriter, frame_change, frame_signature,
+                       iter_image_frames, iter_video_frames, sequence_output_dir)
+from src.geometry_builder import GeometryBuilder
+from src.budget import BudgetReport, ResourceBudget
+from src.metrics import record_cache
+from src.profiling import trace_span
+from src import config as app_config
+
+class ReconstructionPipeline:
+    """
+    Étapes du pipeline de reconstruction (décodage, pré-traitement, inférence,
+    géométrie), sans dépendance à Qt. Les processeurs et les modes avancés
+    (comparaison, etc.) composent ces étapes.
+    """
+    def __init__(self, controller):
+        self.controller = controller
+        self.preprocessor = RMBGPreprocessor()
+        self.budget = ResourceBudget.from_config()
+        self.builder = GeometryBuilder(self.budget)
+
+    def load_image(self, path: str, options: dict = None) -> Image.Image:
+        """
+        Décode l'image. Pour les JPEG qui seront de toute façon réduits (choix de
+        l'utilisateur ou budget), le décodeur travaille directement à échelle réduite.
+        """
+        with trace_span("décodage", path=os.path.basename(path)):
+            img = Image.open(path)
+            if options is not None and img.format == 'JPEG':
+                target = self.budget.inference_max_side(*img.size, tiled=options.get('tiled_inference', False))
+                if options.get('resize_to', 'Original') != 'Original':
+                    target = min(target or int(options['resize_to']), int(options['resize_to']))
+                if target is not None:
+                    img.draft('RGB', (target, target))
+            return img.convert("RGB")
+
+    def preprocess(self, img: Image.Image, options: dict, report: BudgetReport = None):
+        """Applique le redimensionnement et la suppression d'arrière-plan. Retourne (image, masque)."""
+        with trace_span("redimensionnement"):
+            resize_target = options.get('resize_to', 'Original')
+            if resize_target != 'Original':
+                img = resize_and_pad(img, int(resize_target))
+
+            # Le budget d'inférence s'applique aussi bien à 'Original' qu'à une taille choisie trop grande.
+            max_side = self.budget.inference_max_side(img.width, img.height, tiled=options.get('tiled_inference', False))
+            if max_side is not None:
+                (report or BudgetReport()).add(
+                    "inférence", f"{img.width}x{img.height} dépasse le budget de pixels, réduction à {max_side}px max")
+                img = resize_and_pad(img, max_side)
+
+        fg_mask = None
+        if options.get('bg_removal', False):
+            print("Application de la suppression d'arrière-plan...")
+            with trace_span("RMBG"):
+                preproc_data = self.preprocessor.process(img)
+            img = preproc_data['image']
+            fg_mask = preproc_data['mask']
+        return img, fg_mask
+
+    def infer(self, engine_name: str, img: Image.Image, options: dict) -> dict:
+        engine = self.controller.get_engine(engine_name)
+        if engine is None:
+            raise ValueError(f"Moteur '{engine_name}' indisponible.")
+        if not engine.is_loaded:
+            with trace_span("chargement du modèle", engine=engine_name):
+                engine.load_model_if_needed()
+        start = time.perf_counter()
+        with trace_span("inférence", engine=engine_name, size=f"{img.width}x{img.height}"):
+            raw_data = engine.process(img, options)
+        if raw_data is None:
+            raise ValueError("Le moteur n'a retourné aucune donnée.")
+        record_output(engine_name, img, options, raw_data, time.perf_counter() - start)
+        return raw_data
+
+    def infer_batch(self, engine_name: str, images: list, options: dict) -> list:
+        """Inférence groupée (engine.process_batch) : une liste de données brutes, dans l'ordre des images."""
+        engine = self.controller.get_engine(engine_name)
+        if engine is None:
+            raise ValueError(f"Moteur '{engine_name}' indisponible.")
+        if not engine.is_loaded:
+            with trace_span("chargement du modèle", engine=engine_name):
+                engine.load_model_if_needed()
+        start = time.perf_counter()
+        with trace_span("inférence", engine=engine_name, images=len(images)):
+            raw_batch = engine.process_batch(images, options)
+        if any(raw_data is None for raw_data in raw_batch):
+            raise ValueError("Le moteur n'a retourné aucune donnée.")
+        latency = (time.perf_counter() - start) / max(1, len(images))
+        for img, raw_data in zip(images, raw_batch):
+            record_output(engine_name, img, options, raw_data, latency)
+        return raw_batch
+
+    def build(self, raw_data: dict, img_rgb: np.ndarray, fg_mask, options: dict, report: BudgetReport = None) -> trimesh.Trimesh:
+        mesh = self.builder.build(raw_data, img_rgb, fg_mask, options, report)
+        if not isinstance(mesh, trimesh.Trimesh):
+            raise ValueError("La construction du maillage a échoué ou a retourné un type incorrect.")
+        return mesh
+
+    def run(self, path: str, engine_name: str, options: dict, report: BudgetReport = None, progress=None) -> trimesh.Trimesh:
+        """Pipeline complet pour une image, un dossier de scène ou une séquence (progress : voir run_sequence)."""
+        if self.controller.is_sequence(path):
+            return self.run_sequence(path, engine_name, options, report, progress)
+        if os.path.isdir(path):
+            return self.run_scene(path, engine_name, options, report)
+        # Les données brutes ne dépendent pas des options de post-traitement : réutilisées si seules celles-ci changent.
+        raw_key = self.controller.get_raw_data_cache_key(path, engine_name, options)
+        inference_result = self.controller.raw_data_cache.get(raw_key)
+        record_cache('raw_data', inference_result is not None)
+        if inference_result is not None:
+            print("Cache HIT (données brutes) : seule la géométrie est reconstruite.")
+            return self.build(*inference_result, options, report)
+        img, fg_mask = self.preprocess(self.load_image(path, options), options, report)
+        raw_data = self.infer(engine_name, img, options)
+        img_rgb = np.array(img)
+        self.controller.raw_data_cache[raw_key] = (raw_data, img_rgb, fg_mask)
+        return self.build(raw_data, img_rgb, fg_mask, options, report)
+
+    def run_scene(self, folder: str, engine_name: str, options: dict, report: BudgetReport = None) -> trimesh.Trimesh:
+        """Reconstruction multi-vues d'un dossier de scène, en un seul passage du moteur."""
+        engine = self.controller.get_engine(engine_name)
+        if not engine.CAPABILITIES.get('scene_folder', False):
+            raise ValueError(f"Le moteur '{engine_name}' ne prend pas en charge les dossiers de scène.")
+
+        image_paths = self.controller.list_scene_images(folder)
+        if not image_paths:
+            raise ValueError(f"Aucune image trouvée dans la scène '{folder}'.")
+        print(f"Scène '{os.path.basename(folder)}' : {len(image_paths)} vues. "
+              "Le redimensionnement et la suppression d'arrière-plan ne s'appliquent pas aux scènes.")
+
+        if not engine.is_loaded:
+            with trace_span("chargement du modèle", engine=engine_name):
+                engine.load_model_if_needed()
+        # Les vues sont ouvertes une à une à la demande : seules les versions prétraitées restent en mémoire.
+        frames = (Image.open(p).convert("RGB") for p in image_paths)
+        start = time.perf_counter()
+        with trace_span("inférence", engine=engine_name, views=len(image_paths)):
+            raw_data = engine.process_scene(frames, options)
+        if raw_data is None:
+            raise ValueError("Le moteur n'a retourné aucune donnée.")
+        record_output(engine_name, None, options, raw_data, time.perf_counter() - start, scene=True)
+        return self.build(raw_data, None, None, options, report)
+
+    def _preprocess_frame(self, img: Image.Image, signature: np.ndarray, options: dict, mask_state: dict,
+                          report: BudgetReport = None):
+        """
+        Pré-traitement d'une image de séquence. Tant que l'image reste proche de celle sur laquelle
+        le masque RMBG a été calculé (fond et sujet statiques), ce masque est réutilisé tel quel.
+        """
+        if not options.get('bg_removal', False):
+            return self.preprocess(img, options, report)
+        img, _ = self.preprocess(img, {**options, 'bg_removal': False}, report)
+        cfg = app_config.SEQUENCE_CONFIG
+        mask = mask_state.get('mask')
+        if (mask is not None and mask.shape == (img.height, img.width)
+                and mask_state['reuses'] < cfg['mask_refresh_interval']
+                and frame_change(signature, mask_state['signature']) < cfg['mask_reuse_threshold']):
+            mask_state['reuses'] += 1
+            return apply_mask(img, mask), mask
+        with trace_span("RMBG"):
+            preproc_data = self.preprocessor.process(img)
+        mask_state.update(mask=preproc_data['mask'], signature=signature, reuses=0)
+        return preproc_data['image'], preproc_data['mask']
+
+    def _flush_frames(self, engine_name: str, pending: list, options: dict, writer: SequenceWriter,
+                      report: BudgetReport = None):
+        """
+        Infère le lot d'images en attente puis écrit les sorties dans l'ordre de lecture.
+        Retourne (données brutes, image, masque, nuage ou None) de la dernière image inférée, ou None.
+        """
+        inferred = [entry for entry in pending if 'img' in entry]
+        raw_batch = iter(self.infer_batch(engine_name, [entry['img'] for entry in inferred], options) if inferred else [])
+        # La séquence est un flux de profondeurs/points : pas de maillage Poisson par image.
+        point_options = {**options, 'render_mode': True}
+        last = None
+        for entry in pending:
+            if 'img' not in entry:
+                writer.write_skipped(entry['frame'], entry['same_as'], entry['change'])
+                continue
+            raw_data = next(raw_batch)
+            mesh = None
+            if app_config.SEQUENCE_CONFIG['write_points']:
+                with trace_span("géométrie", frame=entry['frame']):
+                    mesh = self.build(raw_data, np.array(entry['img']), entry['fg_mask'], point_options, report)
+            with trace_span("écriture", frame=entry['frame']):
+                writer.write_frame(entry['frame'], raw_data, entry['fg_mask'], mesh, entry['change'])
+            last = (raw_data, entry['img'], entry['fg_mask'], mesh)
+        pending.clear()
+        return last
+
+    def run_sequence(self, path: str, engine_name: str, options: dict, report: BudgetReport = None,
+                     progress=None) -> trimesh.Trimesh:
+        """
+        Vidéo ou dossier d'images numérotées : images décodées en arrière-plan, inférées par lots
+        de SEQUENCE_CONFIG['batch_size'] ; une image presque identique à la dernière inférée est
+        sautée (sa sortie est celle de cette dernière). Les sorties sont écrites au fil de l'eau
+        (voir SequenceWriter) ; seul le nuage de points de la dernière image est retourné.
+        progress(message) : appelé après chaque lot.
+        """
+        cfg = app_config.SEQUENCE_CONFIG
+        engine = self.controller.get_engine(engine_name)
+        if engine is None:
+            raise ValueError(f"Moteur '{engine_name}' indisponible.")
+        if not engine.CAPABILITIES.get('single_image', False):
+            raise ValueError(f"Le moteur '{engine_name}' ne traite pas d'images isolées : séquence impossible.")
+
+        if self.controller.is_video(path):
+            frames = iter_video_frames(path, cfg['stride'])
+        else:
+            frame_paths = self.controller.list_sequence_frames(path)
+            if not frame_paths:
+                raise ValueError(f"Aucune image trouvée dans la séquence '{path}'.")
+            frames = iter_image_frames(frame_paths, cfg['stride'])
+
+        output_dir = sequence_output_dir(cfg['output_dir'], path, engine_name)
+        print(f"Séquence '{os.path.basename(os.path.normpath(path))}' : sorties écrites dans {output_dir}")
+        pending, mask_state, counts = [], {}, {'inferred': 0, 'skipped': 0}
+        reference, reference_frame, last = None, None, None
+        start = time.perf_counter()
+        with FramePrefetcher(frames, cfg['prefetch']) as prefetcher, SequenceWriter(output_dir, cfg['float_dtype']) as writer:
+            for frame_index, img in prefetcher:
+                signature = frame_signature(img, cfg['signature_size'])
+                change = frame_change(signature, reference) if reference is not None else None
+                if change is not None and change < cfg['skip_threshold']:
+                    pending.append({'frame': frame_index, 'same_as': reference_frame, 'change': change})
+                    counts['skipped'] += 1
+                    continue
+                reference, reference_frame = signature, frame_index
+                img, fg_mask = self._preprocess_frame(img, signature, options, mask_state, report)
+                pending.append({'frame': frame_index, 'img': img, 'fg_mask': fg_mask, 'change': change})
+                counts['inferred'] += 1
+                if counts['inferred'] % cfg['batch_size'] == 0:
+                    last = self._flush_frames(engine_name, pending, options, writer, report) or last
+                    if progress:
+                        progress(f"Séquence : {counts['inferred']} image(s) inférée(s), {counts['skipped']} sautée(s)")
+            if pending:
+                last = self._flush_frames(engine_name, pending, options, writer, report) or last
+
+        elapsed = time.perf_counter() - start
+        total = counts['inferred'] + counts['skipped']
+        print(f"Séquence terminée : {total} image(s) en {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} images/s), "
+              f"{counts['skipped']} sautée(s). Sorties : {output_dir}")
+        if last is None:
+            raise ValueError(f"Aucune image lue dans la séquence '{path}'.")
+        raw_data, img, fg_mask, mesh = last
+        if mesh is None:
+            mesh = self.build(raw_data, np.array(img), fg_mask, {**options, 'render_mode': True}, report)
+        return mesh
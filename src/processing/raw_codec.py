@@ -0,0 +1,38 @@
+import io
+import numpy as np
+
+# Données brutes d'un moteur (carte de profondeur, points/normales/masque MoGe...) transportées
+# entre le worker et le client en mode "hybrid" : archive .npz compressée, flottants en précision réduite.
+RAW_PREFIX = 'raw.'
+FG_MASK_KEY = 'fg_mask'
+
+def reduce_precision(value: np.ndarray, float_dtype: np.dtype) -> np.ndarray:
+    """Convertit un tableau flottant en précision réduite si ses valeurs finies restent représentables."""
+    if value.dtype.kind != 'f' or value.dtype.itemsize <= float_dtype.itemsize or value.size < 16:
+        return value
+    finite = value[np.isfinite(value)]
+    if finite.size and np.abs(finite).max() >= np.finfo(float_dtype).max:
+        return value
+    return value.astype(float_dtype)
+
+def encode_raw_data(raw_data: dict, fg_mask: np.ndarray = None, float_dtype: str = 'float16') -> bytes:
+    """Encode les données brutes d'un moteur (et le masque RMBG éventuel) en .npz compressé."""
+    float_dtype = np.dtype(float_dtype)
+    arrays = {RAW_PREFIX + key: reduce_precision(np.asarray(value), float_dtype) for key, value in raw_data.items()}
+    if fg_mask is not None:
+        arrays[FG_MASK_KEY] = np.asarray(fg_mask, dtype=np.uint8)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+def decode_raw_data(data) -> tuple:
+    """Retourne (données brutes, masque RMBG ou None). Les flottants réduits repassent en float32."""
+    raw_data, fg_mask = {}, None
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        for name in archive.files:
+            value = archive[name]
+            if name == FG_MASK_KEY:
+                fg_mask = value
+            else:
+                raw_data[name[len(RAW_PREFIX):]] = value.astype(np.float32) if value.dtype == np.float16 else value
+    return raw_data, fg_mask
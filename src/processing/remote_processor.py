@@ -1,43 +1,145 @@
 from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
 from .runpod_client import RunPodClient
+from .async_runpod_client import AsyncRunPodClient
+from .result_cache import DiskResultCache
+from src.engines.preprocessor import RMBGPreprocessor
+from src.geometry_builder import GeometryBuilder
+from src.budget import BudgetReport
+from src.metrics import JOB_DURATION, JOBS, record_cache
+from src.profiling import capture_profile, trace_path
+from src import config as app_config
+import asyncio
+import time
 import trimesh
 
 class RemoteProcessor(QObject):
     """
     Gère le pipeline de traitement en déléguant le calcul à un worker RunPod distant.
     Il a la même interface (signaux) que LocalProcessor pour être interchangeable.
+    En mode hybride, le worker ne renvoie que les données brutes du moteur : elles sont
+    mises en cache et la géométrie est construite en local.
     """
     finished = pyqtSignal(object)  # Émet un objet trimesh
+    batch_item_finished = pyqtSignal(str, object)  # (chemin, trimesh)
+    batch_finished = pyqtSignal(int, int)          # (réussites, échecs)
+    status_message = pyqtSignal(str)
     error = pyqtSignal(str)
 
-    def __init__(self, api_key: str, endpoint_id: str):
+    def __init__(self, api_key: str, endpoint_id, controller=None, hybrid: bool = False):
         super().__init__()
-        self.client = RunPodClient(api_key, endpoint_id)
+        if hybrid and controller is None:
+            raise ValueError("Le mode hybride nécessite le contrôleur (cache des données brutes).")
+        self.api_key = api_key
+        self.endpoint_id = endpoint_id
+        self.controller = controller
+        self.hybrid = hybrid
+        self.builder = GeometryBuilder() if hybrid else None
+        # La suppression d'arrière-plan côté client est optionnelle (elle demande le modèle RMBG en local).
+        preprocessor = RMBGPreprocessor() if app_config.REMOTE_UPLOAD_CONFIG['client_bg_removal'] else None
+        self.client = RunPodClient(api_key, endpoint_id, preprocessor=preprocessor,
+                                   result_cache=DiskResultCache.for_client())
 
     @pyqtSlot(str, str, dict)
     def process(self, path: str, engine_name: str, options: dict):
         """
         Slot qui envoie une tâche de reconstruction au worker distant et attend le résultat.
         """
+        mode = 'hybrid' if self.hybrid else 'remote'
+        start = time.perf_counter()
         try:
             print(f"\n--- Démarrage du pipeline de traitement REMOTE pour {engine_name} ---")
+            if self.controller.is_sequence(path):
+                raise ValueError("Les vidéos et séquences d'images ne sont traitées qu'en mode local.")
             
-            # La méthode process_remote est bloquante, c'est pourquoi ce worker
+            # Les méthodes du client sont bloquantes, c'est pourquoi ce worker
             # doit s'exécuter dans un QThread pour ne pas geler la GUI.
-            mesh = self.client.process_remote(
-                image_path=path,
-                engine_name=engine_name,
-                options=options
-            )
+            # Profilage détaillé éventuel : seule la partie cliente (envoi, attente, décodage, géométrie hybride).
+            with capture_profile(options.get('profiler', 'Aucun'), trace_path(app_config.PROFILING_CONFIG['trace_dir'], engine_name)):
+                if self.hybrid:
+                    mesh = self._process_hybrid(path, engine_name, options)
+                else:
+                    mesh = self.client.process_remote(
+                        image_path=path,
+                        engine_name=engine_name,
+                        options=options
+                    )
 
             if not isinstance(mesh, trimesh.Trimesh):
                  raise TypeError(f"Le client distant a retourné un objet de type inattendu: {type(mesh)}")
 
             print("--- Tâche distante terminée et résultat récupéré. ---")
+            JOBS.inc(engine=engine_name, mode=mode, status='success')
+            JOB_DURATION.observe(time.perf_counter() - start, engine=engine_name, mode=mode)
             self.finished.emit(mesh)
 
         except Exception as e:
+            JOBS.inc(engine=engine_name, mode=mode, status='error')
             import traceback
             error_message = f"Erreur dans le processeur distant: {traceback.format_exc()}"
             print(error_message)
-            self.error.emit(error_message)
\ No newline at end of file
+            self.error.emit(error_message)
+
+    def _build_from_raw(self, path: str, engine_name: str, options: dict, inference_result, report: BudgetReport = None):
+        """Met en cache les données brutes reçues du worker et construit la géométrie en local."""
+        self.controller.raw_data_cache[self.controller.get_raw_data_cache_key(path, engine_name, options)] = inference_result
+        raw_data, img_rgb, fg_mask = inference_result
+        mesh = self.builder.build(raw_data, img_rgb, fg_mask, options, report)
+        if not isinstance(mesh, trimesh.Trimesh):
+            raise ValueError("La construction du maillage a échoué ou a retourné un type incorrect.")
+        return mesh
+
+    def _process_hybrid(self, path: str, engine_name: str, options: dict) -> trimesh.Trimesh:
+        """Inférence distante seulement si les données brutes ne sont pas déjà en cache."""
+        report = BudgetReport()
+        raw_key = self.controller.get_raw_data_cache_key(path, engine_name, options)
+        inference_result = self.controller.raw_data_cache.get(raw_key)
+        record_cache('raw_data', inference_result is not None)
+        if inference_result is not None:
+            print("Cache HIT (données brutes) : seule la géométrie est reconstruite, sans tâche GPU.")
+        else:
+            inference_result = self.client.infer_remote(path, engine_name, options)
+        mesh = self._build_from_raw(path, engine_name, options, inference_result, report)
+        if report.decisions:
+            self.status_message.emit(f"Budget appliqué — {report.summary()}")
+        return mesh
+
+    async def _run_batch(self, paths: list, engine_name: str, options: dict):
+        succeeded, failed = 0, 0
+        # Même préparateur d'envoi que le client synchrone : les images déjà connues du worker ne sont pas renvoyées.
+        async with AsyncRunPodClient(self.api_key, self.endpoint_id, uploader=self.client.uploader,
+                                     result_cache=self.client.result_cache, router=self.client.router) as client:
+            async for path, result, error in client.process_many(paths, engine_name, options, raw_output=self.hybrid):
+                mesh = result
+                if error is None and self.hybrid:
+                    try:
+                        # Construction locale hors de la boucle d'événements : les autres tâches continuent.
+                        mesh = await asyncio.to_thread(self._build_from_raw, path, engine_name, options, result)
+                    except Exception as e:
+                        error = e
+                mode = 'hybrid' if self.hybrid else 'remote'
+                if error is None and isinstance(mesh, trimesh.Trimesh):
+                    succeeded += 1
+                    JOBS.inc(engine=engine_name, mode=mode, status='success')
+                    self.batch_item_finished.emit(path, mesh)
+                else:
+                    failed += 1
+                    JOBS.inc(engine=engine_name, mode=mode, status='error')
+                    print(f"ERREUR: Tâche distante échouée pour {path}: {error}")
+                self.status_message.emit(f"Lot distant : {succeeded + failed}/{len(paths)} terminés ({failed} échec(s))")
+        return succeeded, failed
+
+    @pyqtSlot(list, str, dict)
+    def process_batch(self, paths: list, engine_name: str, options: dict):
+        """
+        Slot qui envoie un lot d'images au worker distant : les tâches sont menées
+        en parallèle par le client asynchrone, et chaque résultat est émis dès réception.
+        """
+        try:
+            print(f"\n--- Démarrage du traitement par lot REMOTE ({len(paths)} images) pour {engine_name} ---")
+            succeeded, failed = asyncio.run(self._run_batch(paths, engine_name, options))
+            self.batch_finished.emit(succeeded, failed)
+        except Exception as e:
+            import traceback
+            error_message = f"Erreur dans le traitement par lot distant: {traceback.format_exc()}"
+            print(error_message)
+            self.error.emit(error_message)
@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+
+from src import config as app_config
+from .image_codec import sha256_hex
+from src.metrics import record_cache
+
+def result_cache_key(image_sha256: str, engine_name: str, options: dict, output_kind: str) -> str:
+    """
+    Empreinte d'une requête : image effectivement envoyée (déjà redimensionnée/compressée),
+    moteur, options effectives et nature du résultat ('mesh', 'raw' ou un format précis).
+    """
+    payload = json.dumps([image_sha256, engine_name, sorted(options.items()), output_kind], default=str)
+    return sha256_hex(payload.encode('utf-8'))
+
+class DiskResultCache:
+    """
+    Cache disque des résultats encodés (maillage LFVG/GLB ou données brutes .npz), un fichier
+    '<clé>.<format>' par résultat. Au-delà de max_bytes, les moins récemment utilisés sont évincés.
+    """
+    def __init__(self, root: str, max_bytes: int = None, name: str = 'results'):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.name = name  # Étiquette 'cache' des métriques
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def for_client(cls):
+        """Cache local du client d'après REMOTE_RESULT_CACHE, ou None s'il est désactivé."""
+        cfg = app_config.REMOTE_RESULT_CACHE
+        return cls(cfg['client_dir'], cfg['client_max_bytes'], name='client_results') if cfg['enabled'] else None
+
+    def get(self, key: str):
+        """Retourne (format, octets) ou None."""
+        for path in glob.glob(os.path.join(self.root, f"{key}.*")):
+            if path.endswith('.tmp'):
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)  # Marque l'entrée comme récemment utilisée
+            except OSError:
+                break
+            record_cache(self.name, True)
+            return path.rsplit('.', 1)[1], data
+        record_cache(self.name, False)
+        return None
+
+    def put(self, key: str, result_format: str, data: bytes):
+        path = os.path.join(self.root, f"{key}.{result_format}")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -1,25 +1,141 @@
-import base64
+import io
+import random
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import trimesh
-import os
 import time
 
+from src import config as app_config
+from src.metrics import QUEUE_WAIT, TRANSFERRED_BYTES
+from src.profiling import trace_span
+from .geometry_codec import decode_mesh
+from .image_codec import from_b85
+from .raw_codec import decode_raw_data
+from .result_cache import DiskResultCache
+from .endpoint_router import EndpointRouter
+from .upload import UploadPreparer
+
+# Codes HTTP considérés comme transitoires : on réessaie avec backoff.
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+TRANSIENT_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                        requests.exceptions.ChunkedEncodingError)
+
+class TransientHTTPError(IOError):
+    """Erreur HTTP passagère (surcharge, coupure réseau, téléchargement tronqué)."""
+
+def is_connect_error(error: Exception) -> bool:
+    """Vrai si la connexion n'a pas pu être établie : la requête n'est pas partie, la renvoyer est sans risque."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+def backoff_delay(attempt: int, base_s: float, max_s: float) -> float:
+    """Backoff exponentiel avec 'full jitter' : délai aléatoire dans [0, min(max, base * 2^n)]."""
+    return random.uniform(0, min(max_s, base_s * (2 ** attempt)))
+
+def load_mesh_from_bytes(data, file_type: str = 'glb') -> trimesh.Trimesh:
+    """Charge un maillage depuis un tampon en mémoire, sans fichier temporaire."""
+    try:
+        return trimesh.load(io.BytesIO(data), file_type=file_type, force='mesh')
+    except Exception as e:
+        raise IOError(f"Impossible de charger le maillage depuis les données téléchargées. Erreur: {e}")
+
+def parse_result_output(output):
+    """
+    Interprète la sortie du worker et retourne (format, données en ligne ou None, URL ou None).
+    Un ancien worker renvoie directement l'URL d'un GLB.
+    """
+    if isinstance(output, str):
+        return 'glb', None, output
+    result_format = output.get('format', 'glb')
+    if output.get('data_b85'):
+        return result_format, from_b85(output['data_b85']), None
+    return result_format, None, output['url']
+
+def record_submission(payload: dict):
+    """Métriques : octets d'image joints à une tâche soumise (champs '*_b85' / '*_b64')."""
+    job_input = payload.get('input', {})
+    size = sum(len(value) for item in [job_input, *(job_input.get('items') or [])]
+               for key, value in item.items() if key.endswith(('_b85', '_b64')))
+    TRANSFERRED_BYTES.inc(size, direction='sent', channel='job')
+
+def record_completion(endpoint_id: str, status_data: dict):
+    """Métriques : attente en file de la tâche terminée (delayTime RunPod, en millisecondes)."""
+    if status_data.get('delayTime') is not None:
+        QUEUE_WAIT.observe(status_data['delayTime'] / 1000, endpoint=endpoint_id)
+
+def record_result_bytes(data: bytes, downloaded: bool):
+    TRANSFERRED_BYTES.inc(len(data), direction='received', channel='download' if downloaded else 'inline')
+
+def load_result_mesh(data, result_format: str) -> trimesh.Trimesh:
+    """Décode le résultat selon le format négocié ('lfvg' compact, sinon format trimesh)."""
+    if result_format == 'lfvg':
+        return decode_mesh(data)
+    return load_mesh_from_bytes(data, file_type=result_format)
+
+def normalize_endpoint_ids(endpoint_id) -> list:
+    """Accepte un ID d'endpoint ou une liste d'IDs ; vérifie qu'ils sont configurés."""
+    endpoint_ids = [endpoint_id] if isinstance(endpoint_id, str) else list(endpoint_id or [])
+    if not endpoint_ids or any(not eid or eid == "VOTRE_ENDPOINT_ID_ICI" for eid in endpoint_ids):
+        raise ValueError("L'ID de l'endpoint RunPod n'est pas configuré.")
+    return endpoint_ids
+
+class AdaptivePoller:
+    """
+    Intervalles d'interrogation adaptatifs : rapides au début (les tâches courtes
+    sont détectées tôt), puis espacés géométriquement jusqu'à un plafond.
+    """
+    def __init__(self, initial_s: float, factor: float, max_s: float):
+        self.delay = initial_s
+        self.factor = factor
+        self.max_s = max_s
+
+    def next_delay(self) -> float:
+        delay = self.delay
+        self.delay = min(self.max_s, self.delay * self.factor)
+        return delay
+
+    @classmethod
+    def from_config(cls, http_config: dict):
+        return cls(http_config['poll_initial_s'], http_config['poll_backoff_factor'], http_config['poll_max_s'])
+
 class RunPodClient:
     """
     Classe pour communiquer avec l'API REST de RunPod Serverless sans utiliser le SDK.
     Cela garantit la compatibilité avec Windows.
+    Une session HTTP (keep-alive, pool de connexions) est réutilisée pour toutes les requêtes.
+    Avec plusieurs endpoints, chaque tâche est routée par EndpointRouter et peut être doublée
+    sur un second endpoint si elle dépasse le percentile de latence configuré.
     """
-    def __init__(self, api_key: str, endpoint_id: str):
+    def __init__(self, api_key: str, endpoint_id, base_url: str = None, http_config: dict = None,
+                 preprocessor=None, result_cache: DiskResultCache = None, router: EndpointRouter = None):
         if not api_key:
             raise ValueError("La clé API RunPod ne peut pas être vide.")
-        if not endpoint_id or endpoint_id == "VOTRE_ENDPOINT_ID_ICI":
-            raise ValueError("L'ID de l'endpoint RunPod n'est pas configuré.")
-        
+        endpoint_ids = normalize_endpoint_ids(endpoint_id)
+
         self.api_key = api_key
-        self.endpoint_id = endpoint_id
-        # Les URL de l'API RunPod pour lancer une tâche et vérifier son statut. [1]
-        self.run_url = f"https://api.runpod.ai/v2/{self.endpoint_id}/run"
-        self.status_url = f"https://api.runpod.ai/v2/{self.endpoint_id}/status"
+        self.endpoint_id = endpoint_ids[0]
+        self.http_config = {**app_config.REMOTE_HTTP_CONFIG, **(http_config or {})}
+        # base_url est configurable pour pouvoir viser un serveur local de substitution (tests).
+        self.base_url = (base_url or app_config.RUNPOD_API_BASE_URL).rstrip('/')
+        self.router = router or EndpointRouter(endpoint_ids)
+        self.session = self._create_session()
+        self.uploader = UploadPreparer(preprocessor=preprocessor)
+        self.result_cache = result_cache
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        pool_size = self.http_config['pool_size']
+        # Les réessais sont gérés par _request (backoff avec jitter), pas par l'adaptateur.
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def close(self):
+        self.session.close()
 
     def _get_headers(self):
         """Prépare les en-têtes d'authentification pour la requête API."""
@@ -28,79 +144,259 @@ class RunPodClient:
             "Content-Type": "application/json"
         }
 
-    def process_remote(self, image_path: str, engine_name: str, options: dict) -> trimesh.Trimesh:
+    def _sleep_before_retry(self, attempt: int, response=None):
+        delay = backoff_delay(attempt, self.http_config['backoff_base_s'], self.http_config['backoff_max_s'])
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        print(f"AVERTISSEMENT: Erreur transitoire, nouvel essai dans {delay:.1f}s (tentative {attempt + 1}).")
+        time.sleep(delay)
+
+    def _request(self, method: str, url: str, idempotent: bool = True, **kwargs) -> requests.Response:
         """
-        Fonction bloquante qui gère le cycle de vie complet d'une tâche RunPod via l'API REST.
+        Requête API authentifiée, réessayée sur les erreurs transitoires. Une requête non
+        idempotente (soumission de tâche) n'est renvoyée que si la connexion n'a pas pu être
+        établie : après un délai dépassé ou une erreur 5xx, la tâche a pu être créée.
         """
-        print(f"Préparation de la tâche pour l'endpoint '{self.endpoint_id}' via l'API REST...")
+        max_retries = self.http_config['max_retries']
+        for attempt in range(max_retries + 1):
+            response = None
+            try:
+                response = self.session.request(method, url, headers=self._get_headers(),
+                                                timeout=self.http_config['timeout_s'], **kwargs)
+                if response.status_code not in TRANSIENT_STATUS_CODES or not idempotent:
+                    return response
+            except TRANSIENT_EXCEPTIONS as e:
+                if attempt == max_retries or not (idempotent or is_connect_error(e)):
+                    raise
+            if attempt == max_retries:
+                return response
+            self._sleep_before_retry(attempt, response)
 
-        # 1. Lire et encoder l'image en base64
-        with open(image_path, "rb") as f:
-            image_b64 = base64.b64encode(f.read()).decode('utf-8')
-
-        # 2. Préparer le corps de la requête (payload)
-        payload = {
-            "input": {
-                "image_b64": image_b64,
-                "engine_name": engine_name,
-                "options": options
-            }
-        }
+    def download(self, url: str) -> bytes:
+        """
+        Télécharge un fichier en un seul passage, en streaming vers un tampon mémoire.
+        Si la connexion est coupée, le téléchargement reprend là où il s'était arrêté
+        (en-tête Range) ; si le serveur ignore Range, il repart de zéro.
+        L'en-tête d'authentification n'est pas envoyé : l'URL peut pointer vers un stockage tiers.
+        """
+        buffer = io.BytesIO()
+        max_retries = self.http_config['max_retries']
+        chunk_size = self.http_config['download_chunk_bytes']
+        for attempt in range(max_retries + 1):
+            offset = buffer.tell()
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            response = None
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.http_config['timeout_s']) as response:
+                    if response.status_code in TRANSIENT_STATUS_CODES:
+                        raise TransientHTTPError(f"Statut {response.status_code}")
+                    if response.status_code == 200 and offset:
+                        buffer.seek(0)
+                        buffer.truncate()
+                    elif response.status_code not in (200, 206):
+                        raise IOError(f"Impossible de télécharger le fichier de maillage. Statut: {response.status_code}")
+
+                    expected_total = self._expected_total(response, buffer.tell())
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        buffer.write(chunk)
+                    if expected_total is not None and buffer.tell() < expected_total:
+                        raise TransientHTTPError(f"Téléchargement tronqué ({buffer.tell()}/{expected_total} octets)")
+                return buffer.getvalue()
+            except TRANSIENT_EXCEPTIONS + (TransientHTTPError,):
+                if attempt == max_retries:
+                    raise
+                self._sleep_before_retry(attempt, response)
+
+    @staticmethod
+    def _expected_total(response, offset: int):
+        """Taille totale attendue du fichier, d'après Content-Range (206) ou Content-Length (200)."""
+        content_range = response.headers.get("Content-Range")
+        if response.status_code == 206 and content_range and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+        length = response.headers.get("Content-Length")
+        return offset + int(length) if length and length.isdigit() else None
+
+    def _endpoint_url(self, endpoint_id: str) -> str:
+        # Les URL de l'API RunPod pour lancer une tâche et vérifier son statut sont relatives à l'endpoint. [1]
+        return f"{self.base_url}/{endpoint_id}"
 
-        # 3. Soumettre la tâche à l'endpoint
+    def _refresh_health(self):
+        """Interroge /health des endpoints dont l'état date (seulement s'il y a un choix à faire)."""
+        for endpoint_id in self.router.endpoint_ids:
+            if not self.router.needs_health_check(endpoint_id):
+                continue
+            try:
+                response = self._request("GET", f"{self._endpoint_url(endpoint_id)}/health")
+                self.router.record_health(endpoint_id, response.json() if response.status_code == 200 else None)
+            except TRANSIENT_EXCEPTIONS:
+                self.router.record_health(endpoint_id, None)
+
+    def _start_job(self, payload: dict, tried: set) -> dict:
+        """
+        Soumet la tâche à l'endpoint le mieux classé ; s'il la refuse, essaie le suivant.
+        Si l'issue est incertaine (délai dépassé, connexion coupée, erreur 5xx), la tâche a pu
+        être créée sans que son ID soit connu : l'erreur est levée plutôt que de la soumettre en double.
+        """
+        last_error = None
+        while (endpoint_id := self.router.choose(exclude=tried)) is not None:
+            tried.add(endpoint_id)
+            response = None
+            try:
+                response = self._request("POST", f"{self._endpoint_url(endpoint_id)}/run", idempotent=False, json=payload)
+                if response.status_code != 200:
+                    raise ConnectionError(f"Échec de la soumission de la tâche. Statut: {response.status_code}, Réponse: {response.text}")
+            except (ConnectionError,) + TRANSIENT_EXCEPTIONS as e:
+                print(f"AVERTISSEMENT: Endpoint '{endpoint_id}' indisponible : {e}")
+                self.router.record_failure(endpoint_id)
+                if response is None and not is_connect_error(e):
+                    raise
+                if response is not None and response.status_code in TRANSIENT_STATUS_CODES - {429}:
+                    raise
+                last_error = e
+                continue
+            job_id = response.json().get("id")
+            self.router.record_submit(endpoint_id)
+            record_submission(payload)
+            print(f"Tâche soumise avec l'ID: {job_id} (endpoint '{endpoint_id}'). En attente du résultat...")
+            return {'endpoint': endpoint_id, 'id': job_id, 'started': time.monotonic()}
+        raise last_error or ConnectionError("Aucun endpoint RunPod disponible.")
+
+    def _cancel_job(self, job: dict):
+        """Annule une tâche devenue inutile (perdante d'un hedging, délai dépassé)."""
+        self.router.record_done(job['endpoint'])
+        try:
+            self._request("POST", f"{self._endpoint_url(job['endpoint'])}/cancel/{job['id']}")
+        except TRANSIENT_EXCEPTIONS:
+            pass
+
+    def _run_job(self, payload: dict):
+        """
+        Soumet une tâche et attend sa sortie (interrogation adaptative du statut). Si elle
+        dépasse le délai de hedging, un doublon part sur un autre endpoint : le premier
+        résultat gagne et l'autre tâche est annulée.
+        """
         print("Envoi de la tâche à RunPod...")
-        response = requests.post(self.run_url, headers=self._get_headers(), json=payload)
-        
-        if response.status_code != 200:
-            raise ConnectionError(f"Échec de la soumission de la tâche. Statut: {response.status_code}, Réponse: {response.text}")
-
-        job_data = response.json()
-        job_id = job_data.get("id")
-        print(f"Tâche soumise avec l'ID: {job_id}. En attente du résultat...")
-
-        # 4. Attendre le résultat en interrogeant l'URL de statut (polling)
-        status_url_with_id = f"{self.status_url}/{job_id}"
-        timeout_seconds = 600  # 10 minutes
-        start_time = time.time()
-
-        while time.time() - start_time < timeout_seconds:
-            status_response = requests.get(status_url_with_id, headers=self._get_headers())
-            status_data = status_response.json()
-
-            status = status_data.get("status")
-            if status == "COMPLETED":
-                print("Tâche terminée avec succès.")
-                output = status_data.get("output")
-                if output is None:
-                    raise ValueError("La tâche est terminée mais n'a retourné aucune sortie ('output').")
-                
-                # Le 'output' est l'URL du fichier GLB uploadé par le worker
-                mesh_url = output
-                break
-            elif status in ["FAILED", "CANCELLED"]:
-                error_detail = status_data.get("output", "Aucun détail d'erreur fourni.")
-                raise RuntimeError(f"La tâche RunPod a échoué avec le statut '{status}'. Détails: {error_detail}")
-            
-            # Attendre avant de vérifier à nouveau pour ne pas surcharger l'API
-            time.sleep(2)
-        else:
-            raise TimeoutError("Le délai d'attente pour la tâche RunPod a été dépassé.")
+        self._refresh_health()
+        tried = set()
+        jobs = [self._start_job(payload, tried)]
+        hedge_delay = self.router.hedge_delay()
 
-        # 5. Télécharger le fichier de maillage depuis l'URL retournée
-        print(f"Téléchargement du maillage depuis : {mesh_url}")
-        mesh_response = requests.get(mesh_url)
-        if mesh_response.status_code != 200:
-            raise IOError(f"Impossible de télécharger le fichier de maillage. Statut: {mesh_response.status_code}")
+        timeout_seconds = self.http_config['job_timeout_s']
+        poller = AdaptivePoller.from_config(self.http_config)
+        start_time = time.monotonic()
+        last_failure = None
 
-        # 6. Charger le maillage en objet Trimesh depuis les données binaires en mémoire
         try:
-            # trimesh peut charger directement depuis un objet fichier en mémoire
-            with requests.get(mesh_url, stream=True) as r:
-                r.raise_for_status()
-                # On utilise un "file-like object" en mémoire
-                mesh = trimesh.load(r.raw, file_type='glb')
-        except Exception as e:
-            raise IOError(f"Impossible de charger le maillage depuis les données téléchargées. Erreur: {e}")
+            while time.monotonic() - start_time < timeout_seconds:
+                for job in list(jobs):
+                    status_response = self._request("GET", f"{self._endpoint_url(job['endpoint'])}/status/{job['id']}")
+                    status_data = status_response.json()
+
+                    status = status_data.get("status")
+                    if status == "COMPLETED":
+                        print("Tâche terminée avec succès.")
+                        jobs.remove(job)
+                        self.router.record_done(job['endpoint'])
+                        output = status_data.get("output")
+                        if output is None:
+                            raise ValueError("La tâche est terminée mais n'a retourné aucune sortie ('output').")
+                        self.router.record_success(job['endpoint'], time.monotonic() - job['started'], status_data)
+                        record_completion(job['endpoint'], status_data)
+                        return output
+                    elif status in ["FAILED", "CANCELLED", "TIMED_OUT"]:
+                        jobs.remove(job)
+                        self.router.record_done(job['endpoint'])
+                        if status != "CANCELLED":
+                            # Un worker qui échoue à chaque tâche doit finir par être écarté.
+                            self.router.record_failure(job['endpoint'])
+                        error_detail = status_data.get("output", status_data.get("error", "Aucun détail d'erreur fourni."))
+                        last_failure = RuntimeError(f"La tâche RunPod a échoué avec le statut '{status}'. Détails: {error_detail}")
+
+                # Sans doublon encore en cours, l'échec est définitif.
+                if not jobs:
+                    raise last_failure
+
+                if hedge_delay is not None and time.monotonic() - start_time > hedge_delay:
+                    hedge_delay = None
+                    try:
+                        jobs.append(self._start_job(payload, tried))
+                        print("Tâche lente : doublon envoyé sur un second endpoint (hedging).")
+                    except (ConnectionError,) + TRANSIENT_EXCEPTIONS:
+                        pass
+
+                # Attendre avant de vérifier à nouveau, de plus en plus longtemps, pour ne pas surcharger l'API
+                time.sleep(poller.next_delay())
+
+            raise TimeoutError("Le délai d'attente pour la tâche RunPod a été dépassé.")
+        finally:
+            # Tâches encore en cours : perdantes du hedging ou abandonnées.
+            for job in jobs:
+                self._cancel_job(job)
+
+    def _submit(self, prepared: dict, engine_name: str, raw_output: bool = False):
+        """
+        Soumet la tâche (l'image n'est jointe que si le worker ne la connaît pas déjà)
+        et retourne (format, données) du résultat, récupéré en ligne ou téléchargé une seule fois.
+        Une requête identique déjà servie est lue dans le cache disque, sans tâche GPU.
+        """
+        cache_key = self.uploader.cache_key(prepared, engine_name, raw_output)
+        if self.result_cache is not None and (cached := self.result_cache.get(cache_key)) is not None:
+            print(f"Cache HIT (résultat distant) : format '{cached[0]}', aucune tâche soumise.")
+            return cached
+
+        with trace_span("tâche distante", engine=engine_name):
+            output = self._run_job(self.uploader.build_payload(prepared, engine_name, raw_output=raw_output))
+            if isinstance(output, dict) and output.get("missing_image"):
+                print("Le worker ne possède pas l'image référencée : nouvel envoi avec les données.")
+                self.uploader.forget(prepared)
+                output = self._run_job(self.uploader.build_payload(prepared, engine_name, force_data=True, raw_output=raw_output))
+        self.uploader.mark_uploaded(prepared)
+        if isinstance(output, dict) and output.get("cold_start"):
+            print(f"Démarrage à froid du worker (secondes) : {output['cold_start']}")
+        if isinstance(output, dict) and output.get("trace"):
+            print(f"Étapes sur le worker (secondes) : {output['trace']}")
+
+        result_format, data, result_url = parse_result_output(output)
+        if data is None:
+            print(f"Téléchargement du résultat depuis : {result_url}")
+            with trace_span("téléchargement"):
+                data = self.download(result_url)
+        record_result_bytes(data, downloaded=result_url is not None)
+        print(f"Résultat reçu au format '{result_format}' ({len(data) / 1024:.0f} Ko).")
+        if self.result_cache is not None:
+            self.result_cache.put(cache_key, result_format, data)
+        return result_format, data
+
+    def process_remote(self, image_path: str, engine_name: str, options: dict) -> trimesh.Trimesh:
+        """
+        Fonction bloquante qui gère le cycle de vie complet d'une tâche RunPod via l'API REST.
+        """
+        print(f"Préparation de la tâche pour l'endpoint '{self.endpoint_id}' via l'API REST...")
+
+        # 1. Pré-traiter et compresser l'image côté client
+        with trace_span("préparation de l'envoi"):
+            prepared = self.uploader.prepare(image_path, options)
+
+        # 2. Soumettre la tâche, puis décoder le résultat depuis le tampon mémoire
+        result_format, data = self._submit(prepared, engine_name)
+        with trace_span("décodage du résultat", format=result_format):
+            mesh = load_result_mesh(data, result_format)
 
         print("Maillage chargé avec succès.")
-        return mesh
\ No newline at end of file
+        return mesh
+
+    def infer_remote(self, image_path: str, engine_name: str, options: dict):
+        """
+        Mode "hybrid" : le worker ne fait que l'inférence. Retourne (données brutes, image RGB,
+        masque) prêts pour GeometryBuilder, l'image et le masque étant ceux vus par le worker.
+        """
+        print(f"Préparation de la tâche d'inférence pour l'endpoint '{self.endpoint_id}'...")
+        with trace_span("préparation de l'envoi"):
+            prepared = self.uploader.prepare(image_path, options)
+        _, data = self._submit(prepared, engine_name, raw_output=True)
+        with trace_span("décodage du résultat", format='npz'):
+            raw_data, worker_mask = decode_raw_data(data)
+        img_rgb, fg_mask = self.uploader.worker_view(prepared, worker_mask)
+        return raw_data, img_rgb, fg_mask
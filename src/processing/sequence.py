@@ -0,0 +1,162 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+import numpy as np
+from PIL import Image
+
+from .compact_raw import GEOMETRY_FIELDS
+from .exporter import write_npz, write_ply
+from .raw_codec import FG_MASK_KEY, reduce_precision
+from src.profiling import trace_span
+
+# Vidéos et séquences d'images numérotées, traitées comme un flux : les images sont décodées
+# dans un thread d'arrière-plan (file bornée), et chaque sortie est écrite sur disque dès
+# qu'elle est produite. La mémoire ne dépend donc pas de la durée du clip.
+
+def natural_sort_key(name: str) -> list:
+    """'frame_2' avant 'frame_10'."""
+    return [int(token) if token.isdigit() else token.lower() for token in re.split(r'(\d+)', name)]
+
+def iter_video_frames(path: str, stride: int = 1):
+    """(index, image PIL RGB) des images d'une vidéo ; les images sautées ne sont pas décodées."""
+    import cv2  # Import différé : seules les vidéos en ont besoin
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Impossible d'ouvrir la vidéo '{path}'.")
+    try:
+        index = 0
+        while capture.grab():
+            if index % stride == 0:
+                with trace_span("décodage", frame=index):
+                    ok, bgr = capture.retrieve()
+                    if not ok:
+                        break
+                    frame = Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+                yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+def iter_image_frames(paths: list, stride: int = 1):
+    """(index, image PIL RGB) d'une liste ordonnée de fichiers image."""
+    for index in range(0, len(paths), stride):
+        with trace_span("décodage", frame=index):
+            with Image.open(paths[index]) as img:
+                frame = img.convert("RGB")
+        yield index, frame
+
+def first_video_frame(path: str) -> Image.Image:
+    """Première image d'une vidéo (miniature, aperçu)."""
+    for _, frame in iter_video_frames(path):
+        return frame
+    raise IOError(f"La vidéo '{path}' ne contient aucune image.")
+
+class FramePrefetcher:
+    """
+    Consomme un itérateur d'images dans un thread d'arrière-plan et les met à disposition
+    via une file bornée à 'depth' images : le décodage de l'image suivante recouvre
+    l'inférence de la courante, sans jamais décoder tout le clip d'avance.
+    """
+    _END = object()
+
+    def __init__(self, frames, depth: int = 8):
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(frames,), name="décodage des images", daemon=True)
+        self._thread.start()
+
+    def _run(self, frames):
+        try:
+            for item in frames:
+                if not self._put(item):
+                    return
+            self._put(self._END)
+        except Exception as e:
+            self._put(e)
+        finally:
+            if hasattr(frames, 'close'):
+                frames.close()  # Libère la vidéo même si la lecture est interrompue
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def frame_signature(img: Image.Image, size: int = 32) -> np.ndarray:
+    """Vignette en niveaux de gris (valeurs 0-1) comparée d'une image à l'autre."""
+    return np.asarray(img.convert('L').resize((size, size), Image.Resampling.BILINEAR), dtype=np.float32) / 255.0
+
+def frame_change(signature: np.ndarray, reference: np.ndarray) -> float:
+    """Écart moyen absolu entre deux vignettes (0 = identiques, 1 = opposées)."""
+    return float(np.abs(signature - reference).mean())
+
+class SequenceWriter:
+    """
+    Écrit une séquence au fil de l'eau dans un dossier :
+    - 'frame_XXXXXX.npz' : données brutes utiles à la géométrie (précision réduite) et masque RMBG ;
+    - 'frame_XXXXXX.ply' : nuage de points de l'image (optionnel) ;
+    - 'index.jsonl' : une ligne par image lue ; une image sautée renvoie à celle dont elle reprend la sortie.
+    """
+    def __init__(self, folder: str, float_dtype: str = 'float16'):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.float_dtype = np.dtype(float_dtype)
+        self._index = open(os.path.join(folder, 'index.jsonl'), 'w', encoding='utf-8')
+
+    def _append(self, entry: dict):
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+    def write_frame(self, frame_index: int, raw_data: dict, fg_mask=None, mesh=None, change: float = None):
+        name = f"frame_{frame_index:06d}"
+        arrays = {key: reduce_precision(np.asarray(raw_data[key]), self.float_dtype)
+                  for key in GEOMETRY_FIELDS if key in raw_data}
+        arrays[FG_MASK_KEY] = fg_mask
+        write_npz(arrays, os.path.join(self.folder, f"{name}.npz"))
+        entry = {'frame': frame_index, 'data': f"{name}.npz", 'change': change}
+        if mesh is not None:
+            write_ply(mesh, os.path.join(self.folder, f"{name}.ply"))
+            entry['points'] = f"{name}.ply"
+        self._append(entry)
+
+    def write_skipped(self, frame_index: int, source_frame: int, change: float):
+        self._append({'frame': frame_index, 'same_as': source_frame, 'change': change})
+
+    def close(self):
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def sequence_output_dir(root: str, path: str, engine_name: str) -> str:
+    stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    return os.path.join(root, f"{time.strftime('%Y%m%d-%H%M%S')}_{stem}_{engine_name}")
@@ -0,0 +1,246 @@
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from src import config as app_config
+from src.metrics import record_cache
+
+# Préfixes partagés par les points d'une grille : le décodage et le pré-traitement dépendent
+# seulement de ces options, l'inférence de toutes les options hors 'geometry' et 'runtime'.
+PREPROCESS_KEYS = ('resize_to', 'bg_removal', 'tiled_inference')
+
+def expand_grid(grid: dict) -> list:
+    """{'a': [1, 2], 'b': [3]} -> [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}] (produit cartésien, ordre stable)."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+def mesh_deviation(mesh, reference, sample: int = 20_000, seed: int = 0) -> float:
+    """
+    Écart de Chamfer symétrique (moyenne des distances au plus proche voisin, dans les deux sens)
+    entre les sommets de deux résultats, rapporté à la diagonale de la boîte englobante de la référence.
+    """
+    from scipy.spatial import KDTree  # Import différé, comme dans GeometryBuilder
+    rng = np.random.default_rng(seed)
+
+    def subsample(vertices):
+        vertices = np.asarray(vertices, dtype=np.float32)
+        if len(vertices) > sample:
+            vertices = vertices[rng.choice(len(vertices), sample, replace=False)]
+        return vertices
+
+    points, ref_points = subsample(mesh.vertices), subsample(reference.vertices)
+    if not len(points) or not len(ref_points):
+        return float('nan')
+    forward, _ = KDTree(ref_points).query(points, k=1)
+    backward, _ = KDTree(points).query(ref_points, k=1)
+    diagonal = float(np.linalg.norm(ref_points.max(axis=0) - ref_points.min(axis=0))) or 1.0
+    return float((forward.mean() + backward.mean()) / 2 / diagonal)
+
+def is_reference_point(options: dict, reference: dict) -> bool:
+    return bool(reference) and all(options.get(key) == value for key, value in reference.items())
+
+class SweepRunner:
+    """
+    Balayage d'une grille d'options pour un moteur. Les points sont regroupés par préfixe commun :
+    chaque image est décodée et pré-traitée une fois par jeu d'options de pré-traitement, l'inférence
+    est exécutée une fois par jeu d'options d'inférence (ou reprise du cache de données brutes),
+    puis les variantes géométriques de ce jeu sont construites en parallèle.
+    Le coût d'un balayage est donc proche de celui de ses inférences distinctes.
+    """
+    def __init__(self, pipeline, geometry_workers: int = None, deviation_sample: int = None):
+        cfg = app_config.SWEEP_CONFIG
+        self.pipeline = pipeline
+        self.controller = pipeline.controller
+        self.geometry_workers = max(1, geometry_workers or cfg['geometry_workers'])
+        self.deviation_sample = deviation_sample or cfg['deviation_sample']
+
+    def full_options(self, engine_name: str, base_options: dict = None) -> dict:
+        """Valeurs par défaut du pipeline et du moteur, surchargées par base_options."""
+        options = {key: spec.get('default') for key, spec in app_config.PIPELINE_OPTIONS.items()}
+        options.update(self.controller.get_default_options(engine_name))
+        options.update(base_options or {})
+        return options
+
+    def validate_grid(self, engine_name: str, grid: dict):
+        known = {**app_config.PIPELINE_OPTIONS, **self.controller.get_engine_option_specs(engine_name)}
+        runtime_keys = self.controller.get_option_keys_for_stage(engine_name, 'runtime')
+        for key, values in grid.items():
+            if key not in known:
+                raise ValueError(f"Option '{key}' inconnue pour le moteur '{engine_name}'.")
+            if key in runtime_keys:
+                raise ValueError(f"L'option d'exécution '{key}' n'a pas sa place dans un balayage.")
+            if not values:
+                raise ValueError(f"Aucune valeur pour l'option '{key}'.")
+
+    def plan(self, engine_name: str, grid: dict, base_options: dict = None, reference: dict = None) -> list:
+        """
+        Points de la grille regroupés pour partager les préfixes :
+        [(options de pré-traitement, [(options d'inférence, [options complètes, ...]), ...]), ...].
+        Les groupes qui contiennent le point de référence passent en premier : l'écart de chaque
+        variante se calcule alors dès sa construction et son maillage est libéré aussitôt.
+        """
+        self.validate_grid(engine_name, grid)
+        base = self.full_options(engine_name, base_options)
+        excluded = (self.controller.get_geometry_option_keys(engine_name)
+                    | self.controller.get_option_keys_for_stage(engine_name, 'runtime'))
+        groups = {}
+        for point in expand_grid(grid):
+            options = {**base, **point}
+            preprocess_key = tuple((key, options.get(key)) for key in PREPROCESS_KEYS)
+            inference_key = tuple(sorted((k, v) for k, v in options.items() if k not in excluded))
+            groups.setdefault(preprocess_key, {}).setdefault(inference_key, []).append(options)
+
+        def without_reference(variants):
+            return not any(is_reference_point(options, reference or {}) for options in variants)
+
+        plan = []
+        for preprocess_key, inference_groups in groups.items():
+            inference_plan = sorted(((dict(inference_key), variants) for inference_key, variants in inference_groups.items()),
+                                    key=lambda group: without_reference(group[1]))
+            plan.append((dict(preprocess_key), inference_plan))
+        # Tri stable : l'ordre de la grille est conservé en dehors des groupes de la référence.
+        return sorted(plan, key=lambda group: without_reference(group[1][0][1]))
+
+    def _build_variant(self, raw_data, img_rgb, fg_mask, options):
+        row = {'geometry_s': None, 'vertices': None, 'faces': None, 'error': None}
+        try:
+            start = time.perf_counter()
+            mesh = self.pipeline.build(raw_data, img_rgb, fg_mask, options)
+            row['geometry_s'] = time.perf_counter() - start
+            row['vertices'], row['faces'] = len(mesh.vertices), len(mesh.faces)
+            return row, mesh
+        except Exception as e:
+            row['error'] = str(e)
+            return row, None
+
+    def _run_image(self, path, engine_name, plan, reference, grid_keys, pool, progress):
+        rows, reference_mesh, pending_deviation = [], None, []
+        for preprocess_options, inference_groups in plan:
+            shared = None  # (image, masque, durée) calculé à la première inférence qui en a besoin
+            for inference_options, variants in inference_groups:
+                raw_key = self.controller.get_raw_data_cache_key(path, engine_name, variants[0])
+                entry = self.controller.raw_data_cache.get(raw_key)
+                cache_hit = entry is not None
+                record_cache('raw_data', cache_hit)
+                preprocess_s = inference_s = 0.0
+                error = None
+                if entry is None:
+                    try:
+                        if shared is None:
+                            start = time.perf_counter()
+                            img, fg_mask = self.pipeline.preprocess(self.pipeline.load_image(path, variants[0]), variants[0])
+                            shared = (img, fg_mask, time.perf_counter() - start)
+                        img, fg_mask, preprocess_s = shared
+                        start = time.perf_counter()
+                        raw_data = self.pipeline.infer(engine_name, img, variants[0])
+                        inference_s = time.perf_counter() - start
+                        # Même représentation (compacte) qu'une reprise du cache : toutes les lignes
+                        # du tableau sont construites à partir de données de même précision.
+                        entry = self.controller.raw_data_cache.compact_entry((raw_data, np.array(img), fg_mask))
+                        self.controller.raw_data_cache[raw_key] = entry
+                    except Exception as e:
+                        print(f"ERREUR: Inférence impossible pour {os.path.basename(path)} ({inference_options}) : {e}")
+                        error = str(e)
+
+                if error is None:
+                    built = list(pool.map(lambda options: self._build_variant(*entry, options), variants))
+                else:
+                    built = [({'geometry_s': None, 'vertices': None, 'faces': None, 'error': error}, None)
+                             for _ in variants]
+
+                for options, (row, mesh) in zip(variants, built):
+                    row.update({'image': os.path.basename(path), **{key: options[key] for key in grid_keys},
+                                'preprocess_s': preprocess_s, 'inference_s': inference_s,
+                                'raw_cache_hit': cache_hit, 'deviation': None})
+                    # Latence d'un traitement isolé de ce point (sans partage ni cache).
+                    row['latency_s'] = preprocess_s + inference_s + (row['geometry_s'] or 0.0)
+                    is_reference = is_reference_point(options, reference)
+                    row['reference'] = is_reference
+                    if mesh is not None:
+                        if is_reference:
+                            reference_mesh = mesh
+                            row['deviation'] = 0.0
+                        else:
+                            pending_deviation.append((row, mesh))
+                    rows.append(row)
+                    if progress:
+                        progress(row)
+                # Dès que la référence est connue, les écarts en attente sont calculés et les maillages libérés.
+                if reference_mesh is not None:
+                    for row, mesh in pending_deviation:
+                        row['deviation'] = mesh_deviation(mesh, reference_mesh, self.deviation_sample)
+                    pending_deviation = []
+        return rows
+
+    def run(self, paths: list, engine_name: str, grid: dict, base_options: dict = None,
+            reference: dict = None, progress=None) -> dict:
+        """
+        Exécute la grille sur chaque image. 'reference' désigne le point auquel les autres sont comparés
+        (écart de Chamfer relatif) ; par défaut le dernier point de la grille, c'est-à-dire les valeurs
+        les plus coûteuses si elles sont données par ordre croissant.
+        Retourne {'rows': [...], 'summary': {...}} ; progress(row) est appelé après chaque point.
+        """
+        points = expand_grid(grid)
+        reference = reference or points[-1]
+        plan = self.plan(engine_name, grid, base_options, reference)
+        grid_keys = list(grid)
+        inference_runs = sum(len(inference_groups) for _, inference_groups in plan)
+        print(f"\n--- Balayage '{engine_name}' : {len(points)} points x {len(paths)} image(s), "
+              f"{len(plan)} pré-traitement(s) et {inference_runs} inférence(s) distincts par image ---")
+
+        start = time.perf_counter()
+        rows = []
+        with ThreadPoolExecutor(max_workers=self.geometry_workers) as pool:
+            for path in paths:
+                rows.extend(self._run_image(path, engine_name, plan, reference, grid_keys, pool, progress))
+        elapsed = time.perf_counter() - start
+
+        summary = {
+            'engine': engine_name, 'grid': grid, 'reference': reference, 'images': len(paths),
+            'points': len(points), 'preprocess_runs': len(plan) * len(paths),
+            'inference_runs': inference_runs * len(paths), 'elapsed_s': elapsed,
+            'sequential_s': sum(row['latency_s'] for row in rows),
+            'failed': sum(1 for row in rows if row['error']),
+        }
+        print(f"Balayage terminé en {elapsed:.2f}s (traitements isolés : {summary['sequential_s']:.2f}s, "
+              f"{summary['failed']} échec(s)).")
+        return {'rows': rows, 'summary': summary}
+
+SWEEP_COLUMNS = ('image', 'latency_s', 'preprocess_s', 'inference_s', 'geometry_s', 'raw_cache_hit',
+                 'vertices', 'faces', 'deviation', 'reference', 'error')
+
+def format_table(result: dict) -> str:
+    """Tableau texte latence / qualité, une ligne par point et par image."""
+    grid_keys = list(result['summary']['grid'])
+    header = grid_keys + ['image', 'latence (s)', 'inférence (s)', 'géométrie (s)', 'sommets', 'écart']
+    lines = [header]
+    for row in result['rows']:
+        def seconds(value):
+            return '-' if value is None else f"{value:.2f}"
+        deviation = '-' if row['deviation'] is None else f"{row['deviation']:.4f}" + (' (réf.)' if row['reference'] else '')
+        lines.append([str(row[key]) for key in grid_keys] + [
+            row['image'], seconds(row['latency_s']),
+            seconds(row['inference_s']) + (' (cache)' if row['raw_cache_hit'] else ''),
+            seconds(row['geometry_s']), '-' if row['vertices'] is None else str(row['vertices']),
+            'ÉCHEC' if row['error'] else deviation,
+        ])
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)) for line in lines)
+
+def write_results(result: dict, folder: str, name: str) -> tuple:
+    """Écrit le tableau (CSV) et le résumé complet (JSON). Retourne les deux chemins."""
+    os.makedirs(folder, exist_ok=True)
+    csv_path = os.path.join(folder, f"{name}.csv")
+    json_path = os.path.join(folder, f"{name}.json")
+    columns = list(result['summary']['grid']) + list(SWEEP_COLUMNS)
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(result['rows'])
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, default=str)
+    return csv_path, json_path
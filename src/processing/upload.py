@@ -0,0 +1,184 @@
+import io
+import os
+import numpy as np
+from PIL import Image
+
+from src import config as app_config
+from src.budget import ResourceBudget
+from .image_codec import apply_mask, decode_mask, encode_image, encode_mask, resize_and_pad, sha256_hex, to_b85
+from .result_cache import result_cache_key
+
+# Dimension maximale d'une image dans chaque format avec perte (au-delà, l'encodeur échoue).
+MAX_IMAGE_SIDE = {'WEBP': 16383, 'JPEG': 65535}
+
+def upload_format(image_format: str, width: int, height: int) -> str:
+    """Format demandé, ou le premier repli (JPEG puis PNG) qui accepte une image de cette taille."""
+    image_format = image_format.upper()
+    for candidate in (image_format, 'JPEG', 'PNG'):
+        if max(width, height) <= MAX_IMAGE_SIDE.get(candidate, float('inf')):
+            return candidate
+    return 'PNG'
+
+class UploadPreparer:
+    """
+    Prépare l'envoi d'une image au worker distant :
+    - redimensionnement (et RMBG, en option) effectués côté client ;
+    - image compressée, encodée en base85 ;
+    - image référencée par son empreinte SHA-256 une fois envoyée, pour ne pas la renvoyer.
+    """
+    def __init__(self, upload_config: dict = None, preprocessor=None):
+        self.upload_config = {**app_config.REMOTE_UPLOAD_CONFIG, **(upload_config or {})}
+        self.preprocessor = preprocessor
+        self.budget = ResourceBudget.from_config()
+        self.uploaded_hashes = set()
+
+    def prepare(self, image_path: str, options: dict) -> dict:
+        """
+        Retourne {'sha256', 'image_b85', 'mask_b85', 'image_data', 'mask_data', 'options',
+        'original_bytes', 'payload_bytes'}.
+        'options' sont les options effectives à transmettre (étapes déjà faites neutralisées).
+        """
+        cfg = self.upload_config
+        effective_options = dict(options)
+        original_bytes = os.path.getsize(image_path)
+
+        img = Image.open(image_path).convert("RGB")
+        if cfg['client_resize']:
+            resize_target = options.get('resize_to', 'Original')
+            if resize_target != 'Original':
+                img = resize_and_pad(img, int(resize_target))
+            max_side = self.budget.inference_max_side(img.width, img.height, tiled=options.get('tiled_inference', False))
+            if max_side is not None:
+                img = resize_and_pad(img, max_side)
+            effective_options['resize_to'] = 'Original'
+
+        mask_data = b''
+        if cfg['client_bg_removal'] and options.get('bg_removal', False) and self.preprocessor is not None:
+            print("Suppression d'arrière-plan côté client...")
+            preproc_data = self.preprocessor.process(img)
+            img = preproc_data['image']
+            mask_data = encode_mask(preproc_data['mask'])
+            effective_options['bg_removal'] = False
+
+        image_data = self._encode_within_limit(img, len(mask_data))
+        image_b85 = to_b85(image_data)
+        mask_b85 = to_b85(mask_data) if mask_data else None
+        payload_bytes = len(image_b85) + len(mask_b85 or '')
+        print(f"Image préparée pour l'envoi : {original_bytes / 1024:.0f} Ko -> {payload_bytes / 1024:.0f} Ko encodés.")
+        return {
+            # L'empreinte couvre l'image et le masque : le worker la recalcule pour vérifier l'envoi.
+            'sha256': sha256_hex(image_data + mask_data),
+            'image_b85': image_b85,
+            'mask_b85': mask_b85,
+            'image_data': image_data,
+            'mask_data': mask_data,
+            'options': effective_options,
+            'original_bytes': original_bytes,
+            'payload_bytes': payload_bytes,
+        }
+
+    def _encode_within_limit(self, img: Image.Image, mask_size: int) -> bytes:
+        """Encode l'image en réduisant la qualité si nécessaire pour respecter la limite de charge utile."""
+        cfg = self.upload_config
+        # base85 : 5 caractères pour 4 octets.
+        limit = (cfg['max_payload_bytes'] * 4) // 5 - mask_size
+        quality = cfg['image_quality']
+        # Sans budget de pixels (ou avec 'Original'), l'image peut dépasser la taille maximale du WebP.
+        image_format = upload_format(cfg['image_format'], img.width, img.height)
+        if image_format != cfg['image_format'].upper():
+            print(f"Image de {img.width}x{img.height} trop grande pour {cfg['image_format']} : envoi en {image_format}.")
+        while True:
+            image_data = encode_image(img, image_format, quality)
+            if len(image_data) <= limit or image_format == 'PNG' or quality <= 50:
+                break
+            quality -= 10
+        if len(image_data) > limit:
+            raise ValueError(f"Image trop volumineuse pour l'envoi ({len(image_data)} octets, limite {limit}).")
+        return image_data
+
+    @staticmethod
+    def job_options(prepared: dict, engine_name: str, raw_output: bool = False) -> dict:
+        """
+        Options transmises au worker. Les options d'exécution (profilage local) ne le concernent
+        jamais, ni les options de post-traitement pour une sortie brute : elles sont retirées
+        (et n'entrent pas dans les clés de cache).
+        """
+        excluded_keys = app_config.option_keys_for_stage(engine_name, 'runtime')
+        if raw_output:
+            excluded_keys |= app_config.geometry_option_keys(engine_name)
+        return {k: v for k, v in prepared['options'].items() if k not in excluded_keys}
+
+    def _image_fields(self, prepared: dict, force_data: bool) -> dict:
+        """Référence de l'image ; les données ne sont jointes que si le worker ne la connaît pas encore."""
+        fields = {"image_sha256": prepared['sha256']}
+        if force_data or not self.upload_config['reference_by_hash'] or prepared['sha256'] not in self.uploaded_hashes:
+            fields["image_b85"] = prepared['image_b85']
+            if prepared['mask_b85']:
+                fields["mask_b85"] = prepared['mask_b85']
+        return fields
+
+    def build_payload(self, prepared: dict, engine_name: str, force_data: bool = False, raw_output: bool = False) -> dict:
+        """
+        Corps de la requête ; l'image n'est jointe que si le worker ne la connaît pas encore.
+        raw_output : le worker renvoie les données brutes du moteur au lieu du maillage (mode "hybrid").
+        """
+        job_input = {
+            "engine_name": engine_name,
+            "options": self.job_options(prepared, engine_name, raw_output),
+            "result_formats": app_config.REMOTE_RESULT_CONFIG['formats'],
+            **self._image_fields(prepared, force_data),
+        }
+        if raw_output:
+            job_input["output"] = "raw"
+        return {"input": job_input}
+
+    def build_batch_payload(self, prepared_items: list, engine_name: str, force_data: bool = False,
+                            raw_output: bool = False) -> dict:
+        """
+        Corps d'une tâche multi-images : les options communes sont envoyées une fois,
+        chaque élément ne porte que ses différences. L'identifiant d'un élément est son rang.
+        """
+        shared_options = self.job_options(prepared_items[0], engine_name, raw_output)
+        items = []
+        for index, prepared in enumerate(prepared_items):
+            item = {"id": index, **self._image_fields(prepared, force_data)}
+            item_options = self.job_options(prepared, engine_name, raw_output)
+            overrides = {k: v for k, v in item_options.items() if shared_options.get(k) != v}
+            if overrides:
+                item["options"] = overrides
+            items.append(item)
+        job_input = {
+            "engine_name": engine_name,
+            "options": shared_options,
+            "result_formats": app_config.REMOTE_RESULT_CONFIG['formats'],
+            "items": items,
+        }
+        if raw_output:
+            job_input["output"] = "raw"
+        return {"input": job_input}
+
+    def worker_view(self, prepared: dict, worker_mask=None):
+        """
+        Reconstitue l'image (tableau RGB) et le masque exactement tels que le worker les a
+        utilisés : mêmes octets décodés, mêmes étapes. Sert à construire la géométrie en local.
+        """
+        img = Image.open(io.BytesIO(prepared['image_data'])).convert("RGB")
+        resize_target = prepared['options'].get('resize_to', 'Original')
+        if resize_target != 'Original':
+            img = resize_and_pad(img, int(resize_target))
+        if worker_mask is not None:
+            return np.array(apply_mask(img, worker_mask)), worker_mask
+        fg_mask = decode_mask(prepared['mask_data']) if prepared['mask_data'] else None
+        return np.array(img), fg_mask
+
+    def cache_key(self, prepared: dict, engine_name: str, raw_output: bool = False) -> str:
+        """Clé du cache de résultats : image envoyée, moteur et options transmises au worker."""
+        return result_cache_key(prepared['sha256'], engine_name, self.job_options(prepared, engine_name, raw_output),
+                                'raw' if raw_output else 'mesh')
+
+    def mark_uploaded(self, prepared: dict):
+        self.uploaded_hashes.add(prepared['sha256'])
+
+    def forget(self, prepared: dict):
+        """Le worker ne connaît plus l'image (autre machine, cache vidé) : elle sera renvoyée."""
+        self.uploaded_hashes.discard(prepared['sha256'])
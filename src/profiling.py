@@ -0,0 +1,320 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext, suppress
+
+from src.metrics import STAGE_DURATION
+
+try:
+    import psutil
+except ImportError:  # psutil est optionnel : sans lui, la RSS n'est pas mesurée.
+    psutil = None
+
+def current_rss_bytes() -> int:
+    """Mémoire résidente actuelle du processus (0 si psutil est indisponible)."""
+    if psutil is None:
+        return 0
+    return psutil.Process(os.getpid()).memory_info().rss
+
+def _cuda_available() -> bool:
+    # On ne force jamais l'import de torch juste pour mesurer : seulement s'il est déjà chargé.
+    torch = sys.modules.get('torch')
+    return torch is not None and torch.cuda.is_available()
+
+def _device_allocated() -> int:
+    return sys.modules['torch'].cuda.memory_allocated() if _cuda_available() else 0
+
+class PeakMemoryMonitor:
+    """
+    Mesure le temps écoulé et la mémoire de pointe d'un bloc de code.
+    - RSS : échantillonnée par un thread de fond (pic observé, processus entier).
+    - Mémoire GPU : allocation PyTorch échantillonnée par le même thread (approximative : un pic
+      plus bref que l'intervalle peut échapper, et l'allocation est celle de tout le processus).
+      Le compteur de pic global de PyTorch n'est jamais remis à zéro, ce qui fausserait les
+      mesures concurrentes (moteurs en parallèle, spans du traceur).
+    Utilisation : with PeakMemoryMonitor() as mon: ... ; mon.result()
+    """
+    def __init__(self, sample_interval_s: float = 0.01, track_device: bool = True):
+        self.sample_interval_s = sample_interval_s
+        self.track_device = track_device and _cuda_available()
+        self._stop = threading.Event()
+        self._thread = None
+        self.wall_s = 0.0
+        self.start_rss = 0
+        self.peak_rss = 0
+        self.peak_device = 0
+
+    def _sample_device(self):
+        if self.track_device:
+            self.peak_device = max(self.peak_device, _device_allocated())
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval_s):
+            self.peak_rss = max(self.peak_rss, current_rss_bytes())
+            self._sample_device()
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = current_rss_bytes()
+        self._sample_device()
+        if psutil is not None or self.track_device:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_s = time.perf_counter() - self._start
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss_bytes())
+        self._sample_device()
+        return False
+
+    def result(self) -> dict:
+        return {
+            'latency_s': self.wall_s,
+            'peak_rss_mb': self.peak_rss / 1024 ** 2,
+            'rss_delta_mb': (self.peak_rss - self.start_rss) / 1024 ** 2,
+            'peak_device_mb': self.peak_device / 1024 ** 2,
+        }
+
+class Tracer:
+    """
+    Spans structurés d'un traitement (décodage, RMBG, inférence, géométrie, rendu...) :
+    temps réel, temps CPU du processus et pics de mémoire (RSS, allocation PyTorch).
+    Les spans s'imbriquent par thread ; ils sont exportables au format Chrome Trace
+    (chrome://tracing ou https://ui.perfetto.dev) et résumables en une ligne.
+    """
+    def __init__(self, name: str = "traitement", sample_interval_s: float = 0.01):
+        self.name = name
+        self.sample_interval_s = sample_interval_s
+        self.spans = []           # Spans terminés (dicts)
+        self._open = []           # Spans en cours, tous threads confondus (pour l'échantillonneur)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sampler = None      # (thread, événement d'arrêt) tant qu'un span est ouvert
+        self._t0 = time.perf_counter()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _sample(self, stop: threading.Event):
+        while not stop.wait(self.sample_interval_s):
+            rss, device = current_rss_bytes(), _device_allocated()
+            with self._lock:
+                for span in self._open:
+                    span['peak_rss'] = max(span['peak_rss'], rss)
+                    span['peak_device'] = max(span['peak_device'], device)
+
+    @contextmanager
+    def span(self, name: str, category: str = "pipeline", **args):
+        """
+        Le pic GPU d'un span est échantillonné (memory_allocated) et non lu dans le compteur de pic
+        de PyTorch : ce compteur est global au processus, le remettre à zéro fausserait les spans
+        concurrents (pool du mode comparaison) et PeakMemoryMonitor.
+        """
+        stack = self._stack()
+        track_device = _cuda_available()
+        rss = current_rss_bytes()
+        span = {'name': name, 'cat': category, 'args': args, 'tid': threading.get_ident(), 'depth': len(stack),
+                'peak_rss': rss, 'peak_device': _device_allocated(),
+                'start': time.perf_counter(), 'cpu_start': time.process_time()}
+        stack.append(span)
+        with self._lock:
+            self._open.append(span)
+            if (psutil is not None or track_device) and self._sampler is None:
+                stop = threading.Event()
+                self._sampler = (threading.Thread(target=self._sample, args=(stop,), daemon=True), stop)
+                self._sampler[0].start()
+        try:
+            yield span
+        finally:
+            span['wall_s'] = time.perf_counter() - span['start']
+            span['cpu_s'] = time.process_time() - span.pop('cpu_start')
+            span['peak_rss'] = max(span['peak_rss'], current_rss_bytes())
+            span['peak_device'] = max(span['peak_device'], _device_allocated())
+            stack.remove(span)
+            if stack:
+                stack[-1]['peak_device'] = max(stack[-1]['peak_device'], span['peak_device'])
+            sampler = None
+            with self._lock:
+                self._open.remove(span)
+                self.spans.append(span)
+                if not self._open:
+                    sampler, self._sampler = self._sampler, None
+            if sampler is not None:
+                sampler[1].set()
+                sampler[0].join()
+
+    def stage_totals(self) -> dict:
+        """{nom: temps réel cumulé (s)}, dans l'ordre de première apparition."""
+        totals = {}
+        for span in sorted(self.spans, key=lambda s: s['start']):
+            totals[span['name']] = totals.get(span['name'], 0.0) + span['wall_s']
+        return totals
+
+    def summary(self) -> str:
+        if not self.spans:
+            return "aucun span enregistré"
+        stages = " | ".join(f"{name} {seconds:.2f}s" for name, seconds in self.stage_totals().items())
+        peak_rss = max(s['peak_rss'] for s in self.spans) / 1024 ** 2
+        peak_device = max(s['peak_device'] for s in self.spans) / 1024 ** 2
+        memory = ", ".join(f"pic {label} {value:.0f} Mo" for label, value in (("RSS", peak_rss), ("GPU", peak_device)) if value)
+        return f"{stages} — {memory}" if memory else stages
+
+    def to_chrome_trace(self) -> dict:
+        """Événements complets ('ph': 'X', temps en microsecondes) du format Chrome Trace."""
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.name}}]
+        for span in self.spans:
+            events.append({
+                "name": span['name'], "cat": span['cat'], "ph": "X", "pid": pid, "tid": span['tid'],
+                "ts": (span['start'] - self._t0) * 1e6, "dur": span['wall_s'] * 1e6,
+                "args": {**{k: str(v) for k, v in span['args'].items()},
+                         "cpu_ms": round(span['cpu_s'] * 1000, 3),
+                         "peak_rss_mb": round(span['peak_rss'] / 1024 ** 2, 1),
+                         "peak_device_mb": round(span['peak_device'] / 1024 ** 2, 1)},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
+
+# Traceur actif pour tout le processus (les étapes peuvent tourner dans d'autres threads
+# que celui qui l'a activé, ex. QThread du processeur ou pool du mode comparaison).
+_active_tracer = None
+
+def activate_tracer(tracer):
+    """Active 'tracer' (ou aucun avec None) et retourne le traceur précédent."""
+    global _active_tracer
+    previous, _active_tracer = _active_tracer, tracer
+    return previous
+
+def active_tracer():
+    return _active_tracer
+
+@contextmanager
+def tracing(tracer):
+    previous = activate_tracer(tracer)
+    try:
+        yield tracer
+    finally:
+        activate_tracer(previous)
+
+@contextmanager
+def _stage_metric(name: str, span):
+    """Durée de l'étape dans l'histogramme laforge_stage_duration_seconds, traceur actif ou non."""
+    start = time.perf_counter()
+    try:
+        with span as value:
+            yield value
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=name)
+
+def trace_span(name: str, category: str = "pipeline", **args):
+    """
+    Span du traceur actif, et durée de l'étape dans les métriques. Sans traceur actif,
+    seule la durée est relevée (coût négligeable).
+    """
+    tracer = _active_tracer
+    return _stage_metric(name, tracer.span(name, category, **args) if tracer is not None else nullcontext())
+
+def trace_path(trace_dir: str, label: str, suffix: str = ".json") -> str:
+    safe_label = "".join(c if c.isalnum() or c in '-_' else '_' for c in label)
+    return os.path.join(trace_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}{suffix}")
+
+@contextmanager
+def _thread_profilers(all_threads: bool):
+    """
+    Profileurs cProfile du bloc : celui du thread appelant et, si all_threads, un par thread
+    démarré pendant le bloc (threading.setprofile), par exemple le pool du mode comparaison.
+    Depuis Python 3.12, cProfile repose sur sys.monitoring et voit déjà tous les threads.
+    """
+    import cProfile
+    profilers = [cProfile.Profile()]
+    per_thread = all_threads and sys.version_info < (3, 12)
+    lock = threading.Lock()
+
+    def start_in_thread(frame, event, arg):
+        profiler = cProfile.Profile()
+        with lock:
+            profilers.append(profiler)
+        profiler.enable()  # Remplace ce crochet pour le reste de la vie du thread
+
+    if per_thread:
+        threading.setprofile(start_in_thread)
+    profilers[0].enable()
+    try:
+        yield profilers
+    finally:
+        profilers[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+
+@contextmanager
+def capture_profile(mode: str, output_path: str, all_threads: bool = False):
+    """
+    Capture détaillée optionnelle d'un traitement :
+    - 'cProfile' : statistiques Python (fichier .prof, lisible avec snakeviz ou pstats), du thread
+      courant et, si all_threads, des threads démarrés pendant la capture (fusionnées) ;
+    - 'PyTorch' : torch.profiler (trace Chrome des opérateurs CPU/CUDA).
+    Tout autre mode ('Aucun') ne fait rien.
+    """
+    if mode == 'cProfile':
+        import pstats
+        with _thread_profilers(all_threads) as profilers:
+            try:
+                yield
+            finally:
+                stats = pstats.Stats(profilers[0])  # Arrête le profileur du thread courant
+                for profiler in profilers[1:]:
+                    with suppress(TypeError):  # Thread sans aucun appel enregistré
+                        stats.add(profiler)
+                path = f"{output_path}.prof"
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                stats.dump_stats(path)
+                print(f"Profil cProfile enregistré : {path} ({len(profilers)} thread(s))")
+                stats.sort_stats('cumulative').print_stats(15)
+    elif mode == 'PyTorch':
+        import torch
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True) as profiler:
+            yield
+        path = f"{output_path}.torch.json"
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        profiler.export_chrome_trace(path)
+        print(f"Trace torch.profiler enregistrée : {path}")
+        print(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=15))
+    else:
+        yield
+
+# Bibliothèques dont l'import coûte cher : elles ne devraient pas être chargées avant l'ouverture de la fenêtre.
+HEAVY_MODULES = ('torch', 'torchvision', 'transformers', 'open3d', 'scipy', 'cv2', 'onnxruntime', 'aiohttp')
+
+class StartupTimer:
+    """Jalons du démarrage de l'application (imports, construction de la fenêtre...)."""
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self.marks = []
+
+    def mark(self, label: str):
+        self.marks.append((label, time.perf_counter() - self._t0))
+
+    def report(self) -> str:
+        steps, previous = [], 0.0
+        for label, elapsed in self.marks:
+            steps.append(f"{label} {elapsed - previous:.2f}s")
+            previous = elapsed
+        heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+        return (f"Démarrage en {previous:.2f}s : " + " | ".join(steps)
+                + f" — modules lourds déjà importés : {', '.join(heavy) or 'aucun'}")
@@ -0,0 +1,162 @@
+import threading
+import time
+import weakref
+import numpy as np
+
+class VoxelHashIndex:
+    """
+    Index spatial des sommets d'un résultat (maillage ou nuage de points) pour les outils
+    interactifs du visualiseur : point le plus proche, requêtes boîte/sphère, coupes planes.
+
+    Hachage de voxels : les sommets sont triés par cellule d'une grille régulière (clé linéaire),
+    seules les cellules occupées sont conservées (clés, début et nombre de sommets). Une requête
+    ne parcourt que les cellules concernées, puis filtre exactement leurs sommets.
+    Les indices retournés sont ceux des sommets du maillage d'origine.
+    """
+    MAX_SHELLS = 8  # Au-delà, la recherche du plus proche voisin parcourt tous les points
+
+    def __init__(self, vertices, points_per_cell: float = 8.0):
+        start = time.perf_counter()
+        points = np.ascontiguousarray(vertices, dtype=np.float32)
+        if not len(points):
+            raise ValueError("Impossible d'indexer un résultat sans sommets.")
+        self.origin = points.min(axis=0).astype(np.float64)
+        extent = points.max(axis=0).astype(np.float64) - self.origin
+        # Les résultats sont des surfaces (2D) plongées en 3D : la taille des cellules est calculée
+        # sur les deux plus grandes dimensions pour viser ~points_per_cell sommets par cellule occupée.
+        largest = np.sort(extent)[1:]
+        area = np.prod(largest[largest > 0]) if (largest > 0).any() else 1.0
+        self.cell_size = float(max(np.sqrt(area * points_per_cell / len(points)), 1e-9))
+        self.dims = np.minimum(np.floor(extent / self.cell_size).astype(np.int64) + 1, 2 ** 20)
+
+        coords = self._cell_coords(points)
+        keys = self._linear_keys(coords)
+        self.order = np.argsort(keys, kind='stable')  # position triée -> indice du sommet d'origine
+        self.points = points[self.order]
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(keys[self.order], return_index=True,
+                                                                       return_counts=True)
+        self.cell_coords = coords[self.order[self.cell_starts]]
+        self.build_time_s = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.points, self.order, self.cell_keys, self.cell_starts,
+                                      self.cell_counts, self.cell_coords))
+
+    def _cell_coords(self, points) -> np.ndarray:
+        coords = np.floor((np.asarray(points, dtype=np.float64) - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(coords, 0, self.dims - 1)
+
+    def _linear_keys(self, coords: np.ndarray) -> np.ndarray:
+        return coords[..., 0] + self.dims[0] * (coords[..., 1] + self.dims[1] * coords[..., 2])
+
+    def _gather(self, cells: np.ndarray) -> np.ndarray:
+        """Positions (dans l'ordre trié) de tous les sommets des cellules occupées 'cells'."""
+        starts, counts = self.cell_starts[cells], self.cell_counts[cells]
+        if not len(counts):
+            return np.empty(0, dtype=np.int64)
+        first = np.cumsum(counts) - counts  # Début de chaque cellule dans le résultat concaténé
+        return np.repeat(starts - first, counts) + np.arange(counts.sum())
+
+    def _lookup(self, coords: np.ndarray) -> np.ndarray:
+        """Cellules occupées (indices dans cell_keys) parmi les coordonnées de cellules données."""
+        coords = coords[np.all((coords >= 0) & (coords < self.dims), axis=1)]
+        keys = self._linear_keys(coords)
+        found = np.searchsorted(self.cell_keys, keys)
+        found = np.minimum(found, len(self.cell_keys) - 1)
+        return found[self.cell_keys[found] == keys]
+
+    @staticmethod
+    def _shell(center: np.ndarray, radius: int) -> np.ndarray:
+        """Coordonnées des cellules à distance de Tchebychev exactement 'radius' de 'center'."""
+        span = np.arange(-radius, radius + 1)
+        offsets = np.stack(np.meshgrid(span, span, span, indexing='ij'), axis=-1).reshape(-1, 3)
+        if radius:
+            offsets = offsets[np.abs(offsets).max(axis=1) == radius]
+        return center + offsets
+
+    def nearest(self, point):
+        """(indice du sommet le plus proche, distance)."""
+        query = np.asarray(point, dtype=np.float64)
+        center = np.floor((query - self.origin) / self.cell_size).astype(np.int64)
+        best_position, best_d2 = -1, np.inf
+        max_radius = int(np.max(np.maximum(np.abs(center), np.abs(self.dims - 1 - center))))
+        for radius in range(max_radius + 1):
+            # Les cellules non encore visitées sont à plus de (radius - 1) cellules du point.
+            if best_position >= 0 and ((radius - 1) * self.cell_size) ** 2 >= best_d2:
+                break
+            if radius > self.MAX_SHELLS:
+                d2 = ((self.points - query) ** 2).sum(axis=1)
+                best_position = int(np.argmin(d2))
+                best_d2 = float(d2[best_position])
+                break
+            positions = self._gather(self._lookup(self._shell(center, radius)))
+            if not len(positions):
+                continue
+            d2 = ((self.points[positions] - query) ** 2).sum(axis=1)
+            candidate = int(np.argmin(d2))
+            if d2[candidate] < best_d2:
+                best_position, best_d2 = int(positions[candidate]), float(d2[candidate])
+        return int(self.order[best_position]), float(np.sqrt(best_d2))
+
+    def _box_positions(self, lower, upper) -> np.ndarray:
+        """Positions (ordre trié) des sommets dans la boîte [lower, upper]."""
+        low_cell = np.floor((lower - self.origin) / self.cell_size)
+        high_cell = np.floor((upper - self.origin) / self.cell_size)
+        cells = np.nonzero(np.all((self.cell_coords >= low_cell) & (self.cell_coords <= high_cell), axis=1))[0]
+        positions = self._gather(cells)
+        candidates = self.points[positions]
+        return positions[np.all((candidates >= lower) & (candidates <= upper), axis=1)]
+
+    def query_box(self, lower, upper) -> np.ndarray:
+        """Indices des sommets dans la boîte alignée sur les axes [lower, upper]."""
+        return self.order[self._box_positions(np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64))]
+
+    def query_sphere(self, center, radius: float) -> np.ndarray:
+        """Indices des sommets à moins de 'radius' de 'center'."""
+        center = np.asarray(center, dtype=np.float64)
+        positions = self._box_positions(center - radius, center + radius)
+        d2 = ((self.points[positions] - center) ** 2).sum(axis=1)
+        return self.order[positions[d2 <= radius ** 2]]
+
+    def slice_plane(self, origin, normal, thickness: float) -> np.ndarray:
+        """Indices des sommets dans la tranche d'épaisseur 'thickness' centrée sur le plan (origine, normale)."""
+        origin = np.asarray(origin, dtype=np.float64)
+        normal = np.asarray(normal, dtype=np.float64)
+        normal = normal / (np.linalg.norm(normal) or 1.0)
+        half = thickness / 2
+        centers = self.origin + (self.cell_coords + 0.5) * self.cell_size
+        # Une cellule peut toucher la tranche si son centre en est à moins d'une demi-diagonale.
+        reach = half + self.cell_size * np.sqrt(3) / 2
+        cells = np.nonzero(np.abs((centers - origin) @ normal) <= reach)[0]
+        positions = self._gather(cells)
+        inside = np.abs((self.points[positions] - origin) @ normal) <= half
+        return self.order[positions[inside]]
+
+class SpatialIndexCache:
+    """
+    Index spatiaux associés aux résultats (par identité du maillage) : un résultat réaffiché
+    depuis le cache retrouve son index sans reconstruction. L'index est libéré avec le maillage.
+    """
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, mesh):
+        return self._indexes.get(id(mesh))
+
+    def put(self, mesh, index: VoxelHashIndex):
+        key = id(mesh)
+        with self._lock:
+            if key not in self._indexes:
+                weakref.finalize(mesh, self._indexes.pop, key, None)
+            self._indexes[key] = index
+
+    def __contains__(self, mesh):
+        return id(mesh) in self._indexes
+
+    def __len__(self):
+        return len(self._indexes)